@@ -1,21 +1,112 @@
 ## Base LLM Client Interface
+import asyncio
+import json
 from abc import ABC, abstractmethod
-from typing import Type
+from typing import Any, AsyncIterator, Iterator, Type
+
+import orjson
 from pydantic import BaseModel
 
+_DECODER = json.JSONDecoder()
+
+
+def parse_json_object(text: str) -> Any:
+    """
+    Parse LLM output as JSON.
+    Clean output goes straight through orjson; otherwise decode the first
+    JSON object and ignore any prose or code fences around it.
+    Raises ValueError if no JSON object can be decoded.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        start = text.find("{")
+        if start == -1:
+            raise
+        obj, _ = _DECODER.raw_decode(text, start)
+        return obj
+
+
+
+class StructuredOutputError(ValueError):
+    """
+    Model output that isn't JSON or doesn't fit the schema.
+    Keeps the raw text so a repair prompt can show the model what it wrote.
+    """
+
+    def __init__(self, message: str, text: str):
+        super().__init__(message)
+        self.text = text
+
+
+def parse_structured(schema: Type[BaseModel], text: str) -> BaseModel:
+    """
+    Parse LLM output and validate it against schema.
+    Raises StructuredOutputError (a ValueError) carrying the raw text.
+    """
+    try:
+        return schema.model_validate(parse_json_object(text))
+    except ValueError as e:  # includes pydantic's ValidationError
+        raise StructuredOutputError(str(e), text) from e
+
 class LLMClient(ABC):
     @abstractmethod
     def generate_text(self, * , system: str, user: str, temperature: float = 0.2) -> str:
         raise NotImplementedError
 
-    def generate_structured(self, schema: Type[BaseModel], * , 
+    async def agenerate_text(self, *, system: str, user: str, temperature: float = 0.2) -> str:
+        """
+        Async variant of generate_text.
+        Default strategy: run the blocking call in a worker thread.
+        Concrete clients should override with a native async transport.
+        """
+
+        return await asyncio.to_thread(self.generate_text, system=system,
+        user=user, temperature=temperature)
+
+    def generate_text_stream(self, *, system: str, user: str,
+    temperature: float = 0.2, json_mode: bool = False) -> Iterator[str]:
+        """
+        Yield the response in chunks as the model produces it.
+        Closing the iterator early should stop the generation.
+        json_mode asks for the provider's native JSON output where supported;
+        otherwise the prompt alone has to ask for JSON.
+        Default strategy: a single chunk holding the generate_text result.
+        """
+
+        yield self.generate_text(system=system, user=user, temperature=temperature)
+
+    async def agenerate_text_stream(self, *, system: str, user: str,
+    temperature: float = 0.2, json_mode: bool = False) -> AsyncIterator[str]:
+        """
+        Async variant of generate_text_stream.
+        Default strategy: a single chunk holding the agenerate_text result.
+        """
+
+        yield await self.agenerate_text(system=system, user=user, temperature=temperature)
+
+    async def aclose(self) -> None:
+        """
+        Release async resources bound to the running event loop.
+        Call before the loop that used agenerate_text is closed.
+        """
+
+    def invalidate(self, *, system: str, user: str, temperature: float = 0.2,
+    schema: Type[BaseModel] | None = None) -> None:
+        """
+        Forget any cached response for this prompt (e.g. it failed validation).
+        Pass schema to target a generate_structured result.
+        No-op for uncached clients.
+        """
+
+    def generate_structured(self, schema: Type[BaseModel], * ,
     system: str, user: str, temperature: float = 0.2) -> BaseModel:
         """
-        Default strategy: ask model to output JSON only, then validate with 
+        Default strategy: ask model to output JSON only, then validate with
         Pydantic.
         Concrete client can override if it supports native JSON mode.
         """
 
-        text = self.generate_text(system=system, user=user, 
+        text = self.generate_text(system=system, user=user,
         temperature=temperature)
-        return schema.model_validate_json(text)
\ No newline at end of file
+        return parse_structured(schema, text)
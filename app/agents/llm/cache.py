@@ -0,0 +1,199 @@
+## Response cache for LLM calls
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import aclosing, closing
+from typing import AsyncIterator, Iterator, Type
+
+import orjson
+import redis
+from pydantic import BaseModel
+
+from app.agents.llm.base import LLMClient
+from app.logger import GLOBAL_LOGGER as logger
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def lookup(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """Per-process LRU cache with a TTL on each entry."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def update(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by all web/worker processes. Redis errors count as misses."""
+
+    def __init__(self, url: str, prefix: str = "llm_cache:"):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def lookup(self, key: str) -> str | None:
+        try:
+            return self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            logger.warning(f"[RedisCache] lookup failed: {str(e)}")
+            return None
+
+    def update(self, key: str, value: str, ttl: int) -> None:
+        try:
+            self.client.setex(self.prefix + key, ttl, value)
+        except redis.RedisError as e:
+            logger.warning(f"[RedisCache] update failed: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except redis.RedisError as e:
+            logger.warning(f"[RedisCache] delete failed: {str(e)}")
+
+
+class CachingLLMClient(LLMClient):
+    """Wrap an LLMClient so identical low-temperature prompts skip the LLM call.
+
+    Calls above max_temperature are always forwarded: callers sampling at a
+    high temperature want a different answer each time.
+    """
+
+    def __init__(self, inner: LLMClient, backend: CacheBackend, *,
+                 ttl_seconds: int = 86400, max_temperature: float = 0.3):
+        self.inner = inner
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.provider = getattr(inner, "provider", type(inner).__name__)
+        self.model = getattr(inner, "model", "")
+
+    def _key(self, system: str, user: str, temperature: float,
+             schema: Type[BaseModel] | None = None) -> str | None:
+        if temperature > self.max_temperature:
+            return None
+        kind = schema.__name__ if schema is not None else "text"
+        raw = f"{self.provider}|{self.model}|{kind}|{temperature}|{system}|{user}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def generate_text(self, *, system: str, user: str, temperature: float = 0.2) -> str:
+        key = self._key(system, user, temperature)
+        if key is not None:
+            cached = self.backend.lookup(key)
+            if cached is not None:
+                logger.debug(f"[CachingLLMClient] Cache hit {key[:12]}")
+                return cached
+        result = self.inner.generate_text(system=system, user=user, temperature=temperature)
+        if key is not None:
+            self.backend.update(key, result, self.ttl_seconds)
+        return result
+
+    async def agenerate_text(self, *, system: str, user: str, temperature: float = 0.2) -> str:
+        key = self._key(system, user, temperature)
+        if key is not None:
+            cached = self.backend.lookup(key)
+            if cached is not None:
+                logger.debug(f"[CachingLLMClient] Cache hit {key[:12]}")
+                return cached
+        result = await self.inner.agenerate_text(system=system, user=user, temperature=temperature)
+        if key is not None:
+            self.backend.update(key, result, self.ttl_seconds)
+        return result
+
+    def generate_text_stream(self, *, system: str, user: str,
+                             temperature: float = 0.2, json_mode: bool = False) -> Iterator[str]:
+        # json_mode only constrains the format of an answer the prompt already
+        # asks for, so it shares the plain text cache key
+        key = self._key(system, user, temperature)
+        if key is not None:
+            cached = self.backend.lookup(key)
+            if cached is not None:
+                logger.debug(f"[CachingLLMClient] Cache hit {key[:12]}")
+                yield cached
+                return
+        parts: list[str] = []
+        with closing(self.inner.generate_text_stream(system=system, user=user, temperature=temperature,
+                                                     json_mode=json_mode)) as stream:
+            for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        # Only reached when the caller read the whole stream
+        if key is not None:
+            self.backend.update(key, "".join(parts), self.ttl_seconds)
+
+    async def agenerate_text_stream(self, *, system: str, user: str,
+                                    temperature: float = 0.2, json_mode: bool = False) -> AsyncIterator[str]:
+        key = self._key(system, user, temperature)
+        if key is not None:
+            cached = self.backend.lookup(key)
+            if cached is not None:
+                logger.debug(f"[CachingLLMClient] Cache hit {key[:12]}")
+                yield cached
+                return
+        parts: list[str] = []
+        async with aclosing(self.inner.agenerate_text_stream(system=system, user=user, temperature=temperature,
+                                                             json_mode=json_mode)) as stream:
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        if key is not None:
+            self.backend.update(key, "".join(parts), self.ttl_seconds)
+
+    def generate_structured(self, schema: Type[BaseModel], *, system: str, user: str,
+                            temperature: float = 0.2) -> BaseModel:
+        # Forward to the inner client so its native JSON mode is kept
+        key = self._key(system, user, temperature, schema)
+        if key is not None:
+            cached = self.backend.lookup(key)
+            if cached is not None:
+                logger.debug(f"[CachingLLMClient] Cache hit {key[:12]}")
+                return schema.model_validate(orjson.loads(cached))
+        result = self.inner.generate_structured(schema, system=system, user=user, temperature=temperature)
+        if key is not None:
+            self.backend.update(key, result.model_dump_json(), self.ttl_seconds)
+        return result
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def invalidate(self, *, system: str, user: str, temperature: float = 0.2,
+                   schema: Type[BaseModel] | None = None) -> None:
+        key = self._key(system, user, temperature, schema)
+        if key is not None:
+            self.backend.delete(key)
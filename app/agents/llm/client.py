@@ -1,32 +1,66 @@
-import os
+from functools import lru_cache
 from app.settings import settings
+from app.agents.llm.base import LLMClient
+from app.agents.llm.cache import CacheBackend, CachingLLMClient, InMemoryCache, RedisCache
 from app.agents.llm.ollama import OllamaOpenAIClient
 from app.agents.llm.groq import GroqOpenAIClient
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
 
+@lru_cache(maxsize=1)
+def get_cache_backend() -> CacheBackend:
+    """Get the process-wide LLM response cache backend."""
+    if settings.llm_cache_backend == "redis":
+        logger.debug("[get_cache_backend] Using Redis LLM cache")
+        return RedisCache(settings.redis_url)
+    logger.debug("[get_cache_backend] Using in-memory LLM cache")
+    return InMemoryCache(maxsize=settings.llm_cache_maxsize)
+
+@lru_cache(maxsize=1)
 def get_llm_client():
     """Get configured LLM client based on provider settings.
     
+    Provider config is process-static, so the client (and its pooled HTTP
+    connections) is built once and shared by every caller and thread.
+    
     Returns:
-        LLM client instance (Groq or Ollama)
+        LLM client instance (Groq or Ollama), wrapped in a response cache
+        when settings.llm_cache_enabled is set
         
     Raises:
         DocumentPortalException: If client initialization fails
     """
     try:
+        client: LLMClient
         if settings.LLM_PROVIDER == "groq":
             logger.debug("[get_llm_client] Using Groq provider")
-            return GroqOpenAIClient(
-                api_key=os.getenv("GROQ_API_KEY"),
+            client = GroqOpenAIClient(
+                api_key=settings.GROQ_API_KEY,
                 base_url=settings.GROQ_BASE_URL,
                 model=settings.GROQ_MODEL,
             )
-        logger.debug("[get_llm_client] Using Ollama provider")
-        return OllamaOpenAIClient(
-            base_url = settings.ollama_base_url,
-            model = settings.ollama_model,
-        )
+        else:
+            logger.debug("[get_llm_client] Using Ollama provider")
+            client = OllamaOpenAIClient(
+                base_url = settings.ollama_base_url,
+                model = settings.ollama_model,
+            )
+        if settings.llm_cache_enabled:
+            return CachingLLMClient(client, get_cache_backend(), ttl_seconds=settings.llm_cache_ttl_seconds)
+        return client
     except Exception as e:
         logger.error(f"[get_llm_client] Failed to initialize LLM client: {str(e)}")
-        raise DocumentPortalException("Failed to initialize LLM client", e)
\ No newline at end of file
+        raise DocumentPortalException("Failed to initialize LLM client", e)
+
+def get_batch_client() -> GroqOpenAIClient | None:
+    """Get the client to use for provider Batch API jobs.
+
+    Returns:
+        The shared Groq client when settings.llm_batch_enabled is set and
+        Groq is the provider, otherwise None (Ollama has no Batch API)
+    """
+    if not settings.llm_batch_enabled or settings.LLM_PROVIDER != "groq":
+        return None
+    client = get_llm_client()
+    # Batches bypass the response cache
+    return client.inner if isinstance(client, CachingLLMClient) else client
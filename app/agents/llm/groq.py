@@ -1,31 +1,240 @@
-from openai import OpenAI
-from .base import LLMClient
+import asyncio
+import threading
+import weakref
+
+from typing import AsyncIterator, Iterator, Type
+
+import httpx
+import orjson
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel
+from .base import LLMClient, parse_structured
 from app.logger import GLOBAL_LOGGER as logger
 
+# Keep-alive pool shared by every call made through one client instance
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
 class GroqOpenAIClient(LLMClient):
+    provider = "groq"
+
     def __init__(self, *, api_key: str, base_url: str, model: str):
+        self.api_key = api_key
+        self.base_url = base_url
         self.client = OpenAI(
-            api_key=api_key, 
+            api_key=api_key,
             base_url=base_url,
-            timeout=120.0  # Set timeout to 120 seconds like Ollama
+            timeout=120.0,  # Set timeout to 120 seconds like Ollama
+            http_client=httpx.Client(limits=HTTP_LIMITS),
         )
         self.model = model
+        # Async clients are bound to the event loop they were created on;
+        # one per loop so threads running their own loops can share this instance
+        self._async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI] = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
         logger.info(f"[GroqOpenAIClient] Initialized with model: {model}")
 
+    def _get_async_client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    timeout=120.0,
+                    http_client=httpx.AsyncClient(limits=HTTP_LIMITS),
+                )
+                self._async_clients[loop] = client
+        return client
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.close()
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.client.close()
+
+    @staticmethod
+    def _log_usage(resp) -> None:
+        # Groq caches shared prompt prefixes automatically on supported models
+        usage = getattr(resp, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if usage is not None:
+            logger.debug(f"[GroqOpenAIClient] prompt_tokens={usage.prompt_tokens} cached_tokens={cached or 0}")
+
+    def _messages(self, system: str, user: str) -> list[dict]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
+    @staticmethod
+    def _stream_format(json_mode: bool) -> dict:
+        # JSON object mode also applies to streamed completions
+        return {"response_format": {"type": "json_object"}} if json_mode else {}
+
     def generate_text(self, *, system: str, user: str, temperature: float = 0.2) -> str:
         try:
             logger.debug(f"[GroqOpenAIClient] Generating text with model: {self.model}")
             resp = self.client.chat.completions.create(
                 model=self.model,
                 temperature=temperature,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
+                messages=self._messages(system, user),
             )
+            self._log_usage(resp)
             result = resp.choices[0].message.content.strip()
             logger.debug(f"[GroqOpenAIClient] Generated {len(result)} characters")
             return result
         except Exception as e:
             logger.error(f"[GroqOpenAIClient] Error generating text: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def generate_structured(self, schema: Type[BaseModel], *, system: str, user: str,
+                            temperature: float = 0.2) -> BaseModel:
+        # JSON object mode works on every Groq model; json_schema mode is only
+        # available on a few, so the schema itself stays in the prompt.
+        try:
+            logger.debug(f"[GroqOpenAIClient] Generating {schema.__name__} (JSON mode) with model: {self.model}")
+            resp = self.client.chat.completions.create(
+                model=self.model,
+                temperature=temperature,
+                messages=self._messages(system, user),
+                response_format={"type": "json_object"},
+            )
+            self._log_usage(resp)
+            text = resp.choices[0].message.content
+        except Exception as e:
+            logger.error(f"[GroqOpenAIClient] Error generating structured output: {str(e)}")
+            raise
+        return parse_structured(schema, text)
+
+    async def agenerate_text(self, *, system: str, user: str, temperature: float = 0.2) -> str:
+        try:
+            logger.debug(f"[GroqOpenAIClient] Generating text (async) with model: {self.model}")
+            resp = await self._get_async_client().chat.completions.create(
+                model=self.model,
+                temperature=temperature,
+                messages=self._messages(system, user),
+            )
+            self._log_usage(resp)
+            result = resp.choices[0].message.content.strip()
+            logger.debug(f"[GroqOpenAIClient] Generated {len(result)} characters")
+            return result
+        except Exception as e:
+            logger.error(f"[GroqOpenAIClient] Error generating text: {str(e)}")
+            raise
+
+    def generate_text_stream(self, *, system: str, user: str,
+                             temperature: float = 0.2, json_mode: bool = False) -> Iterator[str]:
+        logger.debug(f"[GroqOpenAIClient] Streaming text with model: {self.model}")
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                temperature=temperature,
+                messages=self._messages(system, user),
+                stream=True,
+                **self._stream_format(json_mode),
+            )
+        except Exception as e:
+            logger.error(f"[GroqOpenAIClient] Error streaming text: {str(e)}")
+            raise
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Dropping the connection stops the generation if we bail out early
+            stream.close()
+
+    async def agenerate_text_stream(self, *, system: str, user: str,
+                                    temperature: float = 0.2, json_mode: bool = False) -> AsyncIterator[str]:
+        logger.debug(f"[GroqOpenAIClient] Streaming text (async) with model: {self.model}")
+        try:
+            stream = await self._get_async_client().chat.completions.create(
+                model=self.model,
+                temperature=temperature,
+                messages=self._messages(system, user),
+                stream=True,
+                **self._stream_format(json_mode),
+            )
+        except Exception as e:
+            logger.error(f"[GroqOpenAIClient] Error streaming text: {str(e)}")
+            raise
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    # -------------------------
+    # Batch API (non-interactive jobs: lower cost, no per-request rate limit)
+    # -------------------------
+    BATCH_RUNNING_STATUSES = ("validating", "in_progress", "finalizing")
+
+    def build_batch_request(self, custom_id: str, *, system: str, user: str,
+                            temperature: float = 0.2) -> dict:
+        """One JSONL line of a chat-completions batch."""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "temperature": temperature,
+                "messages": self._messages(system, user),
+            },
+        }
+
+    def submit_batch(self, requests: list[dict], *, completion_window: str = "24h") -> str:
+        """Upload requests as JSONL and start a batch.
+
+        Returns:
+            Provider batch ID
+        """
+        jsonl = b"\n".join(orjson.dumps(r) for r in requests)
+        try:
+            upload = self.client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=upload.id,
+                endpoint="/v1/chat/completions",
+                completion_window=completion_window,
+            )
+        except Exception as e:
+            logger.error(f"[GroqOpenAIClient] Error submitting batch: {str(e)}")
+            raise
+        logger.info(f"[GroqOpenAIClient] Submitted batch {batch.id} with {len(requests)} requests")
+        return batch.id
+
+    def get_batch_results(self, batch_id: str) -> dict[str, str] | None:
+        """Fetch a batch's outputs.
+
+        Returns:
+            None while the batch is still running, otherwise a mapping of
+            custom_id -> message content for every request that succeeded
+            (partial or empty if the batch failed, expired or was cancelled)
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        logger.debug(f"[GroqOpenAIClient] Batch {batch_id} status: {batch.status}")
+        if batch.status in self.BATCH_RUNNING_STATUSES:
+            return None
+        if not batch.output_file_id:
+            logger.warning(f"[GroqOpenAIClient] Batch {batch_id} ended with status {batch.status} and no output")
+            return {}
+
+        results: dict[str, str] = {}
+        # Output can be many MB; parse the raw bytes line by line with orjson
+        for line in self.client.files.content(batch.output_file_id).content.splitlines():
+            if not line.strip():
+                continue
+            item = orjson.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+        return results
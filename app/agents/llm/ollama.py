@@ -1,19 +1,43 @@
+import asyncio
+import threading
+import weakref
+
+from typing import AsyncIterator, Iterator, Type
+
 import httpx
-from app.agents.llm.base import LLMClient
+import orjson
+from pydantic import BaseModel
+from app.agents.llm.base import LLMClient, parse_structured
 from app.logger import GLOBAL_LOGGER as logger
 
+# Keep-alive pool shared by every call made through one client instance
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
 class OllamaOpenAIClient(LLMClient):
+    provider = "ollama"
+
     def __init__(self, base_url: str, model: str):
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            timeout=120,
+            headers=self._headers(),
+            limits=HTTP_LIMITS,
+        )
+        # Async clients are bound to the event loop they were created on;
+        # one per loop so threads running their own loops can share this instance
+        self._async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
         logger.info(f"[OllamaOpenAIClient] Initialized with model: {model}")
 
-    def generate_text(self, * , system: str, user: str, temperature: float = 0.2) -> str:
-        # Ollama OpenAI-compatible endpoint
-        # POST {base_url}/chat/completions with OpenAI message format
+    # Ollama OpenAI-compatible endpoint
+    # POST {base_url}/chat/completions with OpenAI message format
 
-        url = f"{self.base_url}/chat/completions"
-        payload = {
+    # Bodies are (de)serialized with orjson rather than httpx's stdlib json;
+    # the Content-Type header is set once on the client
+    def _payload(self, system: str, user: str, temperature: float) -> dict:
+        return {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system},
@@ -22,16 +46,110 @@ class OllamaOpenAIClient(LLMClient):
             "temperature": temperature
         }
 
-        headers = {
+    @staticmethod
+    def _headers() -> dict:
+        return {
             "Content-Type": "application/json",
             #OpenAI-compatible clients require an api key field; Ollama ignores it
             "Authorization": "Bearer ollama",
         }
 
-        with httpx.Client(timeout=120) as client:
-            r = client.post(url, json=payload, headers=headers)
-            r.raise_for_status()
-            data = r.json()
-        
+    @staticmethod
+    def _delta_content(line: str) -> str | None:
+        # SSE frames are "data: {...}" lines; the stream ends with "data: [DONE]"
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        choices = orjson.loads(data).get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("delta") or {}).get("content")
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=120,
+                    headers=self._headers(),
+                    limits=HTTP_LIMITS,
+                )
+                self._async_clients[loop] = client
+        return client
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self._client.close()
+
+    def generate_text(self, * , system: str, user: str, temperature: float = 0.2) -> str:
+        payload = self._payload(system, user, temperature)
+
+        r = self._client.post("/chat/completions", content=orjson.dumps(payload))
+        r.raise_for_status()
+        data = orjson.loads(r.content)
+
         return data["choices"][0]["message"]["content"]
 
+    def generate_structured(self, schema: Type[BaseModel], * , system: str, user: str,
+    temperature: float = 0.2) -> BaseModel:
+        # Constrained decoding against the schema (Ollama >= 0.5)
+        payload = self._payload(system, user, temperature)
+        payload["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+        }
+
+        r = self._client.post("/chat/completions", content=orjson.dumps(payload))
+        r.raise_for_status()
+        data = orjson.loads(r.content)
+
+        return parse_structured(schema, data["choices"][0]["message"]["content"])
+
+    async def agenerate_text(self, * , system: str, user: str, temperature: float = 0.2) -> str:
+        payload = self._payload(system, user, temperature)
+
+        r = await self._get_async_client().post("/chat/completions", content=orjson.dumps(payload))
+        r.raise_for_status()
+        data = orjson.loads(r.content)
+
+        return data["choices"][0]["message"]["content"]
+
+    def generate_text_stream(self, * , system: str, user: str, temperature: float = 0.2,
+    json_mode: bool = False) -> Iterator[str]:
+        payload = self._payload(system, user, temperature)
+        payload["stream"] = True
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        # Leaving the block closes the response, which stops the generation early
+        with self._client.stream("POST", "/chat/completions", content=orjson.dumps(payload)) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                content = self._delta_content(line)
+                if content:
+                    yield content
+
+    async def agenerate_text_stream(self, * , system: str, user: str, temperature: float = 0.2,
+    json_mode: bool = False) -> AsyncIterator[str]:
+        payload = self._payload(system, user, temperature)
+        payload["stream"] = True
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        async with self._get_async_client().stream("POST", "/chat/completions", content=orjson.dumps(payload)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                content = self._delta_content(line)
+                if content:
+                    yield content
@@ -1,7 +1,14 @@
+import re
+from contextlib import aclosing, closing
+from functools import lru_cache
+from typing import AsyncIterator, Iterator
+
+from pydantic import ValidationError
+
 from app.agents.llm.client import get_llm_client
+from app.agents.schemas import ModulesBatch, WeekPlan
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
-from app.settings import settings
 
 SYSTEM_MODULE_WRITER = """You are an expert course author.
 Write clear, structured Markdown only.
@@ -24,6 +31,39 @@ Use this format ONLY:
 IMPORTANT: Never include URLs or YouTube links. Only provide search keywords that users can search for.
 """
 
+# Fields whose worked examples should include Python code (substring match)
+PROGRAMMING_KEYWORDS = ("python", "ml", "machine learning", "data", "pandas", "numpy", "deep learning", "nlp")
+
+# Static instructions go first, per-week details last, so providers with
+# prompt caching can reuse the shared prefix across weeks and courses.
+_MODULE_PROMPT_HEADER = """
+Write a markdown lesson with these EXACT headings (use H2 ## format):
+## Overview
+## Key concepts
+## Worked example
+## Practice exercises (exactly 3 numbered items)
+## Common mistakes
+## Suggested resources
+## Media suggestions
+
+Requirements:
+- Output must be Markdown only
+- Use exactly these 7 headings in this order
+- No additional top-level headings
+- Practice exercises section must have exactly 3 numbered items
+- Media suggestions must include 2-3 image suggestions and 1-2 video suggestions
+- Keep content practical and concise
+""".strip()
+
+@lru_cache(maxsize=256)
+def is_programming_field(field: str) -> bool:
+    """Whether the field's worked examples should include Python code.
+
+    Cached because every week of a course asks about the same field.
+    """
+    field_lc = field.lower()
+    return any(keyword in field_lc for keyword in PROGRAMMING_KEYWORDS)
+
 def build_module_prompt(field: str, level: str, week: int, title: str,
 outcomes: list[str]) -> str:
     """Build the module writing prompt for LLM content generation.
@@ -38,87 +78,63 @@ outcomes: list[str]) -> str:
     Returns:
         Formatted prompt string for the LLM
     """
-    
-    outcomes_text = "\n".join([f"- {o}" for o in outcomes])
-    
-    # Determine if field requires Python code in worked example
-    programming_keywords = ["python", "ml", "machine learning", "data", "pandas", "numpy", "deep learning", "nlp"]
-    is_programming_field = any(keyword in field.lower() for keyword in programming_keywords)
-    
-    worked_example_guidance = "Worked example (with Python code)" if is_programming_field else "Worked example (code OR step-by-step walkthrough)"
-    
-    return f"""
-Course topic: {field}
-Learner level: {level}
+    outcomes_text = "\n".join(f"- {o}" for o in outcomes)
+
+    return f"""{_course_prompt_prefix(field, level)}
 
 Week {week} title: {title}
 Outcomes:
-{outcomes_text}
+{outcomes_text}"""
 
-Write a markdown lesson with these EXACT headings (use H2 ## format):
-## Overview
-## Key concepts
-## {worked_example_guidance}
-## Practice exercises (exactly 3 numbered items)
-## Common mistakes
-## Suggested resources
-## Media suggestions
+@lru_cache(maxsize=256)
+def _course_prompt_prefix(field: str, level: str) -> str:
+    """Everything in the module prompt before the week details.
 
-Requirements:
-- Output must be Markdown only
-- Use exactly these 7 headings in this order
-- No additional top-level headings
-- Practice exercises section must have exactly 3 numbered items
-- Media suggestions must include 2-3 image suggestions and 1-2 video suggestions
-- Keep content practical and concise
-""".strip()
+    Identical for every week of a course, so it is assembled once per
+    (field, level) and each week only appends its own lines.
+    """
+    worked_example_guidance = "include Python code" if is_programming_field(field) else "code OR step-by-step walkthrough"
+    return f"""{_MODULE_PROMPT_HEADER}
+
+Course topic: {field}
+Learner level: {level}
+Worked example: {worked_example_guidance}"""
+
+_REQUIRED_HEADINGS = [
+    "## Overview",
+    "## Key concepts",
+    "## Worked example",
+    "## Practice exercises",
+    "## Common mistakes",
+    "## Suggested resources",
+    "## Media suggestions"
+]
+_REQUIRED_NORMALIZED = [h.lower() for h in _REQUIRED_HEADINGS]
+
+# H2 heading lines (leading indentation tolerated) and numbered list items
+_H2 = re.compile(r"^[ \t]*(## .*?)[ \t]*$", re.M)
+_NUMBERED_ITEM = re.compile(r"^[ \t]*\d+[.)]", re.M)
 
 def validate_module_markdown(md: str) -> None:
     """Validate markdown structure and content requirements."""
-    required_headings = [
-        "## Overview",
-        "## Key concepts", 
-        "## Worked example",
-        "## Practice exercises",
-        "## Common mistakes",
-        "## Suggested resources",
-        "## Media suggestions"
-    ]
-    
-    lines = md.split('\n')
-    found_headings = []
-    practice_exercises_content = []
-    in_practice_section = False
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('## '):
-            heading = line.lower()  # Normalize to lowercase for comparison
-            found_headings.append(heading)
-            in_practice_section = (heading == "## practice exercises")
-        elif in_practice_section and line and (line[0].isdigit() or line.startswith('-')):
-            practice_exercises_content.append(line)
-    
-    # Normalize required headings to lowercase for comparison
-    normalized_required = [h.lower() for h in required_headings]
-    
+    matches = list(_H2.finditer(md))
+    # Normalize to lowercase for comparison
+    found_headings = [m.group(1).lower() for m in matches]
+
     # Check all required headings exist (case-insensitive and flexible matching)
-    missing = []
-    for required in normalized_required:
-        # Check if any found heading contains the required heading as a base
-        found = any(required in found_heading for found_heading in found_headings)
-        if not found:
-            # Show original case for missing headings
-            original_missing = [h for h in required_headings if h.lower() == required]
-            missing.extend(original_missing)
-    
+    missing = [
+        original
+        for original, required in zip(_REQUIRED_HEADINGS, _REQUIRED_NORMALIZED)
+        if not any(required in found_heading for found_heading in found_headings)
+    ]
+
     # Only flag extra headings that don't match any required pattern
-    extra = []
-    for found_heading in found_headings:
-        matches_any = any(required in found_heading for required in normalized_required)
-        if not matches_any:
-            extra.append(found_heading)
-    
+    extra = [
+        found_heading
+        for found_heading in found_headings
+        if not any(required in found_heading for required in _REQUIRED_NORMALIZED)
+    ]
+
     if missing or extra:
         error_msg = "Invalid headings structure"
         if missing:
@@ -126,11 +142,186 @@ def validate_module_markdown(md: str) -> None:
         if extra:
             error_msg += f". Extra: {extra}"
         raise ValueError(error_msg)
-    
+
     # Check practice exercises has exactly 3 numbered items
-    numbered_items = [line for line in practice_exercises_content if line and line[0].isdigit()]
-    if len(numbered_items) != 3:
-        raise ValueError(f"Practice exercises must have exactly 3 numbered items, found {len(numbered_items)}")
+    numbered_items = 0
+    for i, match in enumerate(matches):
+        if "## practice exercises" in found_headings[i]:
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(md)
+            numbered_items += len(_NUMBERED_ITEM.findall(md, match.end(), end))
+    if numbered_items != 3:
+        raise ValueError(f"Practice exercises must have exactly 3 numbered items, found {numbered_items}")
+
+_REQUIRED_TITLES = [h[3:] for h in _REQUIRED_HEADINGS]
+_ANY_HEADING = re.compile(r"^[ \t]*(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_LEADING_NUMBER = re.compile(r"^\d+[.)]?\s*")
+
+def auto_repair_module_markdown(md: str) -> str:
+    """Fix mechanical structure errors without another LLM call.
+
+    - A required section written at the wrong level (``# Overview``,
+      ``### Key Concepts:``, ``## 1. Overview``) becomes its ``##`` heading
+    - Any other ``##`` heading is demoted to ``###`` so its content is kept
+    - Practice exercises are cut back to the first 3 numbered items
+
+    Fenced code blocks are left untouched.
+
+    Returns:
+        The repaired markdown (unchanged if nothing applied)
+    """
+    lines = md.split("\n")
+    in_fence = False
+    present: set[str] = set()
+    headings: list[tuple[int, str]] = []  # required H2s: (line index, canonical title)
+    heading_lines: set[int] = set()
+
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        m = None if in_fence else _ANY_HEADING.match(line)
+        if not m:
+            continue
+        heading_lines.add(i)
+        level, text = len(m.group(1)), m.group(2)
+        key = _LEADING_NUMBER.sub("", text.lower()).rstrip(":").strip()
+        title = next((t for t in _REQUIRED_TITLES if key.startswith(t.lower())), None)
+        if level == 2 and any(r in f"## {text.lower()}" for r in _REQUIRED_NORMALIZED):
+            present.add(title or text)
+            headings.append((i, title or text))
+        elif title is not None and title not in present:
+            present.add(title)
+            lines[i] = f"## {title}"
+            headings.append((i, title))
+        elif level == 2:
+            lines[i] = f"### {text}"
+
+    # Keep the first 3 numbered practice items; surplus items are dropped up
+    # to the next heading of any level
+    dropped: set[int] = set()
+    for start, title in headings:
+        if not title.lower().startswith("practice exercises"):
+            continue
+        items = 0
+        for j in range(start + 1, len(lines)):
+            if j in heading_lines:
+                break
+            if _NUMBERED_ITEM.match(lines[j]):
+                items += 1
+            if items > 3:
+                dropped.add(j)
+
+    return "\n".join(line for j, line in enumerate(lines) if j not in dropped)
+
+def ensure_valid_module_markdown(md: str) -> str:
+    """Validate markdown, falling back to auto_repair_module_markdown.
+
+    Returns:
+        The markdown, or its locally repaired version, that passed validation
+
+    Raises:
+        ValueError: The original validation error if local repair did not help
+    """
+    try:
+        validate_module_markdown(md)
+        return md
+    except ValueError as e:
+        fixed = auto_repair_module_markdown(md)
+        if fixed == md:
+            raise
+        try:
+            validate_module_markdown(fixed)
+        except ValueError:
+            raise e
+        logger.info(f"[ensure_valid_module_markdown] Repaired structure locally: {str(e)}")
+        return fixed
+
+def check_partial_module_markdown(md: str) -> None:
+    """Fail fast on a lesson that is still being generated.
+
+    Only complete lines are checked, after auto_repair_module_markdown, so
+    heading levels, extra sections and surplus exercises never stop a
+    stream: those are fixed locally once it ends. What is left is a
+    finished practice section with fewer than 3 numbered items.
+
+    Raises:
+        ValueError: If the final markdown can no longer validate
+    """
+    md = auto_repair_module_markdown(md[:md.rfind("\n") + 1])
+    matches = list(_H2.finditer(md))
+
+    # A section is finished once the next H2 heading has started
+    for i, match in enumerate(matches[:-1]):
+        if "## practice exercises" in match.group(1).lower():
+            numbered_items = len(_NUMBERED_ITEM.findall(md, match.end(), matches[i + 1].start()))
+            if numbered_items < 3:
+                raise ValueError(f"Practice exercises must have exactly 3 numbered items, found {numbered_items}")
+
+# Characters streamed between two check_partial_module_markdown calls
+_STREAM_CHECK_CHARS = 800
+
+def _collect_module_stream(stream: Iterator[str], week: int) -> str:
+    """Read a streamed lesson, stopping as soon as it can no longer validate.
+
+    The partial text is returned as-is; validate_module_markdown rejects it
+    and the caller goes straight to the repair prompt.
+    """
+    parts: list[str] = []
+    size = checked = 0
+    with closing(stream):
+        for chunk in stream:
+            parts.append(chunk)
+            size += len(chunk)
+            if size - checked < _STREAM_CHECK_CHARS:
+                continue
+            checked = size
+            try:
+                check_partial_module_markdown("".join(parts))
+            except ValueError as e:
+                logger.info(f"[_collect_module_stream] Week {week} stopped after {size} chars: {str(e)}")
+                break
+    return "".join(parts).strip()
+
+async def _acollect_module_stream(stream: AsyncIterator[str], week: int) -> str:
+    """Async variant of _collect_module_stream."""
+    parts: list[str] = []
+    size = checked = 0
+    async with aclosing(stream):
+        async for chunk in stream:
+            parts.append(chunk)
+            size += len(chunk)
+            if size - checked < _STREAM_CHECK_CHARS:
+                continue
+            checked = size
+            try:
+                check_partial_module_markdown("".join(parts))
+            except ValueError as e:
+                logger.info(f"[_acollect_module_stream] Week {week} stopped after {size} chars: {str(e)}")
+                break
+    return "".join(parts).strip()
+
+def build_repair_prompt(prompt: str, error: Exception, markdown: str) -> str:
+    """Build the one-shot repair prompt after a validation failure.
+
+    Args:
+        prompt: Original module prompt
+        error: Validation error raised for the previous attempt
+        markdown: Invalid markdown returned by the previous attempt
+
+    Returns:
+        Repair prompt string for the LLM
+    """
+    return f"""
+{prompt}
+
+PREVIOUS ATTEMPT FAILED:
+Error: {error}
+
+Invalid markdown:
+{markdown}
+
+Return corrected markdown only. Fix the structure errors while preserving content quality.
+""".strip()
 
 def write_module_markdown(field: str, level: str, week: int, title: str,
 outcomes: list[str]) -> str:
@@ -160,38 +351,197 @@ outcomes: list[str]) -> str:
     
     try:
         # First attempt
-        markdown = llm.generate_text(system=SYSTEM_MODULE_WRITER, user=prompt, temperature=0.2).strip()
+        markdown = _collect_module_stream(
+            llm.generate_text_stream(system=SYSTEM_MODULE_WRITER, user=prompt, temperature=0.2), week
+        )
         
         # Validate and repair if needed
         try:
-            validate_module_markdown(markdown)
+            markdown = ensure_valid_module_markdown(markdown)
             logger.info(f"[write_module_markdown] Week {week} generated successfully")
             return markdown
         except ValueError as e:
             logger.warning(f"[write_module_markdown] Week {week} validation failed, attempting repair: {str(e)}")
+            # Don't let a response cache replay an output that failed validation
+            llm.invalidate(system=SYSTEM_MODULE_WRITER, user=prompt, temperature=0.2)
             # One repair retry
-            repair_prompt = f"""
-{prompt}
-
-PREVIOUS ATTEMPT FAILED:
-Error: {e}
-
-Invalid markdown:
-{markdown}
-
-Return corrected markdown only. Fix the structure errors while preserving content quality.
-""".strip()
+            repair_prompt = build_repair_prompt(prompt, e, markdown)
             
-            repaired_markdown = llm.generate_text(system=SYSTEM_MODULE_WRITER, user=repair_prompt, temperature=0.1).strip()
+            repaired_markdown = _collect_module_stream(
+                llm.generate_text_stream(system=SYSTEM_MODULE_WRITER, user=repair_prompt, temperature=0.1), week
+            )
             
             # Final validation
             try:
-                validate_module_markdown(repaired_markdown)
+                repaired_markdown = ensure_valid_module_markdown(repaired_markdown)
                 logger.info(f"[write_module_markdown] Week {week} repaired successfully")
                 return repaired_markdown
             except ValueError as final_e:
                 logger.error(f"[write_module_markdown] Week {week} repair failed: {str(final_e)}")
+                llm.invalidate(system=SYSTEM_MODULE_WRITER, user=repair_prompt, temperature=0.1)
                 raise DocumentPortalException(f"Module markdown validation failed after repair for week {week}", final_e)
     except Exception as e:
         logger.error(f"[write_module_markdown] Failed to generate week {week}: {str(e)}")
-        raise DocumentPortalException(f"Failed to generate module markdown for week {week}", e)
\ No newline at end of file
+        raise DocumentPortalException(f"Failed to generate module markdown for week {week}", e)
+
+async def awrite_module_markdown(field: str, level: str, week: int, title: str,
+outcomes: list[str]) -> str:
+    """Async variant of write_module_markdown.
+
+    Lets the course generation graph write several weeks concurrently;
+    validation and the single repair retry behave exactly as in the
+    sync version.
+
+    Args:
+        field: Subject area/field of study
+        level: Learner level
+        week: Week number
+        title: Module title
+        outcomes: List of learning outcomes
+
+    Returns:
+        Validated markdown content string
+
+    Raises:
+        DocumentPortalException: If generation fails after repair retry
+    """
+
+    llm = get_llm_client()
+    prompt = build_module_prompt(field, level, week, title, outcomes)
+
+    logger.info(f"[awrite_module_markdown] Generating content for week {week}: {title}")
+
+    try:
+        markdown = await _acollect_module_stream(
+            llm.agenerate_text_stream(system=SYSTEM_MODULE_WRITER, user=prompt, temperature=0.2), week
+        )
+
+        try:
+            markdown = ensure_valid_module_markdown(markdown)
+            logger.info(f"[awrite_module_markdown] Week {week} generated successfully")
+            return markdown
+        except ValueError as e:
+            logger.warning(f"[awrite_module_markdown] Week {week} validation failed, attempting repair: {str(e)}")
+            # Don't let a response cache replay an output that failed validation
+            llm.invalidate(system=SYSTEM_MODULE_WRITER, user=prompt, temperature=0.2)
+            repair_prompt = build_repair_prompt(prompt, e, markdown)
+
+            repaired_markdown = await _acollect_module_stream(
+                llm.agenerate_text_stream(system=SYSTEM_MODULE_WRITER, user=repair_prompt, temperature=0.1), week
+            )
+
+            try:
+                repaired_markdown = ensure_valid_module_markdown(repaired_markdown)
+                logger.info(f"[awrite_module_markdown] Week {week} repaired successfully")
+                return repaired_markdown
+            except ValueError as final_e:
+                logger.error(f"[awrite_module_markdown] Week {week} repair failed: {str(final_e)}")
+                llm.invalidate(system=SYSTEM_MODULE_WRITER, user=repair_prompt, temperature=0.1)
+                raise DocumentPortalException(f"Module markdown validation failed after repair for week {week}", final_e)
+    except Exception as e:
+        logger.error(f"[awrite_module_markdown] Failed to generate week {week}: {str(e)}")
+        raise DocumentPortalException(f"Failed to generate module markdown for week {week}", e)
+
+# Larger batches make each call slow enough to cancel out the saved round-trips
+MAX_BATCH_WEEKS = 6
+
+SYSTEM_MODULE_BATCH_WRITER = """You are an expert course author.
+You must return ONLY valid JSON (no markdown fences, no commentary):
+{"modules": [{"week": <week number>, "markdown": "<lesson markdown>"}]}
+
+Each lesson's markdown must contain exactly these H2 headings in order:
+## Overview
+## Key concepts
+## Worked example
+## Practice exercises
+## Common mistakes
+## Suggested resources
+## Media suggestions
+No other top-level headings (# or ##) allowed.
+
+In the "Media suggestions" section, suggest 2-3 relevant images and 1-2 videos that would enhance understanding.
+Use this format ONLY:
+- Image: [brief description] - search keywords: [relevant search terms]
+- Video: [video title] - search keywords: [topic keywords]
+
+IMPORTANT: Never include URLs or YouTube links. Only provide search keywords that users can search for.
+"""
+
+def build_batch_module_prompt(field: str, level: str, weeks: list[WeekPlan]) -> str:
+    """Build a prompt asking for several weeks' lessons in one JSON response.
+
+    Args:
+        field: Subject area/field of study
+        level: Learner level
+        weeks: Weeks to write (title and outcomes per week)
+
+    Returns:
+        Formatted prompt string for the LLM
+    """
+    week_blocks = "\n\n".join(
+        f"Week {w.week} title: {w.title}\nOutcomes:\n" + "\n".join(f"- {o}" for o in w.outcomes)
+        for w in weeks
+    )
+    return f"""
+Write one markdown lesson per week listed below and return them as
+{{"modules": [{{"week": <n>, "markdown": "..."}}]}}.
+
+Requirements for every lesson:
+- Use exactly the 7 H2 headings in order
+- Practice exercises section must have exactly 3 numbered items
+- Media suggestions must include 2-3 image suggestions and 1-2 video suggestions
+- Keep content practical and concise
+
+Course topic: {field}
+Learner level: {level}
+Number of lessons: exactly {len(weeks)}
+
+{week_blocks}
+""".strip()
+
+def write_all_modules_markdown(field: str, level: str, weeks: list[WeekPlan]) -> list[str]:
+    """Generate markdown for several weeks with one LLM call per batch.
+
+    Weeks are sent in batches of at most MAX_BATCH_WEEKS. Any lesson that is
+    missing from the response or fails validate_module_markdown is written
+    again on its own with write_module_markdown.
+
+    Args:
+        field: Subject area/field of study
+        level: Learner level
+        weeks: Weeks to write
+
+    Returns:
+        Validated markdown per week, in the order of weeks
+
+    Raises:
+        DocumentPortalException: If a per-week fallback fails
+    """
+    llm = get_llm_client()
+    written: dict[int, str] = {}
+
+    for start in range(0, len(weeks), MAX_BATCH_WEEKS):
+        chunk = weeks[start:start + MAX_BATCH_WEEKS]
+        week_numbers = [w.week for w in chunk]
+        prompt = build_batch_module_prompt(field, level, chunk)
+        logger.info(f"[write_all_modules_markdown] Generating weeks {week_numbers} in one call")
+
+        try:
+            batch = llm.generate_structured(ModulesBatch, system=SYSTEM_MODULE_BATCH_WRITER, user=prompt, temperature=0.2)
+            by_week = {m.week: m.markdown.strip() for m in batch.modules}
+        except (ValidationError, ValueError) as e:
+            logger.warning(f"[write_all_modules_markdown] Batch for weeks {week_numbers} did not parse: {str(e)}")
+            llm.invalidate(system=SYSTEM_MODULE_BATCH_WRITER, user=prompt, temperature=0.2, schema=ModulesBatch)
+            by_week = {}
+
+        for w in chunk:
+            markdown = by_week.get(w.week)
+            if markdown:
+                try:
+                    written[w.week] = ensure_valid_module_markdown(markdown)
+                    continue
+                except ValueError as e:
+                    logger.warning(f"[write_all_modules_markdown] Week {w.week} invalid in batch, writing it alone: {str(e)}")
+            written[w.week] = write_module_markdown(field, level, w.week, w.title, w.outcomes)
+
+    return [written[w.week] for w in weeks]
@@ -9,3 +9,10 @@ class WeekPlan(BaseModel):
 
 class RoadmapOutline(BaseModel):
     weeks: List[WeekPlan] = Field(min_length=4, max_length=52)
+
+class ModuleMarkdown(BaseModel):
+    week: conint(ge=1, le=52)
+    markdown: str = Field(min_length=1)
+
+class ModulesBatch(BaseModel):
+    modules: List[ModuleMarkdown] = Field(min_length=1)
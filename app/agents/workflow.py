@@ -1,7 +1,9 @@
-import re
+from typing import Callable
+
 from pydantic import ValidationError
 
 from app.agents.schemas import RoadmapOutline
+from app.agents.llm.base import LLMClient, StructuredOutputError, parse_structured
 from app.agents.llm.client import get_llm_client
 from app.logger import GLOBAL_LOGGER as logger
 
@@ -25,11 +27,8 @@ def build_planner_prompt(field: str, level: str, weekly_hours: int, duration_wee
     Returns:
         Formatted prompt string for the LLM
     """
+    # Static schema and rules first, roadmap details last (prompt-cache friendly)
     return f"""
-Create a {duration_weeks}-week learning roadmap for: {field}
-Learner level: {level}
-Time budget: {weekly_hours} hours/week
-
 Output must be STRICT JSON matching this schema:
 {{
   "weeks": [
@@ -38,32 +37,16 @@ Output must be STRICT JSON matching this schema:
 }}
 
 Rules:
-- "weeks" must contain exactly {duration_weeks} items.
-- Each week.week must be 1..{duration_weeks} with no duplicates, in increasing order.
+- "weeks" must contain exactly one item per week of the roadmap.
+- Each week.week must count up from 1 with no duplicates, in increasing order.
 - outcomes: 2-6 items per week, each short and specific.
 - Titles must be concise.
-""".strip()
-
 
-def _extract_first_json_object(text: str) -> str | None:
-    """
-    Extract the first complete top-level JSON object using brace counting.
-    Returns the first balanced { ... } substring, or None if not found.
-    """
-    start = text.find("{")
-    if start == -1:
-        return None
-    
-    brace_count = 0
-    for i in range(start, len(text)):
-        if text[i] == "{":
-            brace_count += 1
-        elif text[i] == "}":
-            brace_count -= 1
-            if brace_count == 0:
-                return text[start:i + 1]
-    
-    return None
+Create a {duration_weeks}-week learning roadmap for: {field}
+Learner level: {level}
+Time budget: {weekly_hours} hours/week
+Weeks: exactly {duration_weeks}, numbered 1..{duration_weeks}
+""".strip()
 
 
 def _validate_outline(outline: RoadmapOutline, duration_weeks: int) -> None:
@@ -95,7 +78,43 @@ def _validate_outline(outline: RoadmapOutline, duration_weeks: int) -> None:
                 raise ValueError(f"Week {week.week} has empty outcome")
 
 
-def generate_roadmap_outline(field: str, level: str, weekly_hours: int, duration_weeks: int) -> RoadmapOutline:
+# Cap on the invalid output echoed back in the repair prompt
+MAX_REPAIR_OUTPUT_CHARS = 12000
+
+# Key opening each week object in the planner's JSON ("weeks" doesn't match)
+_WEEK_KEY = '"week"'
+
+
+def _stream_outline_text(llm: LLMClient, user_prompt: str, on_progress: Callable[[int], None]) -> str:
+    """Stream the planner response, reporting weeks as they are completed.
+    
+    Args:
+        llm: LLM client
+        user_prompt: Planner prompt
+        on_progress: Called with the number of fully written weeks whenever it grows
+        
+    Returns:
+        Full response text
+    """
+    text = ""
+    weeks_started = 0
+    # Native JSON mode, as generate_structured uses on the non-streamed path
+    for chunk in llm.generate_text_stream(system=SYSTEM_PLANNER, user=user_prompt, temperature=0.1,
+                                          json_mode=True):
+        # Only scan the new chunk plus enough of the old text to catch a
+        # key split across chunks
+        start = max(len(text) - len(_WEEK_KEY) + 1, 0)
+        text += chunk
+        found = text.count(_WEEK_KEY, start)
+        if found:
+            weeks_started += found
+            # The week just opened is still being written
+            on_progress(weeks_started - 1)
+    return text
+
+
+def generate_roadmap_outline(field: str, level: str, weekly_hours: int, duration_weeks: int,
+                             on_progress: Callable[[int], None] | None = None) -> RoadmapOutline:
     """Generate a roadmap outline using LLM with retry logic.
     
     Creates a structured learning roadmap with weekly modules and outcomes.
@@ -106,6 +125,9 @@ def generate_roadmap_outline(field: str, level: str, weekly_hours: int, duration
         level: Learner level (beginner, intermediate, advanced)
         weekly_hours: Hours available per week
         duration_weeks: Total duration in weeks
+        on_progress: If given, the first attempt is streamed (still in native
+            JSON mode) and this is called with the number of weeks written so
+            far. The repair round (if any) runs without progress.
         
     Returns:
         Validated RoadmapOutline object
@@ -119,39 +141,48 @@ def generate_roadmap_outline(field: str, level: str, weekly_hours: int, duration
 
     last_err: Exception | None = None
 
-    for attempt in range(1, 4):
-        raw_text = llm.generate_text(system=SYSTEM_PLANNER, user=user_prompt, temperature=0.1)
-
-        # 1) Try strict JSON validation
+    # Native JSON mode makes malformed output rare; keep one repair round as fallback
+    for attempt in range(1, 3):
+        outline: RoadmapOutline | None = None
+        raw_text: str | None = None
+        streamed = on_progress is not None and attempt == 1
         try:
-            outline = RoadmapOutline.model_validate_json(raw_text)
+            if streamed:
+                text = _stream_outline_text(llm, user_prompt, on_progress)
+                outline = parse_structured(RoadmapOutline, text)
+            else:
+                outline = llm.generate_structured(
+                    RoadmapOutline, system=SYSTEM_PLANNER, user=user_prompt, temperature=0.1
+                )
             _validate_outline(outline, duration_weeks)
             return outline
         except (ValidationError, ValueError) as e:
             last_err = e
+            if isinstance(e, StructuredOutputError):
+                raw_text = e.text
+            logger.warning(f"[generate_roadmap_outline] Attempt {attempt} did not validate: {str(e)}")
+
+        # Don't let a response cache replay an output that failed validation
+        llm.invalidate(system=SYSTEM_PLANNER, user=user_prompt, temperature=0.1,
+                       schema=None if streamed else RoadmapOutline)
+
+        # Build repair prompt with detailed error info: the parsed outline if it
+        # only failed our checks, else what the model actually wrote
+        if outline is not None:
+            invalid_output = outline.model_dump_json()
+        elif raw_text is not None:
+            invalid_output = raw_text[:MAX_REPAIR_OUTPUT_CHARS]
+        else:
+            invalid_output = "(no output)"
 
-        # 2) Try extracting embedded JSON object
-        extracted_json = _extract_first_json_object(raw_text)
-        if extracted_json:
-            try:
-                outline = RoadmapOutline.model_validate_json(extracted_json)
-                _validate_outline(outline, duration_weeks)
-                return outline
-            except (ValidationError, ValueError) as e:
-                last_err = e
-
-        # 3) Build repair prompt with detailed error info
-        error_text = str(last_err)
-        invalid_json = extracted_json if extracted_json else raw_text
-        
         user_prompt = f"""
 {build_planner_prompt(field, level, weekly_hours, duration_weeks)}
 
 PREVIOUS ATTEMPT FAILED:
-Error: {error_text}
+Error: {last_err}
 
 Invalid output:
-{invalid_json}
+{invalid_output}
 
 Return ONLY corrected JSON, no extra keys, no markdown.
 Must have exactly {duration_weeks} weeks with numbers 1..{duration_weeks}.
@@ -159,4 +190,3 @@ Each week needs 2-6 outcomes and non-empty title.
 """.strip()
 
     raise RuntimeError(f"Planner output did not validate after retries. Last error: {last_err}")
-
@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from app.deps import get_db
 from app.db.models.session_token import SessionToken
 from app.db.models.user import User
-from app.auth.sessions import SESSION_COOKIE_NAME, hash_token
+from app.auth.sessions import SESSION_COOKIE_NAME, hash_token, session_cache
 from app.settings import settings
 
 class NotAuthenticated(Exception):
@@ -18,6 +18,18 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
         raise NotAuthenticated()
 
     h = hash_token(raw)
+    now = datetime.now(timezone.utc)
+
+    # Recently validated token: skip the token lookup and last_seen write
+    cached = session_cache.get(h)
+    if cached is not None:
+        user_id, expires_at = cached
+        if expires_at > now:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user and user.is_active:
+                return user
+        session_cache.forget(h)
+
     tok = (
         db.query(SessionToken)
         .filter(SessionToken.token_hash == h,
@@ -28,7 +40,6 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     if not tok:
         raise NotAuthenticated()
 
-    now = datetime.now(timezone.utc)
     # Absolute expiry
     if tok.expires_at <= now:
         raise NotAuthenticated()
@@ -48,6 +59,8 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     user = db.query(User).filter(User.id == tok.user_id).first()
     if not user or not user.is_active:
         raise NotAuthenticated()
+
+    session_cache.put(h, tok.user_id, tok.expires_at, settings.session_cache_seconds)
     return user
     
 
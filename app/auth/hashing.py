@@ -2,14 +2,19 @@
 
 import bcrypt
 
+# bcrypt only uses the first 72 bytes of the password
+BCRYPT_MAX_BYTES = 72
+
+def _password_bytes(password: str) -> bytes:
+    # Truncate the encoded bytes, not characters: 72 non-ASCII characters
+    # encode to more than 72 bytes, which newer bcrypt releases reject.
+    # Same bytes as bcrypt's own truncation, so existing hashes still verify.
+    return password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+
 def hash_password(password: str) -> str:
-    # bcrypt has a 72-byte limit, truncate if necessary
-    password_bytes = password[:72].encode('utf-8')
     salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    return bcrypt.hashpw(_password_bytes(password), salt).decode('utf-8')
 
 def verify_password(password: str, password_hash: str) -> bool:
-    # bcrypt has a 72-byte limit, truncate if necessary
-    password_bytes = password[:72].encode('utf-8')
     hash_bytes = password_hash.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hash_bytes)
\ No newline at end of file
+    return bcrypt.checkpw(_password_bytes(password), hash_bytes)
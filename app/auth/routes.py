@@ -9,12 +9,11 @@ from app.deps import get_db
 from app.db.models.user import User
 from app.db.models.session_token import SessionToken
 from app.auth.hashing import hash_password, verify_password
-from app.auth.sessions import SESSION_COOKIE_NAME, new_raw_token, hash_token, absolute_expiry
-from fastapi.templating import Jinja2Templates
+from app.auth.sessions import SESSION_COOKIE_NAME, new_raw_token, hash_token, absolute_expiry, session_cache
 
 from app.settings import settings
+from app.templating import templates
 
-templates = Jinja2Templates(directory="app/templates")
 router = APIRouter()
 
 @router.get("/register", response_class=HTMLResponse)
@@ -73,6 +72,7 @@ def logout(request: Request, db: Session = Depends(get_db)):
     raw = request.cookies.get(SESSION_COOKIE_NAME)
     if raw:
         h = hash_token(raw)
+        session_cache.forget(h)
         tok = db.query(SessionToken).filter(SessionToken.token_hash == h,
         SessionToken.revoked_at.is_(None)).first()
         if tok:
@@ -2,6 +2,9 @@
 
 import hashlib
 import secrets
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 
 SESSION_COOKIE_NAME = "cc_session"
@@ -15,4 +18,44 @@ def hash_token(raw: str) -> str:
 
 def absolute_expiry(now: datetime | None = None) -> datetime:
     now = now or datetime.now(timezone.utc)
-    return now + timedelta(days=ABSOLUTE_DAYS)
\ No newline at end of file
+    return now + timedelta(days=ABSOLUTE_DAYS)
+
+
+class SessionCache:
+    """Short-lived per-process map of token_hash -> (user_id, expires_at).
+
+    Lets get_current_user skip the session-token query and the last_seen
+    update for a few seconds after a token was last checked against the DB.
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[uuid.UUID, datetime, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: str) -> tuple[uuid.UUID, datetime] | None:
+        with self._lock:
+            item = self._data.get(token_hash)
+            if item is None:
+                return None
+            user_id, expires_at, cached_until = item
+            if cached_until <= time.monotonic():
+                del self._data[token_hash]
+                return None
+            return user_id, expires_at
+
+    def put(self, token_hash: str, user_id: uuid.UUID, expires_at: datetime, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[token_hash] = (user_id, expires_at, time.monotonic() + ttl)
+
+    def forget(self, token_hash: str) -> None:
+        with self._lock:
+            self._data.pop(token_hash, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+session_cache = SessionCache()
@@ -0,0 +1,70 @@
+## Markdown -> HTML rendering for course modules
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from markdown_it import MarkdownIt
+
+# One parser per process; "js-default" disables raw HTML parsing vs commonmark
+_MD = MarkdownIt("js-default")
+
+# Below this many documents the process round-trip costs more than it saves
+PARALLEL_RENDER_MIN_DOCS = 4
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def render_module_html(content_md: str) -> str:
+    """Render module markdown to HTML.
+
+    Called when a module's markdown is saved so pages can serve the stored
+    HTML; view_course only falls back to it for rows written before
+    content_html existed.
+
+    Args:
+        content_md: Module markdown
+
+    Returns:
+        HTML string (raw HTML in the markdown is escaped)
+    """
+    return _MD.render(content_md)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web server process is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def render_many(md_texts: list[str]) -> list[str]:
+    """Render several modules' markdown, in parallel when it pays off.
+
+    Parsing is CPU-bound, so large batches are spread over a shared process
+    pool (created on first use); small ones are rendered inline.
+
+    Args:
+        md_texts: Module markdown documents
+
+    Returns:
+        HTML strings in the same order as md_texts
+    """
+    if len(md_texts) < PARALLEL_RENDER_MIN_DOCS:
+        return [render_module_html(md) for md in md_texts]
+    return list(_get_pool().map(render_module_html, md_texts))
+
+
+def shutdown_render_pool() -> None:
+    """Stop the render worker processes, if any were started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
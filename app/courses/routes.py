@@ -1,14 +1,13 @@
-import json
 import uuid
+from datetime import datetime
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, Depends, Request, Form
+from fastapi import APIRouter, Depends, Query, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload
+from sqlalchemy import delete, desc, select, tuple_, update
 from starlette import status
 
-from markdown_it import MarkdownIt
 from markupsafe import Markup
 
 from app.deps import get_db
@@ -16,35 +15,62 @@ from app.auth.deps import get_current_user
 from app.db.models.user import User
 from app.db.models.course import Course
 from app.db.models.course_module import CourseModule
-from app.db.models.generation_run import GenerationRun
-from app.jobs.tasks import enqueue_job
+from app.jobs.tasks import start_run
+from app.courses.rendering import render_many
+from app.templating import stream_template, templates
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
 
-templates = Jinja2Templates(directory="app/templates")
 router = APIRouter(prefix="/courses")
 
+COURSES_PAGE_SIZE = 25
+
 @router.get("", response_class=HTMLResponse)
 @router.get("/", response_class=HTMLResponse)
 def list_courses(
     request: Request,
+    before: datetime | None = None,
+    before_id: uuid.UUID | None = None,
+    limit: int = Query(COURSES_PAGE_SIZE, ge=1, le=100),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
 
-    courses = (
+    # Keyset pagination on (updated_at, id), newest first: each page is a
+    # bounded backward scan of ix_courses_user_updated however many courses
+    # the user has. Only the columns the list template shows are loaded.
+    query = (
         db.query(Course)
+        .options(load_only(
+            Course.id, Course.title, Course.description, Course.status, Course.modules_count, Course.updated_at,
+        ))
         .filter(Course.user_id == user.id)
-        .order_by(desc(Course.updated_at)) # newest first
+    )
+    if before is not None and before_id is not None:
+        query = query.filter(tuple_(Course.updated_at, Course.id) < tuple_(before, before_id))
+    courses = (
+        query
+        .order_by(desc(Course.updated_at), desc(Course.id))
+        .limit(limit + 1)  # one extra row tells us whether there's an older page
         .all()
     )
 
+    next_url = None
+    if len(courses) > limit:
+        courses = courses[:limit]
+        last = courses[-1]
+        next_url = "/courses?" + urlencode(
+            {"before": last.updated_at.isoformat(), "before_id": str(last.id), "limit": limit}
+        )
+
     return templates.TemplateResponse(
         "courses_list.html",
         {
             "request": request,
             "user": user,
             "courses": courses,
+            "next_url": next_url,
+            "is_first_page": before is None,
         },
     )
 
@@ -56,57 +82,78 @@ def view_course(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    # Course and its modules (ordered by week) in one round trip
     course = (
         db.query(Course)
+        .options(
+            joinedload(Course.modules).load_only(
+                CourseModule.week,
+                CourseModule.title,
+                CourseModule.outcomes,
+                CourseModule.content_html,
+                CourseModule.media_suggestions,
+            ),
+            raiseload("*"),
+        )
         .filter(Course.id == course_id, Course.user_id == user.id)
         .first()
     )
     if not course:
         return RedirectResponse(url="/dashboard?error=course_not_found", status_code=303)
 
-    modules = (
-        db.query(CourseModule)
-        .filter(CourseModule.course_id == course.id)
-        .order_by(CourseModule.week.asc())
-        .all()
-    )
+    # content_md is only needed for rows written before content_html existed;
+    # fetch it for those in one query rather than loading it for every row
+    legacy_ids = [m.id for m in course.modules if m.content_html is None]
+    legacy_md = {}
+    if legacy_ids:
+        legacy_md = dict(
+            db.query(CourseModule.id, CourseModule.content_md)
+            .filter(CourseModule.id.in_(legacy_ids))
+            .all()
+        )
 
-    md = MarkdownIt("js-default")  # disables raw HTML parsing vs commonmark 
+    # Render legacy rows in one batch and store the HTML so later views skip it
+    legacy = [m for m in course.modules if (legacy_md.get(m.id) or "").strip()]
+    rendered = {}
+    if legacy:
+        htmls = render_many([legacy_md[m.id] for m in legacy])
+        rendered = {m.id: html for m, html in zip(legacy, htmls)}
+        db.execute(
+            update(CourseModule),
+            [{"id": module_id, "content_html": html} for module_id, html in rendered.items()],
+        )
 
-    module_views = []
-    for m in modules:
+    def module_view(m: CourseModule) -> dict:
         content_html = None
-        if m.content_md and m.content_md.strip():
-            content_html = Markup(md.render(m.content_md))  # mark as safe for Jinja 
-
-        # Parse media suggestions if available
-        media_suggestions = None
-        if m.media_suggestions_json:
-            try:
-                media_suggestions = json.loads(m.media_suggestions_json)
-            except json.JSONDecodeError:
-                media_suggestions = None
-
-        module_views.append(
-            {
-                "week": m.week,
-                "title": m.title,
-                "outcomes": json.loads(m.outcomes_json),
-                "content_md": m.content_md,
-                "content_html": content_html,
-                "media_suggestions": media_suggestions,
-            }
-        )
+        if m.content_html:
+            content_html = Markup(m.content_html)  # rendered when the module was saved
+        elif m.id in rendered:
+            content_html = Markup(rendered[m.id])  # mark as safe for Jinja 
+        return {
+            "week": m.week,
+            "title": m.title,
+            "outcomes": m.outcomes,
+            "content_html": content_html,
+            "media_suggestions": m.media_suggestions,
+        }
+
+    # The template renders after this handler returns, so detach everything it
+    # reads: neither the commit below nor closing the session can expire it
+    db.expunge(course)
+    if rendered:
+        db.commit()
 
     run_id = request.query_params.get("run")
 
-    return templates.TemplateResponse(
+    # Streamed: module views are built as the template's loop reaches them
+    return stream_template(
+        templates,
         "course_view.html",
         {
             "request": request,
             "user": user,
             "course": course,
-            "modules": module_views,
+            "modules": (module_view(m) for m in course.modules),
             "run_id": run_id,
         },
     )
@@ -118,51 +165,46 @@ def generate_course_modules(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    course = (
-        db.query(Course)
-        .filter(Course.id == course_id, Course.user_id == user.id)
-        .first()
-    )
+    # Ownership check; only roadmap_id is needed, so skip ORM hydration
+    course = db.execute(
+        select(Course.id, Course.roadmap_id)
+        .where(Course.id == course_id, Course.user_id == user.id)
+        .limit(1)
+    ).first()
     if not course:
         return RedirectResponse(url="/dashboard?error=course_not_found", status_code=303)
 
-    run = GenerationRun(
+    run_id = start_run(
+        db,
+        job_type="generate_course_modules",
         user_id=user.id,
         roadmap_id=course.roadmap_id,
         course_id=course.id,
-        status="queued",
-        progress=0,
         message="Queued module writing",
     )
-    db.add(run)
-    db.flush()
-
-    task_id = enqueue_job(
-        job_type="generate_course_modules",
-        run_id=str(run.id),
-        course_id=str(course.id),
-    )
-    run.celery_task_id = task_id  # legacy field
-    db.commit()
 
-    return RedirectResponse(url=f"/courses/{course.id}?run={run.id}", status_code=303)
+    return RedirectResponse(url=f"/courses/{course_id}?run={run_id}", status_code=303)
 
 @router.post("/{course_id}/delete")
 def delete_course(
     course_id: uuid.UUID,
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
-    course = (
-        db.query(Course)
-        .filter(Course.id == course_id, Course.user_id == user.id)
-        .first()
+    # Single DELETE; modules cascade and runs are detached by the FKs
+    result = db.execute(
+        delete(Course).where(Course.id == course_id, Course.user_id == user.id)
     )
-    if not course:
+    if result.rowcount:
+        db.commit()
+
+    if request.headers.get("HX-Request"):
+        # htmx replaces the course card with this empty body, removing it;
+        # a course that was already gone is dropped from the page the same way
+        return HTMLResponse("")
+    if result.rowcount == 0:
         return RedirectResponse(url="/courses?error=course_not_found", 
         status_code=303)
 
-    db.delete(course)
-    db.commit()
-
-    return RedirectResponse(url="/courses?deleted=1", status_code=303)
\ No newline at end of file
+    return RedirectResponse(url="/courses?deleted=1", status_code=303)
@@ -0,0 +1,43 @@
+"""course module outcomes stored as jsonb
+
+Revision ID: 3f1c2a7b9d40
+Revises: 6eb0dd41e053
+Create Date: 2026-03-02 10:14:27.512331
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a7b9d40"
+down_revision: Union[str, None] = "6eb0dd41e053"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows already hold json.dumps(list[str]), so a plain cast works
+    op.alter_column(
+        "course_modules",
+        "outcomes_json",
+        existing_type=sa.Text(),
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        existing_nullable=False,
+        postgresql_using="outcomes_json::jsonb",
+    )
+    op.alter_column("course_modules", "outcomes_json", new_column_name="outcomes")
+
+
+def downgrade() -> None:
+    op.alter_column("course_modules", "outcomes", new_column_name="outcomes_json")
+    op.alter_column(
+        "course_modules",
+        "outcomes_json",
+        existing_type=postgresql.JSONB(astext_type=sa.Text()),
+        type_=sa.Text(),
+        existing_nullable=False,
+        postgresql_using="outcomes_json::text",
+    )
@@ -0,0 +1,26 @@
+"""generation_runs.result_json: lz4 TOAST compression
+
+Revision ID: a1d5c7e93b20
+Revises: f3c81d6e5a92
+Create Date: 2026-10-15 10:12:44.031877
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1d5c7e93b20"
+down_revision: Union[str, None] = "f3c81d6e5a92"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Postgres 14+. Only affects values written from now on; existing rows
+    # keep pglz until they are rewritten.
+    op.execute("ALTER TABLE generation_runs ALTER COLUMN result_json SET COMPRESSION lz4")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE generation_runs ALTER COLUMN result_json SET COMPRESSION pglz")
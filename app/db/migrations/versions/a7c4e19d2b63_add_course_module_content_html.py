@@ -0,0 +1,29 @@
+"""add course module content_html
+
+Revision ID: a7c4e19d2b63
+Revises: 3f1c2a7b9d40
+Create Date: 2026-03-03 09:02:51.208674
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c4e19d2b63"
+down_revision: Union[str, None] = "3f1c2a7b9d40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows stay NULL and are rendered on view until regenerated
+    op.add_column(
+        "course_modules",
+        sa.Column("content_html", sa.Text(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("course_modules", "content_html")
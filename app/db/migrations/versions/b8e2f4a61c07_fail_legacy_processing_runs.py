@@ -0,0 +1,33 @@
+"""fail legacy generation runs left in 'processing'
+
+Revision ID: b8e2f4a61c07
+Revises: a1d5c7e93b20
+Create Date: 2026-10-15 23:05:17.482913
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8e2f4a61c07"
+down_revision: Union[str, None] = "a1d5c7e93b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Workers only write 'running' now, so nothing will ever finish these rows;
+    # active means ('queued', 'running') everywhere, matching the partial index
+    op.execute(
+        """
+        UPDATE generation_runs SET status = 'failed', error = 'Interrupted; please start a new run',
+            finished_at = now()
+        WHERE status = 'processing'
+        """
+    )
+
+
+def downgrade() -> None:
+    # The old status isn't recorded; failed rows stay failed
+    pass
@@ -0,0 +1,43 @@
+"""course module media suggestions stored as jsonb
+
+Revision ID: c2d85f3e6a14
+Revises: a7c4e19d2b63
+Create Date: 2026-03-03 11:37:05.884120
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "c2d85f3e6a14"
+down_revision: Union[str, None] = "a7c4e19d2b63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Values were always written with json.dumps, so a plain cast works
+    op.alter_column(
+        "course_modules",
+        "media_suggestions_json",
+        existing_type=sa.Text(),
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        existing_nullable=True,
+        postgresql_using="media_suggestions_json::jsonb",
+    )
+    op.alter_column("course_modules", "media_suggestions_json", new_column_name="media_suggestions")
+
+
+def downgrade() -> None:
+    op.alter_column("course_modules", "media_suggestions", new_column_name="media_suggestions_json")
+    op.alter_column(
+        "course_modules",
+        "media_suggestions_json",
+        existing_type=postgresql.JSONB(astext_type=sa.Text()),
+        type_=sa.Text(),
+        existing_nullable=True,
+        postgresql_using="media_suggestions_json::text",
+    )
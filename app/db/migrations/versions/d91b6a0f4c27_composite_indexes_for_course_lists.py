@@ -0,0 +1,33 @@
+"""composite indexes for course and module listing
+
+Revision ID: d91b6a0f4c27
+Revises: c2d85f3e6a14
+Create Date: 2026-03-04 14:20:13.603917
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d91b6a0f4c27"
+down_revision: Union[str, None] = "c2d85f3e6a14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The composite indexes lead with the old single-column keys, so those are dropped
+    op.create_index("ix_courses_user_updated", "courses", ["user_id", "updated_at"], unique=False)
+    op.drop_index(op.f("ix_courses_user_id"), table_name="courses")
+
+    op.create_index("ix_course_modules_course_week", "course_modules", ["course_id", "week"], unique=False)
+    op.drop_index(op.f("ix_course_modules_course_id"), table_name="course_modules")
+
+
+def downgrade() -> None:
+    op.create_index(op.f("ix_course_modules_course_id"), "course_modules", ["course_id"], unique=False)
+    op.drop_index("ix_course_modules_course_week", table_name="course_modules")
+
+    op.create_index(op.f("ix_courses_user_id"), "courses", ["user_id"], unique=False)
+    op.drop_index("ix_courses_user_updated", table_name="courses")
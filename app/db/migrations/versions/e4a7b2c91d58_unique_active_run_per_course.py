@@ -0,0 +1,45 @@
+"""unique active generation run per course
+
+Revision ID: e4a7b2c91d58
+Revises: d91b6a0f4c27
+Create Date: 2026-03-05 10:12:41.220517
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7b2c91d58"
+down_revision: Union[str, None] = "d91b6a0f4c27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the newest active run per course; older duplicates can't be unique-indexed
+    op.execute(
+        """
+        UPDATE generation_runs SET status = 'failed', error = 'Superseded by a newer run', finished_at = now()
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY course_id ORDER BY created_at DESC) AS rn
+                FROM generation_runs
+                WHERE course_id IS NOT NULL AND status IN ('queued', 'running')
+            ) ranked
+            WHERE rn > 1
+        )
+        """
+    )
+    op.create_index(
+        "uq_generation_runs_active_course",
+        "generation_runs",
+        ["course_id"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_generation_runs_active_course", table_name="generation_runs")
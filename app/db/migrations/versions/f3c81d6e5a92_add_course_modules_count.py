@@ -0,0 +1,35 @@
+"""add courses.modules_count
+
+Revision ID: f3c81d6e5a92
+Revises: e4a7b2c91d58
+Create Date: 2026-03-05 16:47:09.518302
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f3c81d6e5a92"
+down_revision: Union[str, None] = "e4a7b2c91d58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "courses",
+        sa.Column("modules_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE courses SET modules_count = counts.n
+        FROM (SELECT course_id, count(*) AS n FROM course_modules GROUP BY course_id) counts
+        WHERE counts.course_id = courses.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("courses", "modules_count")
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, String, func, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, func, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -10,17 +10,36 @@ from app.db.base import Base
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        # list_courses: WHERE user_id = ? ORDER BY updated_at DESC (scanned backwards);
+        # also serves every user_id-only lookup
+        Index("ix_courses_user_updated", "user_id", "updated_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     roadmap_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("roadmaps.id", ondelete="CASCADE"), index=True)
 
     status: Mapped[str] = mapped_column(String(30), nullable=False, default="draft")  # draft/running/ready/failed
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Denormalized so list pages can show it without touching course_modules;
+    # set when the outline creates the modules
+    modules_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     # Relationships
     roadmap: Mapped["Roadmap"] = relationship("Roadmap", backref="courses")
+    # lazy="raise": load modules explicitly (joinedload/selectinload) so a
+    # forgotten eager load fails loudly instead of issuing an extra query.
+    # The FK cascades on delete, so deleting a course never loads them.
+    modules: Mapped[list["CourseModule"]] = relationship(
+        "CourseModule",
+        back_populates="course",
+        order_by="CourseModule.week",
+        lazy="raise",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
@@ -1,24 +1,32 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, func, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, func, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
 
 
 class CourseModule(Base):
     __tablename__ = "course_modules"
+    __table_args__ = (
+        # Modules are always fetched per course, ordered by week
+        Index("ix_course_modules_course_week", "course_id", "week"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    course_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("courses.id", ondelete="CASCADE"), index=True)
+    course_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("courses.id", ondelete="CASCADE"))
 
     week: Mapped[int] = mapped_column(Integer, nullable=False)
     title: Mapped[str] = mapped_column(String(200), nullable=False)
 
-    outcomes_json: Mapped[str] = mapped_column(Text, nullable=False)   # store list[str] as JSON string for MVP
+    outcomes: Mapped[list[str]] = mapped_column(JSONB, nullable=False)  # list[str], decoded by the driver
     content_md: Mapped[str | None] = mapped_column(Text, nullable=True)
-    media_suggestions_json: Mapped[str | None] = mapped_column(Text, nullable=True)  # store image/video suggestions as JSON
+    content_html: Mapped[str | None] = mapped_column(Text, nullable=True)  # rendered from content_md on save
+    media_suggestions: Mapped[dict | None] = mapped_column(JSONB, nullable=True)  # {"images": [...], "videos": [...]}
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Relationships
+    course: Mapped["Course"] = relationship("Course", back_populates="modules", lazy="raise")
@@ -2,15 +2,31 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, String, func, Text
+from sqlalchemy import DateTime, ForeignKey, Index, String, func, Text, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
 
 
+# Statuses of a run that still has (or will have) a worker on it. The
+# predicate is literal SQL so ON CONFLICT can match it to the partial index.
+ACTIVE_RUN_STATUSES = ("queued", "running")
+ACTIVE_RUN_PREDICATE = text("status IN ('queued', 'running')")
+
+
 class GenerationRun(Base):
     __tablename__ = "generation_runs"
+    __table_args__ = (
+        # At most one active run per course, so repeated "generate" submits
+        # can't start duplicate LLM jobs (start_run relies on this)
+        Index(
+            "uq_generation_runs_active_course",
+            "course_id",
+            unique=True,
+            postgresql_where=ACTIVE_RUN_PREDICATE,
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
@@ -29,7 +45,10 @@ class GenerationRun(Base):
     progress: Mapped[int] = mapped_column(nullable=False, default=0)  # 0-100
     message: Mapped[str | None] = mapped_column(Text, nullable=True)
 
-    result_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Full outline JSON, only read once a run has succeeded; deferred so
+    # status polls and run lists don't pull the (TOASTed) value. Stored with
+    # lz4 TOAST compression (migration a1d5c7e93b20)
+    result_json: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
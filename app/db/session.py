@@ -1,3 +1,4 @@
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -6,11 +7,16 @@ from app.settings import settings
 # Optimized database engine with connection pooling
 engine = create_engine(
     settings.database_url,
-    pool_size=20,          # Number of connections to keep in pool
-    max_overflow=30,        # Max connections beyond pool size
+    pool_size=settings.db_pool_size,          # Number of connections to keep in pool
+    max_overflow=settings.db_max_overflow,    # Max connections beyond pool size
     pool_pre_ping=True,     # Validate connections
-    pool_recycle=3600,     # Recycle connections every hour
-    echo=False               # Disable SQL logging for performance
+    pool_recycle=settings.db_pool_recycle_seconds,  # Recycle connections before server/proxy idle timeouts
+    pool_timeout=settings.db_pool_timeout_seconds,  # Max wait for a free connection
+    pool_use_lifo=True,     # Reuse the most recent connection; idle extras can time out
+    echo=False,              # Disable SQL logging for performance
+    # JSONB columns (outcomes, media_suggestions) encode/decode with orjson
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=orjson.loads,
 )
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
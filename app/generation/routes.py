@@ -1,24 +1,41 @@
+import asyncio
 import uuid
 import gzip
-import json
+import hashlib
     
+import orjson
 from fastapi import Response
-from fastapi import APIRouter, Depends, Request, Form
-from fastapi.responses import RedirectResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Form
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session, load_only
 
 from app.deps import get_db
+from app.db.session import SessionLocal
 from app.auth.deps import get_current_user
 from app.db.models.user import User
 from app.db.models.roadmap import Roadmap
 from app.db.models.course import Course
-from app.db.models.generation_run import GenerationRun
-from app.jobs.tasks import enqueue_job, get_queue_status, clear_pending_queue, clear_processing_queue, cancel_job_by_run_id, queue_roadmap_generation
+from app.db.models.generation_run import ACTIVE_RUN_STATUSES, GenerationRun
+from app.jobs.tasks import start_run, get_queue_status, clear_pending_queue, clear_processing_queue, cancel_job_by_run_id
+from app.jobs.redis_client import async_redis_client
+from app.jobs.run_store import run_channel
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
+from app.templating import templates
+from app.http_cache import etag_matches
 
 router = APIRouter(prefix="/generation")
 
+# Upper bound on run IDs accepted by one /runs/status call
+MAX_STATUS_IDS = 50
+# A run's event stream ends once it reaches one of these
+FINISHED_RUN_STATUSES = ("succeeded", "failed")
+# Smaller JSON bodies aren't worth gzipping
+GZIP_MIN_BYTES = 500
+# Comment line sent on idle streams so proxies keep them open
+SSE_KEEPALIVE_SECONDS = 15
+
 
 @router.post("/roadmaps/{roadmap_id}/generate")
 def start_generation(
@@ -40,26 +57,15 @@ def start_generation(
 
     logger.info(f"[start_generation] Found roadmap: {rm.title}")
 
-    run = GenerationRun(
+    run_id = start_run(
+        db,
+        job_type="generate_roadmap_outline",
         user_id=user.id,
         roadmap_id=rm.id,
-        status="queued",
-        progress=0,
-        message="Queued",
     )
-    db.add(run)
-    db.flush()  # ensures run.id exists without committing yet
-    logger.info(f"[start_generation] Created generation run: {run.id}")
-
-    # Queue task using Redis queue
-    task_id = queue_roadmap_generation(str(run.id))
-    run.celery_task_id = task_id  # legacy field; rename later if required
-    logger.info(f"[start_generation] Queued task: {task_id}")
-
-    db.commit()
-    logger.info(f"[start_generation] Database committed, redirecting to: /roadmaps/{rm.id}?run={run.id}")
+    logger.info(f"[start_generation] Created and queued generation run: {run_id}")
 
-    return RedirectResponse(url=f"/roadmaps/{rm.id}?run={run.id}", status_code=303)
+    return RedirectResponse(url=f"/roadmaps/{roadmap_id}?run={run_id}", status_code=303)
 
 
 @router.post("/courses/{course_id}/generate")
@@ -70,78 +76,209 @@ def start_course_modules_generation(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    course = (
-        db.query(Course)
-        .filter(Course.id == course_id, Course.user_id == user.id)
-        .first()
-    )
+    # Ownership check; only roadmap_id is needed, so skip ORM hydration
+    course = db.execute(
+        select(Course.id, Course.roadmap_id)
+        .where(Course.id == course_id, Course.user_id == user.id)
+        .limit(1)
+    ).first()
     if not course:
         return RedirectResponse(url="/courses?error=not_found", status_code=303)
 
-    run = GenerationRun(
+    run_id = start_run(
+        db,
+        job_type="generate_course_modules",
         user_id=user.id,
         roadmap_id=course.roadmap_id,
         course_id=course.id,
-        status="queued",
-        progress=0,
-        message="Queued",
-    )
-    db.add(run)
-    db.flush()
-
-    task_id = enqueue_job(
-        job_type="generate_course_modules",
-        run_id=str(run.id),
-        course_id=str(course.id),
         overwrite=bool(overwrite),
     )
-    run.celery_task_id = task_id  # legacy field
 
-    db.commit()
+    if request.headers.get("HX-Request"):
+        # htmx swaps this in place of the button; no full page re-render
+        return templates.TemplateResponse(
+            "_course_run_started.html",
+            {"request": request, "course_id": course_id, "run_id": run_id},
+        )
+    return RedirectResponse(url=f"/courses/{course_id}?run={run_id}", status_code=303)
 
-    return RedirectResponse(url=f"/courses/{course.id}?run={run.id}", status_code=303)
 
+def compress_response(request: Request, data: dict | list, headers: dict | None = None,
+                      status_code: int = 200) -> Response:
+    """JSON response, gzipped when the client accepts it and it's worth it.
+
+    Serialized with orjson, which also handles UUID and datetime values.
+    Not done with GZipMiddleware: it doesn't flush per chunk, which would
+    hold back the run event stream and streamed pages.
+    """
+    body = orjson.dumps(data)
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def run_etag(status: str, progress: int, message: str | None, error: str | None) -> str:
+    """Weak ETag for a run's pollable state; changes whenever any shown field does."""
+    digest = hashlib.blake2b(
+        f"{status}\x00{progress}\x00{message or ''}\x00{error or ''}".encode("utf-8"),
+        digest_size=8,
+    ).hexdigest()
+    return f'W/"{digest}"'
 
-def compress_response(data: dict) -> JSONResponse:
-    """Compress JSON response with gzip for better performance."""
-    
-    json_data = json.dumps(data)
-    compressed = gzip.compress(json_data.encode('utf-8'))
-    
-    return Response(
-        content=compressed,
-        media_type="application/json",
-        headers={"Content-Encoding": "gzip"}
-    )
+
+
+# Declared before /runs/{run_id} so "status" isn't parsed as a run ID
+@router.get("/runs/status")
+def get_runs_status(
+    request: Request,
+    ids: list[uuid.UUID] = Query(..., max_length=MAX_STATUS_IDS),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Status of several runs in one query, keyed by run ID.
+
+    Runs that don't exist or belong to another user are left out.
+    """
+    rows = db.execute(
+        select(
+            GenerationRun.id,
+            GenerationRun.status,
+            GenerationRun.progress,
+            GenerationRun.message,
+            GenerationRun.error,
+            GenerationRun.course_id,
+            # Only ship the (large) result once the run has succeeded
+            case((GenerationRun.status == "succeeded", GenerationRun.result_json), else_=None).label("result_json"),
+        ).where(GenerationRun.id.in_(ids), GenerationRun.user_id == user.id)
+    ).all()
+
+    return compress_response(request, {
+        str(row.id): {
+            "id": row.id,
+            "status": row.status,
+            "progress": row.progress,
+            "message": row.message,
+            "error": row.error,
+            "course_id": row.course_id,
+            "result_json": row.result_json,
+        }
+        for row in rows
+    })
 
 
 @router.get("/runs/{run_id}")
 def get_run_status(
     run_id: uuid.UUID,
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
+    # result_json is loaded on access, i.e. only when a succeeded run is sent
     run = (
         db.query(GenerationRun)
+        .options(load_only(
+            GenerationRun.id,
+            GenerationRun.status,
+            GenerationRun.progress,
+            GenerationRun.message,
+            GenerationRun.error,
+            GenerationRun.course_id,
+        ))
         .filter(GenerationRun.id == run_id, GenerationRun.user_id == user.id)
         .first()
     )
     if not run:
-        return JSONResponse({"error": "not_found"}, status_code=404)
+        return ORJSONResponse({"error": "not_found"}, status_code=404)
 
-    return compress_response({
-        "id": str(run.id),
+    # Most polls see an unchanged run; answer those without a body
+    etag = run_etag(run.status, run.progress, run.message, run.error)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return compress_response(request, {
+        "id": run.id,
         "status": run.status,
         "progress": run.progress,
         "message": run.message,
         "error": run.error,
-        "course_id": str(run.course_id) if run.course_id else None,
+        "course_id": run.course_id,
         "result_json": run.result_json if run.status == "succeeded" else None,
-    })
+    }, headers=headers)
+
+
+def _run_snapshot(run_id: uuid.UUID) -> dict | None:
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(GenerationRun.status, GenerationRun.progress, GenerationRun.message, GenerationRun.error)
+            .where(GenerationRun.id == run_id)
+        ).first()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    return {"id": str(run_id), **row._asdict()}
+
+
+async def _run_events(run_id: uuid.UUID, request: Request):
+    """Yield a run's status as server-sent events until it finishes.
+
+    Subscribes before reading the current state so no change published in
+    between is missed. Each event carries only the fields that changed.
+    """
+    pubsub = async_redis_client.pubsub()
+    await pubsub.subscribe(run_channel(run_id))
+    try:
+        snapshot = await asyncio.to_thread(_run_snapshot, run_id)
+        if snapshot is None:
+            return
+        yield b"data: " + orjson.dumps(snapshot) + b"\n\n"
+        if snapshot["status"] in FINISHED_RUN_STATUSES:
+            return
+
+        while not await request.is_disconnected():
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE_SECONDS)
+            if message is None:
+                yield b": keepalive\n\n"
+                continue
+            yield f"data: {message['data']}\n\n".encode()
+            if orjson.loads(message["data"]).get("status") in FINISHED_RUN_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+@router.get("/runs/{run_id}/events")
+def stream_run_events(
+    run_id: uuid.UUID,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Stream a run's progress as server-sent events (replaces polling /runs/{run_id})."""
+    owned = (
+        db.query(GenerationRun.id)
+        .filter(GenerationRun.id == run_id, GenerationRun.user_id == user.id)
+        .first()
+    )
+    if not owned:
+        return ORJSONResponse({"error": "not_found"}, status_code=404)
+
+    return StreamingResponse(
+        _run_events(run_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/runs")
 def get_user_active_runs(
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -150,21 +287,21 @@ def get_user_active_runs(
         db.query(GenerationRun)
         .filter(
             GenerationRun.user_id == user.id,
-            GenerationRun.status.in_(["queued", "processing"])
+            GenerationRun.status.in_(ACTIVE_RUN_STATUSES)
         )
         .order_by(GenerationRun.created_at.desc())
         .all()
     )
     
-    return compress_response([
+    return compress_response(request, [
         {
-            "id": str(run.id),
+            "id": run.id,
             "status": run.status,
             "progress": run.progress,
             "message": run.message,
-            "course_id": str(run.course_id) if run.course_id else None,
-            "roadmap_id": str(run.roadmap_id) if run.roadmap_id else None,
-            "created_at": run.created_at.isoformat() if run.created_at else None,
+            "course_id": run.course_id,
+            "roadmap_id": run.roadmap_id,
+            "created_at": run.created_at,
         }
         for run in runs
     ])
@@ -172,49 +309,60 @@ def get_user_active_runs(
 
 @router.get("/queue/status")
 def queue_status(
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     """Get current queue status (pending and processing jobs)."""
     status = get_queue_status()
 
-    # Enrich with run details from DB
-    for task_list in [status.get("pending", []), status.get("processing", [])]:
-        for task in task_list:
-            # Access run_id from nested task structure
-            task_data = task.get("task", {})
-            run_id = task_data.get("run_id")
-            if run_id:
-                run = db.query(GenerationRun).filter(
-                    GenerationRun.id == uuid.UUID(str(run_id)),
-                    GenerationRun.user_id == user.id
-                ).first()
-                if run:
-                    task["run_status"] = run.status
-                    task["progress"] = run.progress or 0
-                    task["message"] = run.message
-
-    return compress_response(status)
+    # Enrich with run details from DB, one query for every queued task
+    tasks = [
+        task
+        for task_list in (status.get("pending", []), status.get("processing", []))
+        for task in task_list
+        if task.get("task", {}).get("run_id")  # run_id sits in the nested task payload
+    ]
+    run_ids = {uuid.UUID(str(task["task"]["run_id"])) for task in tasks}
+    runs = {}
+    if run_ids:
+        runs = {
+            row.id: row
+            for row in db.execute(
+                select(GenerationRun.id, GenerationRun.status, GenerationRun.progress, GenerationRun.message)
+                .where(GenerationRun.id.in_(run_ids), GenerationRun.user_id == user.id)
+            )
+        }
+    for task in tasks:
+        run = runs.get(uuid.UUID(str(task["task"]["run_id"])))
+        if run:
+            task["run_status"] = run.status
+            task["progress"] = run.progress or 0
+            task["message"] = run.message
+
+    return compress_response(request, status)
 
 
 @router.post("/queue/clear-pending")
 def clear_pending(
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     """Clear all pending jobs from the queue."""
     count = clear_pending_queue()
-    return compress_response({"ok": True, "cleared": count})
+    return compress_response(request, {"ok": True, "cleared": count})
 
 
 @router.post("/queue/clear-processing")
 def clear_processing(
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     """Clear all processing jobs and mark them as failed."""
     count = clear_processing_queue()
-    return compress_response({
+    return compress_response(request, {
         "ok": True,
         "cleared": count
     })
@@ -222,13 +370,14 @@ def clear_processing(
 
 @router.post("/queue/clear-all")
 def clear_all(
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     """Clear both pending and processing queues."""
     pending_count = clear_pending_queue()
     processing_count = clear_processing_queue()
-    return compress_response({
+    return compress_response(request, {
         "ok": True,
         "cleared_pending": pending_count,
         "cleared_processing": processing_count,
@@ -239,6 +388,7 @@ def clear_all(
 @router.post("/runs/{run_id}/cancel")
 def cancel_run(
     run_id: uuid.UUID,
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -249,7 +399,7 @@ def cancel_run(
         GenerationRun.user_id == user.id
     ).first()
     if not run:
-        return compress_response({"error": "not_found"}, status_code=404)
+        return compress_response(request, {"error": "not_found"}, status_code=404)
 
     result = cancel_job_by_run_id(str(run_id))
-    return compress_response(result)
+    return compress_response(request, result)
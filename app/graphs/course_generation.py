@@ -1,19 +1,23 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import uuid
-from typing import TypedDict, List
+from typing import Callable, TypedDict, List
 
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
+from sqlalchemy.orm import joinedload
 
 from app.db.session import SessionLocal
 from app.jobs.run_store import update_run
 from app.db.models.generation_run import GenerationRun
 from app.db.models.course import Course
 from app.db.models.course_module import CourseModule
-from app.db.models.roadmap import Roadmap
-from app.agents.module_writer import write_module_markdown
+from app.courses.rendering import render_module_html
+from app.agents.module_writer import MAX_BATCH_WEEKS, awrite_module_markdown, write_all_modules_markdown
+from app.agents.schemas import WeekPlan
+from app.agents.llm.client import get_llm_client
+from app.settings import settings
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
 
@@ -55,7 +59,8 @@ def load_state(state: GenState, config: RunnableConfig) -> GenState:
         run = db.query(GenerationRun).filter(GenerationRun.id == run_id).first()
         if not run:
             logger.error(f"[load_state] Run not found: {run_id}")
-            update_run(state["run_id"], status="failed", error="Run not found", finished=True)
+            update_run(state["run_id"], status="failed", error="Run not found", finished=True, db=db)
+            db.commit()
             return state
 
         course = (
@@ -65,7 +70,8 @@ def load_state(state: GenState, config: RunnableConfig) -> GenState:
         )
         if not course:
             logger.error(f"[load_state] Course not found: {course_id}")
-            update_run(state["run_id"], status="failed", error="course not found", finished=True)
+            update_run(state["run_id"], status="failed", error="course not found", finished=True, db=db)
+            db.commit()
             return state
 
         modules = (
@@ -76,7 +82,8 @@ def load_state(state: GenState, config: RunnableConfig) -> GenState:
         )
         if not modules:
             logger.error(f"[load_state] No modules found for course: {course_id}")
-            update_run(state["run_id"], status="failed", error="no modules found", finished=True)
+            update_run(state["run_id"], status="failed", error="no modules found", finished=True, db=db)
+            db.commit()
             return state
 
         logger.info(f"[load_state] Found {len(modules)} modules for course {course_id}")
@@ -102,7 +109,9 @@ def load_state(state: GenState, config: RunnableConfig) -> GenState:
         state["total"] = len(modules)
 
         logger.info(f"[load_state] Final state: {len(pending)} pending, {len(done_weeks)} done, total={len(modules)}")
-        update_run(state["run_id"], status="running", progress=1, message="LangGraph: initialized", started=True)
+        # Same session that read the rows; one round trip for the UPDATE + COMMIT
+        update_run(state["run_id"], status="running", progress=1, message="LangGraph: initialized", started=True, db=db)
+        db.commit()
         return state
     finally:
         db.close()
@@ -152,96 +161,230 @@ def _parse_media_suggestions(md: str) -> dict:
     return {"images": images, "videos": videos}
 
 
-def write_one_week(state: GenState, config: RunnableConfig) -> GenState:
-    """Generate content for one week of the course.
-    
+def save_module_markdown(module: CourseModule, md: str) -> None:
+    """Store generated markdown, its rendered HTML and parsed media suggestions on a module.
+
+    Args:
+        module: Module row to update (caller commits)
+        md: Validated module markdown
+    """
+    week = module.week
+    media_suggestions = _parse_media_suggestions(md)
+    logger.info(f"[save_module_markdown] Week {week} media suggestions: {len(media_suggestions['images'])} images, {len(media_suggestions['videos'])} videos")
+    if media_suggestions["images"] or media_suggestions["videos"]:
+        module.media_suggestions = media_suggestions
+    else:
+        module.media_suggestions = None
+    module.content_md = md
+    module.content_html = render_module_html(md)
+
+
+async def _write_weeks_concurrently(field: str, level: str, weeks: List[WeekPlan],
+                                    max_concurrency: int, batch_size: int = 1,
+                                    on_done: Callable[[List[WeekPlan], list], None] | None = None) -> list:
+    """Write several weeks concurrently, bounded by a semaphore.
+
+    With batch_size > 1, weeks are grouped and each group is written by
+    write_all_modules_markdown in one LLM call (run in a worker thread).
+
+    Args:
+        field: Subject area/field of study
+        level: Learner level
+        weeks: Weeks to write
+        max_concurrency: Maximum number of in-flight LLM calls
+        batch_size: Weeks per LLM call
+        on_done: Called on the event loop thread with each group and its
+            per-week results as soon as that group finishes
+
+    Returns:
+        Markdown string or raised exception per week, in input order
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    size = max(1, min(batch_size, MAX_BATCH_WEEKS))
+    groups = [weeks[i:i + size] for i in range(0, len(weeks), size)]
+
+    async def bounded(group: List[WeekPlan]) -> list:
+        async with semaphore:
+            try:
+                if size == 1:
+                    w = group[0]
+                    result = [await awrite_module_markdown(field, level, w.week, w.title, w.outcomes)]
+                else:
+                    result = await asyncio.to_thread(write_all_modules_markdown, field, level, group)
+            except Exception as e:
+                result = [e] * len(group)
+        if on_done is not None:
+            on_done(group, result)
+        return result
+
+    try:
+        group_results = await asyncio.gather(*(bounded(g) for g in groups), return_exceptions=True)
+    finally:
+        # The LLM client is process-wide; drop its connections tied to this loop
+        await get_llm_client().aclose()
+
+    results: list = []
+    for group, result in zip(groups, group_results):
+        # Only a failing on_done callback ends up here as an exception
+        results.extend([result] * len(group) if isinstance(result, BaseException) else result)
+    return results
+
+
+# Written weeks are committed (with a progress update) in groups of this
+# size rather than one commit per week; at most this many minus one are
+# lost if the worker dies mid-run, and a resumed run rewrites them.
+WEEKS_PER_COMMIT = 4
+
+
+def write_weeks(state: GenState, config: RunnableConfig) -> GenState:
+    """Generate content for all pending weeks of the course.
+
+    Weeks are independent LLM round-trips, so they are written concurrently
+    (bounded by settings.llm_max_concurrency). Weeks are saved as their calls
+    return and committed together with a progress bump every
+    WEEKS_PER_COMMIT weeks, so a failed or retried run resumes with only
+    the unsaved weeks pending.
+
     Args:
         state: Current generation state
         config: LangGraph runnable configuration
-        
+
     Returns:
-        Updated state with week moved from pending to done
-        
+        Updated state with written weeks moved from pending to done
+
     Raises:
-        DocumentPortalException: If week generation fails
+        DocumentPortalException: If any week fails to generate
     """
-    logger.info(f"[write_one_week] Starting week generation. Pending weeks: {state.get('pending_weeks')}")
-    if not state.get("pending_weeks"):
-        logger.info("[write_one_week] No pending weeks, returning")
+    logger.info(f"[write_weeks] Starting week generation. Pending weeks: {state.get('pending_weeks')}")
+    pending = [int(w) for w in state.get("pending_weeks") or []]
+    if not pending:
+        logger.info("[write_weeks] No pending weeks, returning")
         return state
 
-    week = int(state["pending_weeks"][0])
-    logger.info(f"[write_one_week] Processing week {week}")
-
-    db = SessionLocal()
+    # Weeks are committed one group at a time; keep the loaded modules usable
+    # between commits instead of reloading each one
+    db = SessionLocal(expire_on_commit=False)
     try:
         run_id = _u(state["run_id"])
         course_id = _u(state["course_id"])
 
         run = db.query(GenerationRun).filter(GenerationRun.id == run_id).first()
-        course = db.query(Course).filter(Course.id == course_id).first()
+        # Roadmap comes in the same query; it's needed for every prompt
+        course = db.query(Course).options(joinedload(Course.roadmap)).filter(Course.id == course_id).first()
         if not run or not course:
-            logger.error(f"[write_one_week] Missing run or course for week {week}")
-            update_run(state["run_id"], status="failed", error="run/course missing during generation", finished=True)
+            logger.error(f"[write_weeks] Missing run or course for weeks {pending}")
+            update_run(state["run_id"], status="failed", error="run/course missing during generation", finished=True, db=db)
+            db.commit()
             state["pending_weeks"] = []
             return state
 
-        rm = db.query(Roadmap).filter(Roadmap.id == course.roadmap_id).first()
-        module = (
+        rm = course.roadmap
+        modules = (
             db.query(CourseModule)
-            .filter(CourseModule.course_id == course.id, CourseModule.week == week)
-            .first()
+            .filter(CourseModule.course_id == course.id, CourseModule.week.in_(pending))
+            .order_by(CourseModule.week.asc())
+            .all()
         )
-        if not rm or not module:
-            logger.error(f"[write_one_week] Missing roadmap/module for week {week}")
-            update_run(state["run_id"], status="failed", error=f"missing roadmap/module for week {week}", finished=True)
+        if not rm or len(modules) != len(pending):
+            found = {int(m.week) for m in modules}
+            missing = [w for w in pending if w not in found]
+            logger.error(f"[write_weeks] Missing roadmap/modules for weeks {missing}")
+            update_run(state["run_id"], status="failed", error=f"missing roadmap/module for weeks {missing}", finished=True, db=db)
+            db.commit()
             state["pending_weeks"] = []
             return state
 
-        outcomes = json.loads(module.outcomes_json) if module.outcomes_json else []
-        logger.info(f"[write_one_week] Week {week} has {len(outcomes)} outcomes")
+        total_weeks = state.get("total") or len(modules)
+        already_done = max(total_weeks - len(modules), 0)
+
+        def progress_for(done: int) -> int:
+            # 5-90% range, leaving room for finalization
+            return int((done / total_weeks) * 85) + 5
 
-        # Calculate progress based on current week number to ensure it mirrors the week
-        current_week = week
-        total_weeks = state.get('total', 1)
-        # Map week number to progress percentage (week 1 = ~10%, week 6 = ~60%, etc.)
-        progress_percentage = int((current_week / total_weeks) * 85) + 5  # 5-90% range, leaving room for finalization
         update_run(
             state["run_id"],
-            progress=progress_percentage,
-            message=f"Writing week {week}/{state.get('total', 0)}",
-        )
-
-        logger.info(f"[write_one_week] Calling module writer for week {week}")
-        md = write_module_markdown(
-            field=rm.field,
-            level=rm.level,
-            week=int(module.week),
-            title=module.title,
-            outcomes=outcomes,
+            progress=progress_for(already_done),
+            message=f"Writing {len(modules)} weeks ({total_weeks} total)",
+            db=db,
         )
-        logger.info(f"[write_one_week] Generated markdown for week {week}, length: {len(md)} chars")
-
-        # Parse and save media suggestions
-        media_suggestions = _parse_media_suggestions(md)
-        logger.info(f"[write_one_week] Week {week} media suggestions: {len(media_suggestions['images'])} images, {len(media_suggestions['videos'])} videos")
-        if media_suggestions["images"] or media_suggestions["videos"]:
-            module.media_suggestions_json = json.dumps(media_suggestions)
-            logger.info(f"[write_one_week] Week {week} saved media suggestions to database")
-        else:
-            module.media_suggestions_json = None
-            logger.info(f"[write_one_week] Week {week} no media suggestions found")
-        module.content_md = md
         db.commit()
-        logger.info(f"[write_one_week] Week {week} content saved to database")
 
-        state["done_weeks"] = (state.get("done_weeks") or []) + [week]
-        state["pending_weeks"] = state["pending_weeks"][1:]
-        logger.info(f"[write_one_week] Week {week} completed. Remaining: {state['pending_weeks']}")
+        weeks = [
+            # Rows come from an already validated outline
+            WeekPlan.model_construct(
+                week=int(m.week),
+                title=m.title,
+                outcomes=m.outcomes or [],
+            )
+            for m in modules
+        ]
+        modules_by_week = {w.week: m for w, m in zip(weeks, modules)}
+        written: List[int] = []
+        unsaved: List[int] = []
+        failures: dict[int, BaseException] = {}
+
+        def commit_saved() -> None:
+            done = already_done + len(written) + len(unsaved)
+            try:
+                update_run(
+                    state["run_id"],
+                    progress=progress_for(done),
+                    message=f"Wrote {done}/{total_weeks} weeks",
+                    db=db,
+                )
+                db.commit()
+            except Exception as e:
+                # Leave the session usable for the groups still in flight
+                db.rollback()
+                failures.update((week, e) for week in unsaved)
+                unsaved.clear()
+                raise
+            logger.info(f"[write_weeks] Saved weeks {unsaved} to database")
+            written.extend(unsaved)
+            unsaved.clear()
+
+        def save_group(group: List[WeekPlan], results: list) -> None:
+            # Runs on the event loop thread as each LLM call returns
+            for w, result in zip(group, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"[write_weeks] Week {w.week} failed: {str(result)}")
+                    failures[w.week] = result
+                    continue
+                logger.info(f"[write_weeks] Generated markdown for week {w.week}, length: {len(result)} chars")
+                save_module_markdown(modules_by_week[w.week], result)
+                unsaved.append(w.week)
+            if len(unsaved) >= WEEKS_PER_COMMIT:
+                commit_saved()
+
+        logger.info(f"[write_weeks] Writing weeks {pending} with max_concurrency={settings.llm_max_concurrency}, batch_size={settings.module_batch_size}")
+        results = asyncio.run(_write_weeks_concurrently(
+            rm.field, rm.level, weeks, settings.llm_max_concurrency, settings.module_batch_size,
+            on_done=save_group,
+        ))
+        if unsaved:
+            try:
+                commit_saved()
+            except Exception as e:
+                logger.error(f"[write_weeks] Final commit failed: {str(e)}")
+        for w, result in zip(weeks, results):
+            # A group whose save failed is reported back as an exception
+            if w.week not in written and w.week not in failures:
+                failures[w.week] = result
+
+        state["done_weeks"] = (state.get("done_weeks") or []) + written
+        state["pending_weeks"] = [w for w in pending if w not in written]
+
+        if failures:
+            failed_weeks = sorted(failures)
+            raise DocumentPortalException(f"Failed to write weeks {failed_weeks}", failures[failed_weeks[0]])
+
+        logger.info(f"[write_weeks] Weeks {written} completed")
         return state
+    except DocumentPortalException:
+        raise
     except Exception as e:
-        logger.error(f"[write_one_week] Error processing week {week}: {str(e)}")
-        raise DocumentPortalException(f"Failed to process week {week}", e)
+        logger.error(f"[write_weeks] Error processing weeks {pending}: {str(e)}")
+        raise DocumentPortalException(f"Failed to process weeks {pending}", e)
     finally:
         db.close()
 
@@ -276,10 +419,10 @@ def should_continue(state: GenState) -> str:
         state: Current generation state
         
     Returns:
-        'write_one_week' if pending weeks exist, 'finish' otherwise
+        'write_weeks' if pending weeks exist, 'finish' otherwise
     """
     has_pending = bool(state.get("pending_weeks"))
-    result = "write_one_week" if has_pending else "finish"
+    result = "write_weeks" if has_pending else "finish"
     logger.debug(f"[should_continue] pending_weeks={state.get('pending_weeks')} -> {result}")
     return result
 
@@ -295,13 +438,13 @@ def build_course_generation_graph_builder() -> StateGraph:
     logger.info("[build_course_generation_graph_builder] Building course generation graph")
     builder = StateGraph(GenState)
     builder.add_node("load_state", load_state)
-    builder.add_node("write_one_week", write_one_week)
+    builder.add_node("write_weeks", write_weeks)
     builder.add_node("finish", finish)
 
     builder.add_edge(START, "load_state")
     builder.add_conditional_edges("load_state", should_continue)
-    builder.add_conditional_edges("write_one_week", should_continue)
+    builder.add_edge("write_weeks", "finish")
     builder.add_edge("finish", END)
 
-    logger.info("[build_course_generation_graph_builder] Graph built with nodes: load_state, write_one_week, finish")
+    logger.info("[build_course_generation_graph_builder] Graph built with nodes: load_state, write_weeks, finish")
     return builder
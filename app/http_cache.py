@@ -0,0 +1,25 @@
+## Conditional GET helpers shared by the routers that send ETags
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header value matches the current ETag.
+
+    The header may list several tags, and If-None-Match uses the weak
+    comparison, so W/ prefixes are ignored. "*" matches any current
+    representation.
+
+    Args:
+        if_none_match: Raw If-None-Match header value, if any
+        etag: ETag of the current representation
+
+    Returns:
+        True if the client's copy is current and a 304 can be sent
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == opaque:
+            return True
+    return False
@@ -0,0 +1,39 @@
+import redis
+import redis.asyncio
+
+from app.settings import settings
+
+# One bounded pool per process, shared by the web routes and the worker.
+# A blocking pool makes callers wait for a free connection when it's
+# exhausted instead of opening more sockets (or failing) under load.
+# Replies stay bytes: queue payloads go straight to orjson.loads (or back
+# to Redis as-is), so decoding them to str first would be wasted work.
+pool = redis.BlockingConnectionPool.from_url(
+    settings.redis_url,
+    max_connections=settings.redis_max_connections,
+    timeout=settings.redis_pool_timeout_seconds,  # Wait for a free connection
+    health_check_interval=30,                     # Ping idle connections before reuse
+)
+
+redis_client = redis.Redis(connection_pool=pool)
+
+# The worker's BLMOVE parks a connection for up to its timeout. Give it a
+# dedicated pool (one connection per queue loop) so ACKs and requeues on
+# the shared pool never wait behind it.
+blocking_pool = redis.BlockingConnectionPool.from_url(
+    settings.redis_url,
+    max_connections=max(settings.worker_threads, 1),
+    timeout=None,
+    health_check_interval=30,
+)
+
+blocking_client = redis.Redis(connection_pool=blocking_pool)
+
+# asyncio client for long-lived subscriptions held by the web process
+# (run event streams), so they don't each tie up a threadpool thread
+async_redis_client = redis.asyncio.Redis.from_url(
+    settings.redis_url,
+    max_connections=settings.redis_max_connections,
+    health_check_interval=30,
+    decode_responses=True,
+)
@@ -1,8 +1,15 @@
 import uuid
 from datetime import datetime, timezone
 
+import orjson
+import redis
+from sqlalchemy import bindparam, event, func, update
+from sqlalchemy.orm import Session
+
 from app.db.session import SessionLocal
-from app.db.models.generation_run import GenerationRun
+from app.db.models.generation_run import ACTIVE_RUN_STATUSES, GenerationRun
+from app.jobs.redis_client import redis_client
+from app.logger import GLOBAL_LOGGER as logger
 
 
 def _to_uuid(v: str | uuid.UUID | None) -> uuid.UUID | None:
@@ -14,6 +21,41 @@ def _to_uuid(v: str | uuid.UUID | None) -> uuid.UUID | None:
     return uuid.UUID(str(v))
 
 
+def run_channel(run_id: str | uuid.UUID) -> str:
+    """Redis pub/sub channel carrying a run's status changes."""
+    return f"run_events:{run_id}"
+
+
+def publish_run_update(run_id: str | uuid.UUID, **fields) -> None:
+    """Push a run's changed fields to anyone streaming its events.
+
+    Best effort: the row is the source of truth, so Redis errors are logged
+    and otherwise ignored.
+
+    Args:
+        run_id: Generation run ID
+        **fields: Changed run fields (status, progress, message, error);
+            None values are left out
+    """
+    payload = {"id": str(run_id)}
+    payload.update((k, v) for k, v in fields.items() if v is not None)
+    try:
+        redis_client.publish(run_channel(run_id), orjson.dumps(payload))
+    except redis.RedisError as e:
+        logger.warning(f"[publish_run_update] Could not publish update for run {run_id}: {str(e)}")
+
+
+# Built once; update_run only adds the SET clause. The engine's compiled
+# cache keys on statement shape, so each column combination compiles once.
+# Callers commit (which expires the session) before reading the run again,
+# so skip the ORM's in-session synchronization.
+_UPDATE_RUN = (
+    update(GenerationRun)
+    .where(GenerationRun.id == bindparam("run_uuid"))
+    .execution_options(synchronize_session=False)
+)
+
+
 def update_run(
     run_id: str,
     *,
@@ -24,8 +66,14 @@ def update_run(
     result_json: str | None = None,
     started: bool = False,
     finished: bool = False,
-) -> None:
+    only_active: bool = False,
+    db: Session | None = None,
+) -> bool:
     """Update generation run status and metadata.
+
+    Issued as a single UPDATE (no SELECT of the run first). A missing run is
+    silently ignored. Status/progress/message/error changes are also
+    published for run event streams.
     
     Args:
         run_id: Generation run ID
@@ -34,35 +82,73 @@ def update_run(
         message: Status message
         error: Error message if failed
         result_json: JSON result data
-        started: Set started_at timestamp if True
+        started: Set started_at timestamp if True (kept if already set)
         finished: Set finished_at timestamp if True
+        only_active: Only update a run that is still queued or running, so a
+            run already failed (e.g. cancelled) or succeeded is left alone
+        db: Session to run the UPDATE in; the caller commits. By default a
+            short-lived session is used and committed immediately.
+
+    Returns:
+        True if a run row was updated
     """
     run_uuid = _to_uuid(run_id)
     if run_uuid is None:
-        return
-
-    db = SessionLocal()
-    try:
-        run = db.query(GenerationRun).filter(GenerationRun.id == run_uuid).first()
-        if not run:
-            return
+        return False
 
+    values = {}
+    if status is not None:
+        values["status"] = status
+    if progress is not None:
+        values["progress"] = progress
+    if message is not None:
+        values["message"] = message
+    if error is not None:
+        values["error"] = error
+    if result_json is not None:
+        values["result_json"] = result_json
+    if started or finished:
+        # Only timestamp when a timestamp column is actually being set
         now = datetime.now(timezone.utc)
-        if status is not None:
-            run.status = status
-        if progress is not None:
-            run.progress = progress
-        if message is not None:
-            run.message = message
-        if error is not None:
-            run.error = error
-        if result_json is not None:
-            run.result_json = result_json
-        if started and run.started_at is None:
-            run.started_at = now
+        if started:
+            values["started_at"] = func.coalesce(GenerationRun.started_at, now)
         if finished:
-            run.finished_at = now
+            values["finished_at"] = now
+    if not values:
+        return False
 
-        db.commit()
+    stmt = _UPDATE_RUN.values(**values)
+    if only_active:
+        stmt = stmt.where(GenerationRun.status.in_(ACTIVE_RUN_STATUSES))
+    params = {"run_uuid": run_uuid}
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        updated = bool(db.execute(stmt, params).rowcount)
+        if updated and (status, progress, message, error) != (None, None, None, None):
+            # Published once the change is committed (see below)
+            fields = {"status": status, "progress": progress, "message": message, "error": error}
+            db.info.setdefault(_PENDING_PUBLISH, []).append((run_uuid, fields))
+        if own_session:
+            db.commit()
+        return updated
     finally:
-        db.close()
+        if own_session:
+            db.close()
+
+
+_PENDING_PUBLISH = "pending_run_updates"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_run_updates(session: Session) -> None:
+    # Subscribers may read the run back on a final status; only tell them
+    # about changes other sessions can already see
+    for run_uuid, fields in session.info.pop(_PENDING_PUBLISH, ()):
+        publish_run_update(run_uuid, **fields)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_run_updates(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_PUBLISH, None)
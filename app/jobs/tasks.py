@@ -3,39 +3,82 @@ Redis-based (reliable) task queue for generation.
 
 Queue pattern:
 - Producer LPUSH -> PENDING_Q
-- Worker BRPOPLPUSH pending -> processing (atomic, reliable)
+- Worker BLMOVE pending -> processing (atomic, reliable)
 - ACK via LREM on processing
 - Retry by moving back to pending with attempt increment
+- Delayed jobs wait in a sorted set (score = due time) and are moved to
+  pending by the worker once due
 """
-import json
+import random
+import secrets
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List
 
-import redis
+import orjson
 
 from app.settings import settings
 from app.db.session import SessionLocal
-from app.jobs.run_store import update_run
+from app.jobs.redis_client import blocking_client, redis_client
+from app.jobs.run_store import publish_run_update, update_run
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
 
-from app.db.models.generation_run import GenerationRun
-from app.db.models.roadmap import Roadmap
+from app.db.models.generation_run import ACTIVE_RUN_PREDICATE, ACTIVE_RUN_STATUSES, GenerationRun
 from app.db.models.course import Course
 from app.db.models.course_module import CourseModule
-from sqlalchemy.orm import joinedload
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
 
 from app.agents.workflow import generate_roadmap_outline
-from app.graphs.course_generation import build_course_generation_graph_builder
+from app.agents.module_writer import SYSTEM_MODULE_WRITER, build_module_prompt, ensure_valid_module_markdown
+from app.agents.llm.client import get_batch_client
+from app.graphs.course_generation import build_course_generation_graph_builder, save_module_markdown
 
 from dotenv import load_dotenv
 load_dotenv()
 
 PENDING_Q = "roadmap_generation_queue"
 PROCESSING_Q = "roadmap_generation_processing"
+DELAYED_Q = "roadmap_generation_delayed"
 MAX_RETRIES = 3
 
+# Provider batch polling back-off
+BATCH_POLL_BASE_SECONDS = 30
+BATCH_POLL_MAX_SECONDS = 600
+
+# ACK + requeue for a retry, run atomically on the server. The job is only
+# pushed back if it was still in processing; if it was cancelled meanwhile
+# (stop_processing_job / clear_processing_queue) it stays gone.
+# KEYS: processing, pending  ARGV: original payload, payload for the retry
+_REQUEUE_LUA = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+# Move due delayed jobs (score <= now) to pending, at most ARGV[2] per call.
+# Atomic, so two workers promoting at once can't both push the same job.
+# KEYS: delayed, pending  ARGV: now, limit
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(due) do
+    redis.call('ZREM', KEYS[1], item)
+    redis.call('LPUSH', KEYS[2], item)
+end
+return #due
+"""
+PROMOTE_BATCH_LIMIT = 100
+
+# register_script only hashes the source; it's loaded (EVALSHA, falling
+# back to EVAL once) on first use
+_requeue_script = redis_client.register_script(_REQUEUE_LUA)
+_promote_script = redis_client.register_script(_PROMOTE_LUA)
+
 
 def _to_uuid(v: str | uuid.UUID | None) -> uuid.UUID | None:
     """Convert string or UUID to UUID object, handling None values."""
@@ -46,15 +89,16 @@ def _to_uuid(v: str | uuid.UUID | None) -> uuid.UUID | None:
     return uuid.UUID(str(v))
 
 
+def _new_task_id() -> str:
+    """Opaque task ID; only ever used as a string, so skip building a UUID."""
+    return secrets.token_hex(16)
+
+
 def _ts() -> str:
     """Get current UTC timestamp as formatted string."""
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
 
-# Use Redis pipeline for batch operations
-redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
-
-
 def get_queue_status() -> Dict[str, Any]:
     """Get current queue status for display to users."""
     # Use Redis pipeline for batch operations
@@ -69,7 +113,7 @@ def get_queue_status() -> Dict[str, Any]:
     pending_tasks = []
     for item in pending:
         try:
-            task = json.loads(item)
+            task = orjson.loads(item)
             pending_tasks.append({
                 "task": task, 
                 "run_status": "queued",
@@ -78,13 +122,13 @@ def get_queue_status() -> Dict[str, Any]:
                 "progress": 0,
                 "message": "Waiting to start",
             })
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             continue
 
     processing_tasks = []
     for item in processing:
         try:
-            task = json.loads(item)
+            task = orjson.loads(item)
             processing_tasks.append({
                 "task": task, 
                 "run_status": "processing",
@@ -93,7 +137,7 @@ def get_queue_status() -> Dict[str, Any]:
                 "progress": 0,
                 "message": "Processing...",
             })
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             continue
 
     return {
@@ -113,21 +157,73 @@ def enqueue_job(
     run_id: str,
     course_id: str | None = None,
     overwrite: bool = False,
+    extra: Dict[str, Any] | None = None,
+    delay_seconds: float = 0,
+    task_id: str | None = None,
 ) -> str:
     """Enqueue a job for processing.
     
     Args:
-        job_type: Type of job ('generate_roadmap_outline' or 'generate_course_modules')
+        job_type: Type of job ('generate_roadmap_outline', 'generate_course_modules'
+            or 'poll_course_modules_batch')
         run_id: Generation run ID
         course_id: Optional course ID for module generation jobs
         overwrite: Whether to overwrite existing content
+        extra: Additional job-specific payload fields
+        delay_seconds: Hold the job back for this long before it can be picked up
+        task_id: Pre-generated task ID (e.g. already stored on the run); a new
+            one is generated when omitted
         
     Returns:
         Task ID for the enqueued job
     """
-    task_id = str(uuid.uuid4())
+    task_data = _task_payload(job_type, run_id, course_id, overwrite, extra, task_id)
+    # orjson: compact JSON bytes, encoded in C (payloads stay readable in redis-cli)
+    if delay_seconds > 0:
+        redis_client.zadd(DELAYED_Q, {orjson.dumps(task_data): time.time() + delay_seconds})
+    else:
+        redis_client.lpush(PENDING_Q, orjson.dumps(task_data))
+    return task_data["task_id"]
+
+
+def enqueue_jobs(jobs: List[Dict[str, Any]]) -> List[str]:
+    """Enqueue several jobs in one Redis round trip.
+
+    Args:
+        jobs: One dict of enqueue_job keyword arguments per job
+
+    Returns:
+        Task IDs, in input order
+    """
+    if not jobs:
+        return []
+    now = time.time()
+    task_ids = []
+    with redis_client.pipeline(transaction=False) as pipe:
+        for job in jobs:
+            job = dict(job)
+            delay_seconds = job.pop("delay_seconds", 0)
+            task_data = _task_payload(**job)
+            if delay_seconds > 0:
+                pipe.zadd(DELAYED_Q, {orjson.dumps(task_data): now + delay_seconds})
+            else:
+                pipe.lpush(PENDING_Q, orjson.dumps(task_data))
+            task_ids.append(task_data["task_id"])
+        pipe.execute()
+    return task_ids
+
+
+def _task_payload(
+    job_type: str,
+    run_id: str,
+    course_id: str | None = None,
+    overwrite: bool = False,
+    extra: Dict[str, Any] | None = None,
+    task_id: str | None = None,
+) -> Dict[str, Any]:
+    """Build the queue payload for one job."""
     task_data = {
-        "task_id": task_id,
+        "task_id": task_id or _new_task_id(),
         "type": job_type,  # "generate_roadmap_outline" | "generate_course_modules"
         "run_id": run_id,
         "course_id": course_id,
@@ -135,8 +231,22 @@ def enqueue_job(
         "attempt": 0,
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
-    redis_client.lpush(PENDING_Q, json.dumps(task_data))
-    return task_id
+    if extra:
+        task_data.update(extra)
+    return task_data
+
+
+def _promote_delayed_jobs() -> int:
+    """Move due delayed jobs to the pending queue. Returns number moved.
+
+    Runs before every BLMOVE, so it's one script call rather than a ZREM and
+    LPUSH round trip per due job.
+    """
+    return _promote_script(
+        keys=[DELAYED_Q, PENDING_Q],
+        args=[time.time(), PROMOTE_BATCH_LIMIT],
+        client=redis_client,
+    )
 
 
 def queue_roadmap_generation(run_id: str) -> str:
@@ -151,6 +261,110 @@ def queue_roadmap_generation(run_id: str) -> str:
     return enqueue_job(job_type="generate_roadmap_outline", run_id=run_id)
 
 
+def queue_roadmap_generation_bulk(run_ids: List[str]) -> List[str]:
+    """Enqueue roadmap generation jobs for several runs in one Redis round trip.
+    
+    Args:
+        run_ids: Generation run IDs
+        
+    Returns:
+        Task IDs, in input order
+    """
+    return enqueue_jobs([{"job_type": "generate_roadmap_outline", "run_id": run_id} for run_id in run_ids])
+
+
+
+def start_run(
+    db: Session,
+    *,
+    job_type: str,
+    user_id: uuid.UUID,
+    roadmap_id: uuid.UUID,
+    course_id: uuid.UUID | None = None,
+    overwrite: bool = False,
+    message: str = "Queued",
+) -> uuid.UUID:
+    """Create a queued GenerationRun and enqueue its job.
+
+    Run and task IDs are generated here so the run is written with a single
+    INSERT and commit. The commit happens before the push, so a worker never
+    picks up a job whose run isn't visible yet, and the DB connection isn't
+    held across the Redis call. If the push fails the run is marked failed
+    instead of staying queued forever.
+
+    If the course already has a queued or running run, no new run or job is
+    created and that run's ID is returned instead.
+
+    Args:
+        db: Request session (committed by this function)
+        job_type: Job type passed to enqueue_job
+        user_id: Owner of the run
+        roadmap_id: Roadmap the run belongs to
+        course_id: Course for module generation jobs
+        overwrite: Whether to overwrite existing content
+        message: Initial status message
+
+    Returns:
+        The new (or already active) run's ID
+    """
+    run_id = uuid.uuid4()
+    task_id = _new_task_id()
+    # Plain INSERT; nothing needs tracking in the session's unit of work.
+    # A course can only have one queued/running run (partial unique index), so
+    # a repeated submit inserts nothing and is pointed at the existing run.
+    inserted = db.execute(
+        pg_insert(GenerationRun)
+        .values(
+            id=run_id,
+            user_id=user_id,
+            roadmap_id=roadmap_id,
+            course_id=course_id,
+            celery_task_id=task_id,  # legacy field
+            status="queued",
+            progress=0,
+            message=message,
+        )
+        .on_conflict_do_nothing(
+            index_elements=[GenerationRun.course_id],
+            index_where=ACTIVE_RUN_PREDICATE,
+        )
+        .returning(GenerationRun.id)
+    ).scalar_one_or_none()
+    if inserted is None:
+        existing = db.execute(
+            select(GenerationRun.id)
+            .where(GenerationRun.course_id == course_id, GenerationRun.status.in_(ACTIVE_RUN_STATUSES))
+            .limit(1)
+        ).scalar_one_or_none()
+        if existing is not None:
+            db.rollback()
+            logger.info(f"[start_run] Course {course_id} already has active run {existing}; not queueing another")
+            return existing
+        # The active run finished in between; nothing blocks a new one now
+        return start_run(
+            db, job_type=job_type, user_id=user_id, roadmap_id=roadmap_id,
+            course_id=course_id, overwrite=overwrite, message=message,
+        )
+    db.commit()
+
+    try:
+        enqueue_job(
+            task_id=task_id,
+            job_type=job_type,
+            run_id=str(run_id),
+            course_id=str(course_id) if course_id else None,
+            overwrite=overwrite,
+        )
+    except Exception as e:
+        logger.error(f"[start_run] Failed to enqueue {job_type} for run {run_id}: {str(e)}")
+        db.execute(
+            update(GenerationRun)
+            .where(GenerationRun.id == run_id)
+            .values(status="failed", message="Could not queue job", error=str(e))
+        )
+        db.commit()
+    return run_id
+
 # -------------------------
 # Queue management
 # -------------------------
@@ -168,7 +382,7 @@ def stop_processing_job(run_id: str) -> bool:
     processing = redis_client.lrange(PROCESSING_Q, 0, -1)
     for item in processing:
         try:
-            task = json.loads(item)
+            task = orjson.loads(item)
             if task.get("run_id") == run_id:
                 redis_client.lrem(PROCESSING_Q, 1, item)
                 # Mark run as failed
@@ -185,7 +399,7 @@ def clear_processing_queue() -> int:
     processing = redis_client.lrange(PROCESSING_Q, 0, -1)
     for item in processing:
         try:
-            task = json.loads(item)
+            task = orjson.loads(item)
             run_id = task.get("run_id")
             if run_id:
                 update_run(run_id, status="failed", error="Cancelled by user (queue cleared)", finished=True)
@@ -202,7 +416,7 @@ def cancel_job_by_run_id(run_id: str) -> Dict[str, Any]:
     pending = redis_client.lrange(PENDING_Q, 0, -1)
     for item in pending:
         try:
-            task = json.loads(item)
+            task = orjson.loads(item)
             if task.get("run_id") == run_id:
                 redis_client.lrem(PENDING_Q, 1, item)
                 update_run(run_id, status="failed", error="Cancelled by user", finished=True)
@@ -222,7 +436,43 @@ def cancel_job_by_run_id(run_id: str) -> Dict[str, Any]:
 # -------------------------
 # Job handlers (worker)
 # -------------------------
-def generate_roadmap_outline_sync(run_id: str) -> Dict[str, Any]:
+def _commit_run(db: Session, run: GenerationRun) -> None:
+    """Commit, then publish the run's status fields to its event stream."""
+    fields = {"status": run.status, "progress": run.progress, "message": run.message, "error": run.error}
+    db.commit()
+    publish_run_update(run.id, **fields)
+
+
+# Minimum gap between progress UPDATEs while the outline streams
+OUTLINE_PROGRESS_INTERVAL_SECONDS = 1.0
+
+
+def _outline_progress_reporter(run_uuid: uuid.UUID, total_weeks: int):
+    """Build an on_progress callback mapping planned weeks onto 20-85%.
+
+    Writes are throttled to one short UPDATE per OUTLINE_PROGRESS_INTERVAL_SECONDS,
+    each in its own session, so the job's session holds no transaction
+    during the LLM call.
+    """
+    last_sent = 0.0
+
+    def report(weeks_done: int) -> None:
+        nonlocal last_sent
+        now = time.monotonic()
+        if now - last_sent < OUTLINE_PROGRESS_INTERVAL_SECONDS:
+            return
+        last_sent = now
+        weeks_done = min(weeks_done, total_weeks)
+        update_run(
+            run_uuid,
+            progress=20 + (65 * weeks_done) // max(total_weeks, 1),
+            message=f"Planned {weeks_done}/{total_weeks} weeks",
+        )
+
+    return report
+
+
+def generate_roadmap_outline_sync(run_id: str, *, will_retry: bool = False) -> Dict[str, Any]:
     """Generate roadmap outline synchronously.
     
     Creates course structure with weekly modules based on roadmap requirements.
@@ -230,6 +480,8 @@ def generate_roadmap_outline_sync(run_id: str) -> Dict[str, Any]:
     
     Args:
         run_id: Generation run ID
+        will_retry: The caller retries this job if it fails, so a failure
+            leaves the run active instead of marking it failed
         
     Returns:
         Dict with success status and course_id if successful
@@ -241,25 +493,34 @@ def generate_roadmap_outline_sync(run_id: str) -> Dict[str, Any]:
     if run_uuid is None:
         return {"ok": False, "error": "invalid run_id"}
 
-    db = SessionLocal()
+    # Keep loaded state across commits: run and roadmap are read again after
+    # the "running" commit, and expiring them would re-SELECT both
+    db = SessionLocal(expire_on_commit=False)
     try:
-        # Use eager loading to avoid N+1 problems
-        run = db.query(GenerationRun).options(
-            joinedload(GenerationRun.roadmap)
-        ).filter(GenerationRun.id == run_uuid).first()
-        
+        # Claim the run: the row lock is held until the commit below, and a
+        # second worker holding a duplicate job skips it instead of waiting
+        run = (
+            db.query(GenerationRun)
+            .options(joinedload(GenerationRun.roadmap))
+            .filter(GenerationRun.id == run_uuid)
+            .with_for_update(skip_locked=True, of=GenerationRun)
+            .first()
+        )
+
         if not run:
-            return {"ok": False, "error": "run not found"}
+            if db.query(GenerationRun.id).filter(GenerationRun.id == run_uuid).first() is None:
+                return {"ok": False, "error": "run not found"}
+            logger.info(f"[generate_roadmap_outline_sync] Run {run_id} is locked by another worker")
+            return {"ok": True, "skipped": True, "status": "locked"}
 
         if run.status in ("succeeded", "failed"):
             return {"ok": True, "skipped": True, "status": run.status}
         if run.status == "running":
             return {"ok": True, "skipped": True, "status": "running"}
 
-        # Batch all updates together to reduce database round trips
+        # Only two commits on the happy path: "running" before the LLM call
+        # (also releases the row lock) and the final result
         run.status = "running"
-        run.progress = 5
-        run.message = "Starting outline generation"
         run.started_at = datetime.now(timezone.utc)
         
         # Check if roadmap exists in same query
@@ -268,26 +529,24 @@ def generate_roadmap_outline_sync(run_id: str) -> Dict[str, Any]:
             run.status = "failed"
             run.error = f"Roadmap not found for roadmap_id={run.roadmap_id}"
             run.finished_at = datetime.now(timezone.utc)
-            db.commit()
+            _commit_run(db, run)
             return {"ok": False, "error": "roadmap not found"}
 
         run.progress = 20
         run.message = "Planning roadmap outline (LLM)"
-        db.commit()
+        _commit_run(db, run)
 
         logger.info(f"[generate_roadmap_outline_sync] Starting LLM call for roadmap: {rm.title}")
         logger.info(f"[generate_roadmap_outline_sync] Field: {rm.field}, Level: {rm.level}, Weeks: {rm.duration_weeks}")
         
         outline_obj = generate_roadmap_outline(
-            rm.field, rm.level, rm.weekly_hours, rm.duration_weeks
+            rm.field, rm.level, rm.weekly_hours, rm.duration_weeks,
+            on_progress=_outline_progress_reporter(run_uuid, rm.duration_weeks),
         )
         
         logger.info(f"[generate_roadmap_outline_sync] LLM call completed successfully")
-        outline = outline_obj.model_dump()
-
-        run.progress = 60
-        run.message = "Creating course structure"
-        db.commit()
+        # Read the validated model directly; no intermediate dict copy
+        weeks = outline_obj.weeks
 
         # Batch course and module creation
         course = Course(
@@ -296,45 +555,50 @@ def generate_roadmap_outline_sync(run_id: str) -> Dict[str, Any]:
             status="draft",
             title=f"{rm.title} (AI-generated)",
             description=f"{rm.duration_weeks}-week roadmap for {rm.field}, level {rm.level}.",
+            modules_count=len(weeks),
         )
         db.add(course)
         db.flush()  # Get course.id without committing
 
-        # Batch insert all modules at once
-        modules_data = []
-        for w in outline["weeks"]:
-            modules_data.append({
+        # All modules in one executemany; psycopg sends it as a multi-row INSERT
+        modules_data = [
+            {
                 "course_id": course.id,
-                "week": int(w["week"]),
-                "title": w["title"],
-                "outcomes_json": json.dumps(w["outcomes"]),
+                "week": int(w.week),
+                "title": w.title,
+                "outcomes": list(w.outcomes),
                 "content_md": None,
-            })
+            }
+            for w in weeks
+        ]
         
-        db.bulk_insert_mappings(CourseModule, modules_data)  # Bulk insert for performance
+        db.execute(insert(CourseModule), modules_data)
         run.course_id = course.id
-
-        run.progress = 85
-        run.message = "Saving outline + course structure"
-        run.result_json = json.dumps(outline)
-        db.commit()
+        run.result_json = outline_obj.model_dump_json()  # pydantic-core serializer
 
         run.status = "succeeded"
         run.progress = 100
         run.message = "Done"
         run.finished_at = datetime.now(timezone.utc)
         course.status = "ready"
-        db.commit()
+        _commit_run(db, run)
 
         return {"ok": True, "course_id": str(course.id)}
 
     except Exception as e:
         logger.error(f"[generate_roadmap_outline_sync] Error: {str(e)}")
-        run = db.query(GenerationRun).filter(GenerationRun.id == run_uuid).first()
-        if run:
-            run.status = "failed"
-            run.error = f"{type(e).__name__}: {e}"
-            run.finished_at = datetime.now(timezone.utc)
+        db.rollback()
+        # A retried run is reset to queued by the worker; "failed" here would
+        # read as final to pollers and make the retry skip the run
+        if not will_retry:
+            # Mark failed by id with a single UPDATE; no need to reload the run
+            update_run(
+                run_uuid,
+                status="failed",
+                error=f"{type(e).__name__}: {e}",
+                finished=True,
+                db=db,
+            )
             db.commit()
         raise DocumentPortalException("Failed to generate roadmap outline", e)
     finally:
@@ -398,30 +662,204 @@ def generate_course_modules_langgraph(
         raise DocumentPortalException("Failed to generate course modules", e)
 
 
+def submit_course_modules_batch(run_id: str, course_id: str, *, overwrite: bool) -> Dict[str, Any]:
+    """Submit every week still needing content as one provider batch.
+
+    Schedules a poll_course_modules_batch job to collect the results. Falls
+    back to LangGraph generation if the batch cannot be submitted.
+
+    Args:
+        run_id: Generation run ID
+        course_id: Course whose modules should be written
+        overwrite: Whether to rewrite weeks that already have content
+
+    Returns:
+        Dict with success status and the batch ID if one was submitted
+    """
+    client = get_batch_client()
+    db = SessionLocal()
+    try:
+        course = (
+            db.query(Course)
+            .options(joinedload(Course.roadmap))
+            .filter(Course.id == _to_uuid(course_id))
+            .first()
+        )
+        rm = course.roadmap if course else None
+        if not course or not rm:
+            update_run(run_id, status="failed", error="course/roadmap not found", finished=True, db=db)
+            db.commit()
+            return {"ok": False, "error": "course/roadmap not found"}
+
+        modules = (
+            db.query(CourseModule)
+            .filter(CourseModule.course_id == course.id)
+            .order_by(CourseModule.week.asc())
+            .all()
+        )
+        todo = [m for m in modules if overwrite or not (m.content_md and m.content_md.strip())]
+        requests = [
+            client.build_batch_request(
+                f"week-{m.week}",
+                system=SYSTEM_MODULE_WRITER,
+                user=build_module_prompt(
+                    rm.field, rm.level, int(m.week), m.title,
+                    m.outcomes or [],
+                ),
+                temperature=0.2,
+            )
+            for m in todo
+        ]
+    finally:
+        db.close()
+
+    if not requests:
+        update_run(run_id, status="succeeded", progress=100, message="Done! (weeks_written=0)", finished=True)
+        return {"ok": True}
+
+    try:
+        batch_id = client.submit_batch(requests, completion_window=settings.llm_batch_completion_window)
+    except Exception as e:
+        logger.warning(f"[submit_course_modules_batch] Batch submit failed, writing weeks directly: {str(e)}")
+        return generate_course_modules_langgraph(run_id, course_id, overwrite=overwrite)
+
+    update_run(run_id, progress=5, message=f"Submitted {len(requests)} weeks as batch {batch_id}")
+    enqueue_job(
+        job_type="poll_course_modules_batch",
+        run_id=run_id,
+        course_id=course_id,
+        extra={"batch_id": batch_id, "poll": 0},
+        delay_seconds=BATCH_POLL_BASE_SECONDS,
+    )
+    return {"ok": True, "batch_id": batch_id}
+
+
+def poll_course_modules_batch(run_id: str, course_id: str, batch_id: str, poll: int = 0) -> Dict[str, Any]:
+    """Collect a module batch's results, or check again later.
+
+    Valid lessons are saved; any week still without content is handed to
+    the LangGraph path (without batching) so the run always completes.
+
+    Args:
+        run_id: Generation run ID
+        course_id: Course whose modules are being written
+        batch_id: Provider batch ID
+        poll: Number of polls already made (drives the back-off)
+
+    Returns:
+        Dict with success status, and pending=True if the batch is not done
+    """
+    db = SessionLocal()
+    try:
+        run = db.query(GenerationRun).filter(GenerationRun.id == _to_uuid(run_id)).first()
+        if not run or run.status in ("succeeded", "failed"):
+            # Cancelled (or cleaned up) while the batch was running
+            return {"ok": True, "skipped": True}
+
+        results = get_batch_client().get_batch_results(batch_id)
+        if results is None:
+            delay = min(BATCH_POLL_BASE_SECONDS * 2 ** poll, BATCH_POLL_MAX_SECONDS)
+            update_run(run_id, message=f"Waiting for batch {batch_id} (next check in {delay}s)", db=db)
+            db.commit()
+            enqueue_job(
+                job_type="poll_course_modules_batch",
+                run_id=run_id,
+                course_id=course_id,
+                extra={"batch_id": batch_id, "poll": poll + 1},
+                delay_seconds=delay,
+            )
+            return {"ok": True, "pending": True}
+
+        modules = (
+            db.query(CourseModule)
+            .filter(CourseModule.course_id == _to_uuid(course_id))
+            .order_by(CourseModule.week.asc())
+            .all()
+        )
+        written = 0
+        for m in modules:
+            md = results.get(f"week-{m.week}")
+            if md is None:
+                continue
+            try:
+                md = ensure_valid_module_markdown(md)
+            except ValueError as e:
+                logger.warning(f"[poll_course_modules_batch] Week {m.week} from batch is invalid: {str(e)}")
+                continue
+            save_module_markdown(m, md)
+            written += 1
+
+        # Run status goes in the same commit as the saved weeks
+        missing = [int(m.week) for m in modules if not (m.content_md and m.content_md.strip())]
+        if missing:
+            update_run(run_id, message=f"Batch wrote {written} weeks; writing {len(missing)} more directly", db=db)
+        else:
+            update_run(run_id, status="succeeded", progress=100, message=f"Done! (weeks_written={written})",
+                       finished=True, db=db)
+        db.commit()
+    finally:
+        db.close()
+
+    logger.info(f"[poll_course_modules_batch] Batch {batch_id} wrote {written} weeks, missing={missing}")
+    if missing:
+        enqueue_job(
+            job_type="generate_course_modules",
+            run_id=run_id,
+            course_id=course_id,
+            overwrite=False,
+            extra={"use_batch": False},
+        )
+    return {"ok": True}
+
+
 # -------------------------
 # Worker loop (consumer)
 # -------------------------
-def process_roadmap_generation_queue():
+# Idle BLMOVE timeout (jittered +/-25% per call); also bounds how long a
+# shutdown request waits while the worker is idle
+QUEUE_BLOCK_SECONDS = 5
+# Cap on the back-off after consecutive failures to take a job
+ERROR_BACKOFF_MAX_SECONDS = 30
+
+
+def process_roadmap_generation_queue(stop_event: threading.Event | None = None):
     """Worker loop that processes jobs from the Redis queue.
     
     Continuously polls for jobs, processes them based on type,
-    and handles retries on failure. Runs indefinitely.
+    and handles retries on failure. Runs until stop_event is set; a job
+    already in progress is finished first.
+    
+    Args:
+        stop_event: Set to request a graceful shutdown. Checked between
+            jobs, so it is observed within QUEUE_BLOCK_SECONDS when idle.
     
     Job types:
     - generate_roadmap_outline: Creates course structure
     - generate_course_modules: Generates detailed module content
+    - poll_course_modules_batch: Collects provider Batch API results
     """
     logger.info(f"[worker] Starting loop. pending={PENDING_Q} processing={PROCESSING_Q}")
 
-    while True:
+    stop_event = stop_event or threading.Event()
+    error_streak = 0
+    while not stop_event.is_set():
         task_raw = None  # Initialize before try block
         try:
-            task_raw = redis_client.brpoplpush(PENDING_Q, PROCESSING_Q, timeout=30)
+            _promote_delayed_jobs()
+            # BLMOVE (Redis 6.2+) replaces the deprecated BRPOPLPUSH: oldest job
+            # off the right of pending, onto the left of processing. The ACK's
+            # LREM scans from the left, so it finds this job within the first
+            # few entries (processing holds at most one job per worker).
+            # Jittered so idle workers started together don't keep polling
+            # the delayed set in lockstep
+            block_seconds = round(QUEUE_BLOCK_SECONDS * random.uniform(0.75, 1.25), 1)
+            task_raw = blocking_client.blmove(PENDING_Q, PROCESSING_Q, block_seconds, src="RIGHT", dest="LEFT")
+            error_streak = 0
             if not task_raw:
                 logger.debug(f"[worker] idle (no jobs)")
                 continue
 
-            task = json.loads(task_raw)
+            task = orjson.loads(task_raw)
             job_type = task.get("type", "generate_roadmap_outline")
             run_id = task.get("run_id")
             course_id = task.get("course_id")
@@ -436,20 +874,31 @@ def process_roadmap_generation_queue():
                 f"course_id={course_id} overwrite={overwrite} attempt={task.get('attempt')}"
             )
 
-            update_run(run_id, status="running", progress=1, message="Worker picked up job", started=True)
+            # Outline jobs claim their run under a row lock themselves
+            if job_type not in ("generate_roadmap_outline", "poll_course_modules_batch"):
+                update_run(run_id, status="running", progress=1, message="Worker picked up job", started=True)
 
             if job_type == "generate_roadmap_outline":
-                generate_roadmap_outline_sync(run_id)
+                # Mirrors the retry check in the except block below
+                generate_roadmap_outline_sync(run_id, will_retry=int(task.get("attempt", 0)) < MAX_RETRIES)
 
             elif job_type == "generate_course_modules":
                 if not course_id:
                     update_run(run_id, status="failed", error="course_id missing in job payload", finished=True)
+                elif task.get("use_batch", True) and get_batch_client() is not None:
+                    submit_course_modules_batch(run_id, course_id, overwrite=overwrite)
                 else:
                     generate_course_modules_langgraph(run_id, course_id, overwrite=overwrite)
 
+            elif job_type == "poll_course_modules_batch":
+                poll_course_modules_batch(run_id, course_id, task.get("batch_id"), int(task.get("poll", 0)))
+
             else:
                 update_run(run_id, status="failed", error=f"Unknown job type: {job_type}", finished=True)
 
+            # ACK right away rather than buffering several: jobs run for minutes,
+            # so this round trip is noise, and an ACK lost in a crash would re-run
+            # a finished job (module generation is not idempotent with overwrite)
             redis_client.lrem(PROCESSING_Q, 1, task_raw)
 
         except Exception as e:
@@ -458,29 +907,47 @@ def process_roadmap_generation_queue():
             # If we have a task_raw, remove it from processing queue
             if task_raw:
                 try:
-                    task = json.loads(task_raw)
+                    task = orjson.loads(task_raw)
                     run_id = task.get("run_id")
                     attempt = int(task.get("attempt", 0)) + 1
                     task["attempt"] = attempt
 
                     logger.warning(f"[worker] Retrying task. run_id={run_id} attempt={attempt}/{MAX_RETRIES} error={type(e).__name__}: {e}")
 
-                    if run_id:
-                        update_run(
-                            run_id,
-                            status="running",
-                            progress=1,  # Reset progress on retry
-                            message=f"Retry {attempt}/{MAX_RETRIES} after error: {type(e).__name__}",
-                        )
-
                     if attempt <= MAX_RETRIES:
-                        redis_client.lrem(PROCESSING_Q, 1, task_raw)
-                        redis_client.lpush(PENDING_Q, json.dumps(task))
+                        if run_id:
+                            # Back to queued before the job is visible again, so
+                            # whichever worker takes it can claim the run. Only
+                            # while still active: a cancel that already failed
+                            # the run must not be undone
+                            update_run(
+                                run_id,
+                                status="queued",
+                                progress=1,  # Reset progress on retry
+                                message=f"Retry {attempt}/{MAX_RETRIES} after error: {type(e).__name__}",
+                                only_active=True,
+                            )
+                        # ACK + requeue in one round trip (see _REQUEUE_LUA)
+                        requeued = _requeue_script(
+                            keys=[PROCESSING_Q, PENDING_Q],
+                            args=[task_raw, orjson.dumps(task)],
+                            client=redis_client,
+                        )
+                        if not requeued:
+                            logger.info(f"[worker] Not retrying; job was removed from processing. run_id={run_id}")
                     else:
-                        # Max retries exceeded, mark as failed
-                        redis_client.lrem(PROCESSING_Q, 1, task_raw)
+                        # Max retries exceeded: mark failed before the ACK, so a crash
+                        # in between leaves the job to be recovered, not a stuck run
                         update_run(run_id, status="failed", error=f"Max retries ({MAX_RETRIES}) exceeded", finished=True)
-                except json.JSONDecodeError:
+                        redis_client.lrem(PROCESSING_Q, 1, task_raw)
+                except orjson.JSONDecodeError:
                     redis_client.lrem(PROCESSING_Q, 1, task_raw)
             else:
-                logger.error(f"[worker] Max retries exceeded for unknown task")
+                # Nothing was taken (e.g. Redis unreachable): back off with full
+                # jitter instead of spinning, so replicas don't reconnect in step
+                error_streak += 1
+                delay = random.uniform(0, min(2 ** error_streak, ERROR_BACKOFF_MAX_SECONDS))
+                logger.error(f"[worker] Could not take a job from the queue; retrying in {delay:.1f}s")
+                stop_event.wait(delay)
+
+    logger.info("[worker] Stop requested; loop exited")
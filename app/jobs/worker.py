@@ -1,33 +1,137 @@
 #!/usr/bin/env python3
 """
 Simple worker process for roadmap generation tasks
+
+With WORKER_CONCURRENCY > 1 this process supervises that many child
+workers, each running its own queue loop. BLMOVE hands every job to exactly
+one of them.
 """
 import sys
 import os
 import signal
-import time
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
 
 # Add the app directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.jobs.tasks import process_roadmap_generation_queue
+from app.logger import GLOBAL_LOGGER as logger
+from app.settings import settings
+
+stop_event = threading.Event()
 
 def signal_handler(sig, frame):
-    """Handle shutdown signals gracefully."""
-    print(f'[{time.strftime("%Y-%m-%d %H:%M:%S")}] Worker shutting down...')
-    sys.exit(0)
+    """Handle shutdown signals gracefully.
 
-if __name__ == "__main__":
+    The first signal lets the current job finish; a second one exits at once.
+    """
+    if stop_event.is_set():
+        logger.info("[worker] Second signal, exiting now")
+        sys.exit(0)
+    logger.info("[worker] Worker shutting down...")
+    stop_event.set()
+
+def run_worker():
+    """Run the queue loop(s) in this process until it is signalled to stop.
+
+    With WORKER_THREADS > 1, that many loops run on threads and take jobs
+    concurrently. Jobs spend nearly all their time waiting on the LLM, so
+    threads overlap them without the memory cost of extra processes.
+    """
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting roadmap generation worker...")
+
+    logger.info(f"[worker] Starting roadmap generation worker (pid={os.getpid()}, threads={settings.worker_threads})...")
     try:
-        process_roadmap_generation_queue()
+        if settings.worker_threads > 1:
+            run_queue_threads(settings.worker_threads)
+        else:
+            process_roadmap_generation_queue(stop_event)
     except KeyboardInterrupt:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Worker stopped by user")
+        logger.info("[worker] Worker stopped by user")
     except Exception as e:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Worker error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[worker] Worker error: {str(e)}")
         sys.exit(1)
+
+def run_queue_threads(count: int):
+    """Run `count` queue loops on threads until stop_event is set.
+
+    A loop that dies stops the others too, so the process exits non-zero
+    and gets restarted rather than carrying on with fewer loops.
+
+    Args:
+        count: Number of queue loop threads
+    """
+    errors: list[BaseException] = []
+
+    def loop():
+        try:
+            process_roadmap_generation_queue(stop_event)
+        except BaseException as e:
+            errors.append(e)
+            stop_event.set()
+
+    # Daemon threads, so a second signal's sys.exit() doesn't wait for running jobs
+    threads = [threading.Thread(target=loop, name=f"queue-{i}", daemon=True) for i in range(count)]
+    for t in threads:
+        t.start()
+    # Join with a timeout so the main thread keeps handling signals
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(timeout=0.5)
+    if errors:
+        raise errors[0]
+
+def supervise(concurrency: int):
+    """Run `concurrency` child workers, restarting any that die, until signalled.
+
+    Children are spawned rather than forked so each one builds its own DB
+    engine and Redis pools instead of sharing this process's sockets.
+
+    Args:
+        concurrency: Number of child worker processes
+    """
+    ctx = multiprocessing.get_context("spawn")
+    children: dict[int, multiprocessing.Process] = {}
+
+    def start_child():
+        p = ctx.Process(target=run_worker, name="worker", daemon=False)
+        p.start()
+        children[p.sentinel] = p
+
+    def forward(sig, frame):
+        # Children get SIGINT from the terminal's process group themselves, so
+        # forwarding it too would be their second signal and abort running
+        # jobs. SIGTERM (docker stop) only reaches this process; pass it on
+        logger.info(f"[worker] Supervisor got signal {sig}, stopping {len(children)} workers")
+        stop_event.set()
+        if sig != signal.SIGTERM:
+            return
+        for p in children.values():
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+
+    for _ in range(concurrency):
+        start_child()
+    logger.info(f"[worker] Supervising {concurrency} workers")
+
+    while children:
+        for sentinel in wait(list(children)):
+            p = children.pop(sentinel)
+            p.join()
+            if not stop_event.is_set():
+                logger.warning(f"[worker] Worker pid={p.pid} exited with code {p.exitcode}; restarting")
+                stop_event.wait(1)  # Don't spin if children crash on startup
+                start_child()
+    logger.info("[worker] All workers stopped")
+
+if __name__ == "__main__":
+    if settings.worker_concurrency > 1:
+        supervise(settings.worker_concurrency)
+    else:
+        run_worker()
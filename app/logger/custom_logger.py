@@ -1,5 +1,8 @@
+import atexit
 import os
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 import structlog
 
@@ -21,9 +24,19 @@ class CustomLogger:
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(logging.Formatter("%(message)s"))
 
+        # Callers only enqueue records; a listener thread does the file and
+        # stdout I/O so a slow log pipe never stalls a request or the worker
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
         logging.basicConfig(
             level=logging.INFO,
-            handlers=[console_handler, file_handler]
+            handlers=[queue_handler]
         )
 
         structlog.configure(
@@ -31,9 +44,13 @@ class CustomLogger:
                 structlog.processors.TimeStamper(fmt="iso", utc=True, key="timestamp"),
                 structlog.processors.add_log_level,
                 structlog.processors.EventRenamer(to="event"),
+                structlog.processors.format_exc_info,
                 structlog.processors.JSONRenderer()
             ],
             logger_factory=structlog.stdlib.LoggerFactory(),
+            # Calls below INFO return before the timestamp/JSON processors run;
+            # the handlers would drop them anyway
+            wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
             cache_logger_on_first_use=True,
         )
 
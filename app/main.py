@@ -1,7 +1,8 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
 from app.auth.routes import router as auth_router
 from app.routes import router as app_router
@@ -9,11 +10,22 @@ from app.auth.deps import NotAuthenticated
 from app.roadmaps.routes import router as roadmaps_router
 from app.generation.routes import router as generation_router
 from app.courses.routes import router as courses_router
+from app.courses.rendering import shutdown_render_pool
+from app.jobs.redis_client import async_redis_client
+from app.templating import templates, warm_templates
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_templates()
+    yield
+    shutdown_render_pool()
+    await async_redis_client.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
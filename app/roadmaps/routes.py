@@ -1,8 +1,10 @@
 # Roadmap pages
 import uuid
-from fastapi import APIRouter, Depends, Form, Request
+import hashlib
+from functools import cache
+from fastapi import APIRouter, Depends, Form, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.deps import get_db
@@ -11,12 +13,48 @@ from app.db.models.user import User
 from app.db.models.roadmap import Roadmap
 from app.logger import GLOBAL_LOGGER as logger
 from app.exceptions.custom_exception import DocumentPortalException
+from app.templating import templates
+from app.http_cache import etag_matches
 
-templates = Jinja2Templates(directory="app/templates")
 router = APIRouter(prefix="/roadmaps")
 
+@cache
+def _list_template_digest() -> str:
+    """Digest of the list page's template sources, so a deploy that changes them
+    doesn't keep serving 304s for the old markup."""
+    h = hashlib.blake2b(digest_size=8)
+    for name in ("base.html", "roadmaps_list.html"):
+        source, _, _ = templates.env.loader.get_source(templates.env, name)
+        h.update(source.encode("utf-8"))
+    return h.hexdigest()
+
+def roadmaps_etag(user_id, count, latest) -> str:
+    """Weak ETag for a user's roadmap list.
+
+    Roadmaps are only ever added (there is no edit or delete route), so the
+    row count and newest created_at change whenever the rendered list would.
+    """
+    digest = hashlib.blake2b(
+        f"{user_id}:{count}:{latest}:{_list_template_digest()}".encode("utf-8"),
+        digest_size=8,
+    ).hexdigest()
+    return f'W/"{digest}"'
+
 @router.get("", response_class=HTMLResponse)
 def list_roadmaps(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    # Cheap aggregate first; a revisit with an unchanged list skips loading
+    # the rows and rendering the page
+    count, latest = (
+        db.query(func.count(Roadmap.id), func.max(Roadmap.created_at))
+        .filter(Roadmap.user_id == user.id)
+        .one()
+    )
+    etag = roadmaps_etag(user.id, count, latest)
+    # private: the page is per-user, so shared caches must not store it
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
     items = (
         db.query(Roadmap)
         .filter(Roadmap.user_id == user.id)
@@ -24,7 +62,7 @@ def list_roadmaps(request: Request, db: Session = Depends(get_db), user: User =
         .all()
     )
     return templates.TemplateResponse("roadmaps_list.html", {"request": request,
-    "user": user, "roadmaps": items})
+    "user": user, "roadmaps": items}, headers=headers)
 
 @router.get("/new", response_class=HTMLResponse)
 def new_roadmap_page(request: Request, user: User = Depends(get_current_user)):
@@ -41,7 +79,11 @@ def create_roadmap(
     user: User = Depends(get_current_user),
     ):
     
+    # The id is generated here rather than read back off rm after commit,
+    # which would expire the instance and cost a refresh SELECT
+    roadmap_id = uuid.uuid4()
     rm = Roadmap(
+        id=roadmap_id,
         user_id=user.id,
         title=title.strip(),
         field=field.strip(),
@@ -51,7 +93,7 @@ def create_roadmap(
     )
     db.add(rm)
     db.commit()
-    return RedirectResponse(url=f"/roadmaps/{rm.id}", status_code=303)
+    return RedirectResponse(url=f"/roadmaps/{roadmap_id}", status_code=303)
 
 @router.get("/{roadmap_id}", response_class=HTMLResponse)
 def roadmap_detail(roadmap_id: uuid.UUID, request: Request, db: Session = 
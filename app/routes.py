@@ -1,7 +1,6 @@
 ## Routes for the application
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 
@@ -10,8 +9,8 @@ from app.db.models.course import Course
 from app.db.models.roadmap import Roadmap
 from app.auth.deps import get_current_user
 from app.deps import get_db
+from app.templating import templates
 
-templates = Jinja2Templates(directory="app/templates")
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
@@ -5,11 +5,22 @@ class Settings(BaseSettings):
 
     env: str = "dev"
     database_url: str = "postgresql+psycopg://coursecrafter:coursecrafter@db:5432/coursecrafter"
+    # Per-process SQLAlchemy connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle_seconds: int = 1800
+    # Fail fast when the pool is exhausted instead of queueing for 30s
+    db_pool_timeout_seconds: float = 10.0
     redis_url: str = "redis://redis:6379/0"
+    # Per-process Redis connection pool
+    redis_max_connections: int = 50
+    redis_pool_timeout_seconds: float = 5.0
     SESSION_SECRET: str = "dev-secret-key-local-only"
 
     session_absolute_days: int = 7
     session_idle_minutes: int = 60
+    # Seconds a validated session is trusted without re-reading it (0 disables)
+    session_cache_seconds: int = 30
 
     ollama_base_url: str = "http://localhost:11434/v1"
     ollama_model: str = "llama3.1"
@@ -19,6 +30,26 @@ class Settings(BaseSettings):
     GROQ_BASE_URL: str = "https://api.groq.com/openai/v1"
     GROQ_MODEL: str = "llama-3.1-8b-instant"
 
+    # Max concurrent LLM calls when writing course weeks (match OLLAMA_NUM_PARALLEL for Ollama)
+    llm_max_concurrency: int = 4
+    # Weeks written per LLM call; 1 = one call per week (batches are capped at 6)
+    module_batch_size: int = 1
+
+    # Write course weeks through the provider Batch API (Groq only)
+    llm_batch_enabled: bool = False
+    llm_batch_completion_window: str = "24h"
+
+    # Queue worker processes started by app.jobs.worker (each has its own DB/Redis pools)
+    worker_concurrency: int = 1
+    # Queue loops per worker process, run on threads (jobs are LLM-bound)
+    worker_threads: int = 1
+
+    # LLM response cache (backend: "memory" or "redis")
+    llm_cache_enabled: bool = False
+    llm_cache_backend: str = "memory"
+    llm_cache_ttl_seconds: int = 86400
+    llm_cache_maxsize: int = 1024
+
     # LangSmith tracing configuration
     LANGSMITH_TRACING: bool = False
     LANGSMITH_API_KEY: str | None = None
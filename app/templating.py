@@ -0,0 +1,69 @@
+## Jinja2 template setup shared by the HTML routers
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from app.settings import settings
+
+# Compiled template bytecode survives process restarts (per-user temp dir)
+_BYTECODE_CACHE = FileSystemBytecodeCache()
+
+# Template output pieces joined per streamed chunk; Jinja yields many tiny
+# strings and each chunk of a sync iterator costs a threadpool hop
+STREAM_BUFFER_SIZE = 64
+
+
+def make_templates(directory: str = "app/templates") -> Jinja2Templates:
+    """Create a Jinja2Templates instance with compiled templates cached.
+
+    Outside dev, templates are not re-checked for changes on every render, so
+    each one is compiled once per process (or loaded from the bytecode cache).
+
+    Args:
+        directory: Template directory
+
+    Returns:
+        Configured Jinja2Templates
+    """
+    templates = Jinja2Templates(directory=directory)
+    templates.env.bytecode_cache = _BYTECODE_CACHE
+    templates.env.auto_reload = settings.env == "dev"
+    return templates
+
+
+# One environment for every router, so each template is compiled once per
+# process rather than once per router
+templates = make_templates()
+
+
+def warm_templates() -> int:
+    """Compile every template up front so first requests don't pay for it.
+
+    Returns:
+        Number of templates loaded
+    """
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+
+def stream_template(templates: Jinja2Templates, name: str, context: dict) -> StreamingResponse:
+    """Render a template as a streamed HTML response.
+
+    The page head reaches the client while later parts (e.g. long module
+    lists) are still being rendered, and the full page is never held in
+    memory at once. Everything the template reads must already be loaded,
+    since rendering continues after the handler returns.
+
+    Args:
+        templates: Templates instance holding the environment
+        name: Template name
+        context: Template context
+
+    Returns:
+        StreamingResponse with media type text/html
+    """
+    stream = templates.get_template(name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return StreamingResponse(stream, media_type="text/html")
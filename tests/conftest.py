@@ -66,7 +66,7 @@ def mock_redis_client():
     """Create mocked Redis client."""
     mock_redis = Mock()
     mock_redis.lpush.return_value = "test-task-id"
-    mock_redis.brpoplpush.return_value = None
+    mock_redis.blmove.return_value = None
     mock_redis.lrange.return_value = []
     mock_redis.lrem.return_value = 1
     mock_redis.lpop.return_value = None
@@ -282,7 +282,7 @@ def mock_redis(monkeypatch):
     """Mock Redis client for testing."""
     mock_redis_client = Mock()
     mock_redis_client.lpush.return_value = "task_id"
-    mock_redis_client.brpoplpush.return_value = json.dumps({
+    mock_redis_client.blmove.return_value = json.dumps({
         "task_id": "test-task-id",
         "type": "generate_roadmap_outline",
         "run_id": "test-run-id",
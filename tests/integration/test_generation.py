@@ -10,11 +10,21 @@ from app.deps import get_db
 from app.db.models.user import User
 from app.db.models.roadmap import Roadmap
 from app.db.models.course import Course
+from app.db.models.course_module import CourseModule
 from app.db.models.generation_run import GenerationRun
 from app.auth.hashing import hash_password
 import uuid
 
 
+def _inserted_run(mock_db):
+    """Values of the generation_runs INSERT executed on the mock session."""
+    for call in mock_db.execute.call_args_list:
+        stmt = call.args[0]
+        if getattr(stmt, "is_insert", False) and stmt.table.name == "generation_runs":
+            return stmt.compile().params
+    raise AssertionError("no generation_runs INSERT executed")
+
+
 class TestGeneration:
     """Test generation routes."""
     
@@ -63,13 +73,254 @@ class TestGeneration:
             assert resp.status_code == 303
             assert "run=" in resp.headers["location"]
             # Verify run was created
-            mock_db.add.assert_called_once()
-            mock_db.flush.assert_called_once()
+            mock_db.add.assert_not_called()
+            mock_db.flush.assert_not_called()
             mock_db.commit.assert_called_once()
+            run = _inserted_run(mock_db)
+            assert f"run={run['id']}" in resp.headers["location"]
+            assert run["roadmap_id"] == roadmap.id
             # Verify Redis was called
             mock_redis.lpush.assert_called_once()
 
 
+    def test_start_course_generation_commits_once_before_enqueue(self, client, mock_db):
+        """Test the run is committed with its task ID before the job is queued."""
+        course = Course(id=uuid.uuid4(), user_id=uuid.uuid4(), roadmap_id=uuid.uuid4(), title="Test Course")
+        mock_db.reset_mock()
+        mock_db.execute.return_value.first.return_value = Mock(id=course.id, roadmap_id=course.roadmap_id)
+
+        with patch('app.jobs.tasks.enqueue_job') as mock_enqueue:
+            mock_enqueue.side_effect = lambda **kwargs: mock_db.commit.assert_called_once()
+            resp = client.post(f"/generation/courses/{course.id}/generate", follow_redirects=False)
+
+        assert resp.status_code == 303
+        run = _inserted_run(mock_db)
+        assert f"run={run['id']}" in resp.headers["location"]
+        assert mock_enqueue.call_args.kwargs["task_id"] == run["celery_task_id"]
+        assert mock_enqueue.call_args.kwargs["run_id"] == str(run["id"])
+        assert run["roadmap_id"] == course.roadmap_id
+        mock_db.add.assert_not_called()
+        mock_db.flush.assert_not_called()
+        mock_db.commit.assert_called_once()
+
+    def test_start_course_generation_marks_run_failed_when_enqueue_fails(self, client, mock_db):
+        """Test a Redis failure leaves the run failed instead of stuck queued."""
+        course = Course(id=uuid.uuid4(), user_id=uuid.uuid4(), roadmap_id=uuid.uuid4(), title="Test Course")
+        mock_db.reset_mock()
+        mock_db.execute.return_value.first.return_value = Mock(id=course.id, roadmap_id=course.roadmap_id)
+
+        with patch('app.jobs.tasks.enqueue_job', side_effect=ConnectionError("redis down")):
+            resp = client.post(f"/generation/courses/{course.id}/generate", follow_redirects=False)
+
+        assert resp.status_code == 303
+        failed = mock_db.execute.call_args_list[-1].args[0].compile().params
+        assert failed["status"] == "failed"
+        assert failed["id_1"] == _inserted_run(mock_db)["id"]
+        assert mock_db.commit.call_count == 2
+
+    def test_repeat_generate_reuses_the_active_run(self, client, mock_db):
+        """Test a second submit for a course with an active run queues nothing new."""
+        course_id, existing_id = uuid.uuid4(), uuid.uuid4()
+        ownership = Mock()
+        ownership.first.return_value = Mock(id=course_id, roadmap_id=uuid.uuid4())
+        conflict = Mock()
+        conflict.scalar_one_or_none.return_value = None  # ON CONFLICT DO NOTHING
+        active = Mock()
+        active.scalar_one_or_none.return_value = existing_id
+        mock_db.reset_mock()
+        mock_db.execute.side_effect = [ownership, conflict, active]
+
+        with patch('app.jobs.tasks.enqueue_job') as mock_enqueue:
+            resp = client.post(f"/generation/courses/{course_id}/generate", follow_redirects=False)
+
+        assert resp.headers["location"] == f"/courses/{course_id}?run={existing_id}"
+        mock_enqueue.assert_not_called()
+        mock_db.commit.assert_not_called()
+        mock_db.execute.side_effect = None
+
+    def test_delete_course_is_a_single_statement(self, client, mock_db):
+        """Test deleting a course issues one DELETE and reports missing courses."""
+        mock_db.reset_mock()
+        mock_db.execute.return_value.rowcount = 1
+        resp = client.post(f"/courses/{uuid.uuid4()}/delete", follow_redirects=False)
+        assert resp.headers["location"] == "/courses?deleted=1"
+        mock_db.query.assert_not_called()
+        mock_db.commit.assert_called_once()
+
+        mock_db.reset_mock()
+        mock_db.execute.return_value.rowcount = 0
+        resp = client.post(f"/courses/{uuid.uuid4()}/delete", follow_redirects=False)
+        assert resp.headers["location"] == "/courses?error=course_not_found"
+        mock_db.commit.assert_not_called()
+
+    def test_htmx_course_actions_return_fragments(self, client, mock_db):
+        """Test htmx requests get a fragment to swap in instead of a redirect."""
+        course_id = uuid.uuid4()
+        mock_db.reset_mock()
+        mock_db.execute.return_value.first.return_value = Mock(id=course_id, roadmap_id=uuid.uuid4())
+        with patch('app.jobs.tasks.enqueue_job'):
+            resp = client.post(f"/generation/courses/{course_id}/generate",
+                               headers={"HX-Request": "true"}, follow_redirects=False)
+        assert resp.status_code == 200
+        assert f"/courses/{course_id}?run={_inserted_run(mock_db)['id']}" in resp.text
+
+        mock_db.reset_mock()
+        mock_db.execute.return_value.rowcount = 1
+        resp = client.post(f"/courses/{course_id}/delete",
+                           headers={"HX-Request": "true"}, follow_redirects=False)
+        assert resp.status_code == 200
+        assert resp.text == ""
+        mock_db.commit.assert_called_once()
+
+    def test_runs_status_returns_several_runs_in_one_query(self, client, mock_db):
+        """Test the batched status endpoint answers every requested run with one SELECT."""
+        ids = [uuid.uuid4(), uuid.uuid4()]
+        mock_db.reset_mock()
+        mock_db.execute.return_value.all.return_value = [
+            Mock(id=ids[0], status="running", progress=40, message="Writing", error=None,
+                 course_id=None, result_json=None),
+        ]
+
+        resp = client.get("/generation/runs/status", params={"ids": [str(i) for i in ids]})
+
+        assert resp.status_code == 200
+        data = resp.json()  # the client already undoes the gzip encoding
+        assert list(data) == [str(ids[0])]
+        assert data[str(ids[0])]["progress"] == 40
+        mock_db.execute.assert_called_once()
+        mock_db.query.assert_not_called()
+
+    def test_json_is_gzipped_only_when_accepted_and_large(self, client, mock_db):
+        """Test gzip follows Accept-Encoding, and small bodies are sent as they are."""
+        ids = [uuid.uuid4() for _ in range(10)]
+        mock_db.reset_mock()
+        mock_db.execute.return_value.all.return_value = [
+            Mock(id=i, status="running", progress=40, message="Writing week 3 of 12", error=None,
+                 course_id=None, result_json=None) for i in ids
+        ]
+        params = {"ids": [str(i) for i in ids]}
+
+        gzipped = client.get("/generation/runs/status", params=params, headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert gzipped.headers["vary"] == "Accept-Encoding"
+
+        plain = client.get("/generation/runs/status", params=params, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert len(json.loads(plain.content)) == 10
+
+        mock_db.execute.return_value.all.return_value = []
+        small = client.get("/generation/runs/status", params=params, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+        assert small.content == b"{}"
+
+    def test_run_status_returns_304_when_unchanged(self, client, mock_db):
+        """Test a poll carrying the current ETag gets an empty 304."""
+        run = GenerationRun(id=uuid.uuid4(), status="running", progress=40, message="Writing")
+        mock_db.reset_mock()
+        mock_db.query.return_value.options.return_value.filter.return_value.first.return_value = run
+
+        first = client.get(f"/generation/runs/{run.id}")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+
+        again = client.get(f"/generation/runs/{run.id}", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+
+        run.progress = 55
+        changed = client.get(f"/generation/runs/{run.id}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.json()["progress"] == 55
+
+    def test_run_status_if_none_match_compares_whole_tags(self, client, mock_db):
+        """Test If-None-Match lists, weak prefixes and "*" match; a mere substring does not."""
+        run = GenerationRun(id=uuid.uuid4(), status="running", progress=40, message="Writing")
+        mock_db.reset_mock()
+        mock_db.query.return_value.options.return_value.filter.return_value.first.return_value = run
+        etag = client.get(f"/generation/runs/{run.id}").headers["etag"]
+        opaque = etag.removeprefix("W/")
+
+        for header, expected in [
+            (f'"other", {etag}', 304),
+            (opaque, 304),
+            ("*", 304),
+            (f'W/"x{opaque[1:-1]}x"', 200),
+        ]:
+            resp = client.get(f"/generation/runs/{run.id}", headers={"If-None-Match": header})
+            assert resp.status_code == expected, header
+
+    def test_run_events_stream_until_the_run_finishes(self, client, mock_db):
+        """Test the SSE endpoint sends the current state, then pushed changes, and ends on a final status."""
+        from unittest.mock import AsyncMock
+        run_id = uuid.uuid4()
+        mock_db.reset_mock()
+        mock_db.query.return_value.filter.return_value.first.return_value = (run_id,)
+        pubsub = Mock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.unsubscribe = AsyncMock()
+        pubsub.aclose = AsyncMock()
+        pubsub.get_message = AsyncMock(side_effect=[
+            None,
+            {"data": json.dumps({"id": str(run_id), "progress": 60})},
+            {"data": json.dumps({"id": str(run_id), "status": "succeeded", "progress": 100})},
+        ])
+        snapshot = {"id": str(run_id), "status": "running", "progress": 40, "message": "Writing", "error": None}
+
+        redis_async = Mock()
+        redis_async.pubsub.return_value = pubsub
+        with patch("app.generation.routes.async_redis_client", redis_async), \
+             patch("app.generation.routes._run_snapshot", return_value=snapshot):
+            resp = client.get(f"/generation/runs/{run_id}/events")
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in resp.text.splitlines() if line.startswith("data: ")]
+        assert [e.get("progress") for e in events] == [40, 60, 100]
+        assert events[-1]["status"] == "succeeded"
+        assert ": keepalive" in resp.text
+        pubsub.subscribe.assert_awaited_once_with(f"run_events:{run_id}")
+        pubsub.aclose.assert_awaited_once()
+
+    def test_view_course_streams_stored_module_html(self, client, mock_db):
+        """Test the course page is streamed and serves each module's stored HTML."""
+        course = Course(id=uuid.uuid4(), title="Streamed Course", description=None)
+        course.modules = [
+            CourseModule(id=uuid.uuid4(), week=w, title=f"Week title {w}", outcomes=["x"],
+                         content_html=f"<p>Stored body {w}</p>", media_suggestions=None)
+            for w in (1, 2)
+        ]
+        mock_db.reset_mock()
+        mock_db.query.return_value.options.return_value.filter.return_value.first.return_value = course
+
+        resp = client.get(f"/courses/{course.id}")
+
+        assert resp.status_code == 200
+        assert "content-length" not in resp.headers
+        assert "<p>Stored body 1</p>" in resp.text
+        assert "<p>Stored body 2</p>" in resp.text
+        mock_db.commit.assert_not_called()
+
+    def test_list_courses_pages_with_a_keyset_cursor(self, client, mock_db):
+        """Test the course list fetches one extra row and links the next page after the last shown."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        courses = [
+            Course(id=uuid.uuid4(), title=f"Course {i}", status="outline_ready",
+                   modules_count=8, updated_at=now - datetime.timedelta(hours=i))
+            for i in range(3)
+        ]
+        mock_db.reset_mock()
+        chain = mock_db.query.return_value.options.return_value.filter.return_value
+        chain.order_by.return_value.limit.return_value.all.return_value = courses
+
+        resp = client.get("/courses?limit=2")
+
+        assert resp.status_code == 200
+        chain.order_by.return_value.limit.assert_called_once_with(3)
+        assert "Course 1" in resp.text
+        assert "Course 2" not in resp.text
+        assert "8 weeks" in resp.text
+        assert f"before_id={courses[1].id}" in resp.text
+
 @pytest.fixture
 def clear_runs():
     """Clear all generation runs before test."""
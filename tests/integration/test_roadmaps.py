@@ -0,0 +1,61 @@
+import datetime
+from unittest.mock import Mock
+
+
+class TestRoadmapList:
+    """Test the roadmap list page."""
+
+    def _set_aggregate(self, mock_db, count, latest):
+        mock_db.reset_mock()
+        aggregate = mock_db.query.return_value.filter.return_value.one
+        aggregate.return_value = (count, latest)
+        mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = [
+            Mock(id=i, title=f"Roadmap {i}", field="CS", level="beginner", duration_weeks=8,
+                 weekly_hours=10, created_at=latest) for i in range(count)
+        ]
+
+    def test_list_returns_304_when_unchanged(self, authenticated_client, mock_db_session):
+        """Test a revisit with the current ETag gets a 304 without loading rows."""
+        latest = datetime.datetime(2025, 1, 1, 12, 0)
+        self._set_aggregate(mock_db_session, 2, latest)
+
+        first = authenticated_client.get("/roadmaps")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        self._set_aggregate(mock_db_session, 2, latest)
+        again = authenticated_client.get("/roadmaps", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        mock_db_session.query.return_value.filter.return_value.order_by.assert_not_called()
+
+    def test_list_etag_changes_when_roadmap_added(self, authenticated_client, mock_db_session):
+        """Test a new roadmap invalidates the cached list."""
+        latest = datetime.datetime(2025, 1, 1, 12, 0)
+        self._set_aggregate(mock_db_session, 1, latest)
+        etag = authenticated_client.get("/roadmaps").headers["etag"]
+
+        self._set_aggregate(mock_db_session, 2, latest + datetime.timedelta(minutes=5))
+        resp = authenticated_client.get("/roadmaps", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+
+
+class TestCreateRoadmap:
+    """Test roadmap creation."""
+
+    def test_create_redirects_without_reloading_row(self, authenticated_client, mock_db_session):
+        """Test the redirect uses the id generated before the INSERT."""
+        mock_db_session.reset_mock()
+        resp = authenticated_client.post(
+            "/roadmaps",
+            data={"title": " ML ", "field": "AI", "level": "beginner"},
+            follow_redirects=False,
+        )
+        assert resp.status_code == 303
+        rm = mock_db_session.add.call_args.args[0]
+        assert rm.title == "ML"
+        assert resp.headers["location"] == f"/roadmaps/{rm.id}"
+        mock_db_session.commit.assert_called_once()
+        mock_db_session.refresh.assert_not_called()
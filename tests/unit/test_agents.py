@@ -2,40 +2,29 @@
 import pytest
 from pydantic import ValidationError
 
-from app.agents.workflow import _extract_first_json_object, _validate_outline, generate_roadmap_outline
-from app.agents.schemas import RoadmapOutline
-from app.agents.module_writer import validate_module_markdown, write_module_markdown
+from app.agents.workflow import _validate_outline, generate_roadmap_outline
+from app.agents.llm.base import StructuredOutputError, parse_json_object
+from app.agents.schemas import ModulesBatch, RoadmapOutline, WeekPlan
+from app.agents.module_writer import auto_repair_module_markdown, build_module_prompt, validate_module_markdown, write_module_markdown, awrite_module_markdown, write_all_modules_markdown
 from app.exceptions.custom_exception import DocumentPortalException
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
+import asyncio
+
+
+def _stream(*chunks):
+    """Generator standing in for LLMClient.generate_text_stream."""
+    yield from chunks
+
+
+async def _astream(*chunks):
+    """Async generator standing in for LLMClient.agenerate_text_stream."""
+    for chunk in chunks:
+        yield chunk
 
 
 class TestWorkflowValidation:
     """Test workflow.py validation functions."""
     
-    def test_extract_first_json_object_valid_json(self):
-        """Test extracting valid JSON object from text."""
-        text = '{"test": "value"} some other text'
-        result = _extract_first_json_object(text)
-        assert result == '{"test": "value"}'
-    
-    def test_extract_first_json_object_nested_braces(self):
-        """Test extracting JSON with nested braces."""
-        text = '{"outer": {"inner": "value", "nested": {"deep": "data"}}} more text'
-        result = _extract_first_json_object(text)
-        assert result == '{"outer": {"inner": "value", "nested": {"deep": "data"}}}'
-    
-    def test_extract_first_json_object_no_braces(self):
-        """Test returns None when no braces found."""
-        text = 'no json here'
-        result = _extract_first_json_object(text)
-        assert result is None
-    
-    def test_extract_first_json_object_incomplete_braces(self):
-        """Test returns None when braces are incomplete."""
-        text = '{"incomplete": "value"'
-        result = _extract_first_json_object(text)
-        assert result is None
-    
     def test_validate_outline_correct_structure(self):
         """Test validation passes for correct outline."""
         outline = RoadmapOutline(
@@ -134,6 +123,24 @@ class TestWorkflowValidation:
             _validate_outline(outline, 4)
 
 
+class TestJsonParsing:
+    """Test parsing JSON out of LLM output."""
+
+    def test_parse_clean_json(self):
+        """Test clean JSON parses directly."""
+        assert parse_json_object('{"weeks": []}') == {"weeks": []}
+
+    def test_parse_json_wrapped_in_prose(self):
+        """Test the first object is decoded when the model adds text around it."""
+        text = 'Here is the plan:\n```json\n{"weeks": [{"week": 1}]}\n```\nGood luck!'
+        assert parse_json_object(text) == {"weeks": [{"week": 1}]}
+
+    def test_parse_json_without_object_raises(self):
+        """Test output with no JSON object raises ValueError."""
+        with pytest.raises(ValueError):
+            parse_json_object("no json here")
+
+
 class TestModuleWriterValidation:
     """Test module_writer.py validation functions."""
     
@@ -279,6 +286,105 @@ Resource 1, Resource 2
         # Should not raise exception
         validate_module_markdown(markdown)
 
+    
+    def test_validate_module_markdown_prompt_style_headings(self):
+        """Test headings copied verbatim from the prompt still validate."""
+        markdown = """## Overview
+This is an overview.
+
+## Key concepts
+Concept 1, Concept 2
+
+## Worked example (with Python code)
+Here's a worked example.
+
+## Practice exercises (exactly 3 numbered items)
+1. Exercise one
+2) Exercise two
+3. Exercise three
+
+## Common mistakes
+Common mistake 1, Common mistake 2
+
+## Suggested resources
+Resource 1, Resource 2
+
+## Media suggestions
+- Image: diagram - search keywords: diagram
+"""
+        # Should not raise exception
+        validate_module_markdown(markdown)
+
+
+class TestModuleAutoRepair:
+    """Test local repair of mechanical markdown errors."""
+
+    MECHANICAL = """# Overview
+Overview content.
+
+### Key Concepts:
+Concept content.
+
+## Worked example
+```python
+# Overview of the code
+print("hi")
+```
+
+## Practice exercises
+1. Exercise one
+2. Exercise two
+3. Exercise three
+4. Exercise four
+
+## References
+- A book
+
+## Common mistakes
+Mistakes content.
+
+## Suggested resources
+Resources content.
+
+## Media suggestions
+- Image: diagram - search keywords: diagram
+"""
+
+    def test_auto_repair_fixes_mechanical_errors(self):
+        """Test heading levels, extra sections and surplus exercises are fixed."""
+        with pytest.raises(ValueError):
+            validate_module_markdown(self.MECHANICAL)
+        fixed = auto_repair_module_markdown(self.MECHANICAL)
+        validate_module_markdown(fixed)
+        assert "## Overview" in fixed
+        assert "## Key concepts" in fixed
+        assert "### References" in fixed
+        assert "Exercise four" not in fixed
+        assert "# Overview of the code" in fixed
+
+    @patch('app.agents.module_writer.get_llm_client')
+    def test_write_module_markdown_skips_llm_repair_when_fixed_locally(self, mock_get_client):
+        """Test no repair call is made when the local fixer succeeds."""
+        mock_llm = Mock()
+        mock_llm.generate_text_stream.side_effect = lambda **kwargs: _stream(self.MECHANICAL)
+        mock_get_client.return_value = mock_llm
+
+        result = write_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"])
+        assert "### References" in result
+        mock_llm.generate_text_stream.assert_called_once()
+
+
+class TestModulePrompt:
+    """Test module prompt construction."""
+
+    def test_worked_example_guidance_follows_field(self):
+        """Test programming fields ask for Python code in the worked example."""
+        ml = build_module_prompt("Machine Learning", "beginner", 1, "Intro", ["a", "b"])
+        history = build_module_prompt("World History", "beginner", 1, "Intro", ["a", "b"])
+        assert "Worked example: include Python code" in ml
+        assert "Worked example: code OR step-by-step walkthrough" in history
+        assert ml.startswith("Write a markdown lesson")
+
 
 class TestAgentIntegration:
     """Test agent integration with mocked LLM."""
@@ -287,7 +393,7 @@ class TestAgentIntegration:
     def test_generate_roadmap_outline_success(self, mock_get_client):
         """Test successful roadmap generation."""
         mock_llm = Mock()
-        mock_llm.generate_text.return_value = '{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup env"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Build project"]}, {"week": 3, "title": "Practice", "outcomes": ["Apply skills", "Build portfolio"]}, {"week": 4, "title": "Review", "outcomes": ["Review concepts", "Final project"]}]}'
+        mock_llm.generate_structured.return_value = RoadmapOutline.model_validate_json('{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup env"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Build project"]}, {"week": 3, "title": "Practice", "outcomes": ["Apply skills", "Build portfolio"]}, {"week": 4, "title": "Review", "outcomes": ["Review concepts", "Final project"]}]}')
         mock_get_client.return_value = mock_llm
         
         result = generate_roadmap_outline("Python", "beginner", 5, 4)
@@ -295,37 +401,155 @@ class TestAgentIntegration:
         assert result.weeks[0].week == 1
         assert result.weeks[0].title == "Intro"
         assert "Learn basics" in result.weeks[0].outcomes
+        assert mock_llm.generate_structured.call_args[0][0] is RoadmapOutline
     
     @patch('app.agents.workflow.get_llm_client')
     def test_generate_roadmap_outline_with_repair(self, mock_get_client):
         """Test roadmap generation with repair cycle."""
         mock_llm = Mock()
-        # First call returns invalid JSON, second call returns valid
-        mock_llm.generate_text.side_effect = [
-            'invalid json {"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}]}',
-            '{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Practice"]}, {"week": 3, "title": "Topics", "outcomes": ["More topics", "Apply"]}, {"week": 4, "title": "Final", "outcomes": ["Review", "Project"]}]}'
+        with pytest.raises(ValidationError) as invalid:
+            RoadmapOutline.model_validate_json('invalid json')
+        # First call fails schema validation, second call returns valid
+        mock_llm.generate_structured.side_effect = [
+            invalid.value,
+            RoadmapOutline.model_validate_json('{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Practice"]}, {"week": 3, "title": "Topics", "outcomes": ["More topics", "Apply"]}, {"week": 4, "title": "Final", "outcomes": ["Review", "Project"]}]}')
         ]
         mock_get_client.return_value = mock_llm
         
         result = generate_roadmap_outline("Python", "beginner", 5, 4)
         assert len(result.weeks) == 4
         assert result.weeks[0].title == "Intro"
+        assert "PREVIOUS ATTEMPT FAILED" in mock_llm.generate_structured.call_args.kwargs["user"]
     
+    @patch('app.agents.workflow.get_llm_client')
+    def test_generate_roadmap_outline_repair_shows_raw_output(self, mock_get_client):
+        """Test unparseable output is echoed into the repair prompt, truncated."""
+        from app.agents.workflow import MAX_REPAIR_OUTPUT_CHARS
+        mock_llm = Mock()
+        raw = '{"weeks": [{"week": 1, "title": "Intro", ' + "x" * MAX_REPAIR_OUTPUT_CHARS
+        mock_llm.generate_structured.side_effect = [
+            StructuredOutputError("no JSON object", raw),
+            RoadmapOutline.model_validate_json('{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Practice"]}, {"week": 3, "title": "Topics", "outcomes": ["More topics", "Apply"]}, {"week": 4, "title": "Final", "outcomes": ["Review", "Project"]}]}')
+        ]
+        mock_get_client.return_value = mock_llm
+
+        generate_roadmap_outline("Python", "beginner", 5, 4)
+
+        repair_prompt = mock_llm.generate_structured.call_args.kwargs["user"]
+        assert raw[:MAX_REPAIR_OUTPUT_CHARS] in repair_prompt
+        assert raw not in repair_prompt
+
+    @patch('app.agents.workflow.get_llm_client')
+    def test_generate_roadmap_outline_streams_progress(self, mock_get_client):
+        """Test a progress callback streams the first attempt and counts finished weeks."""
+        mock_llm = Mock()
+        text = '{"weeks": [' + ", ".join(
+            f'{{"week": {i}, "title": "Week {i}", "outcomes": ["a", "b"]}}' for i in range(1, 5)
+        ) + "]}"
+        # Small chunks so the "week" key is split across chunk boundaries
+        mock_llm.generate_text_stream.return_value = iter([text[i:i + 5] for i in range(0, len(text), 5)])
+        mock_get_client.return_value = mock_llm
+        progress = []
+
+        result = generate_roadmap_outline("Python", "beginner", 5, 4, on_progress=progress.append)
+
+        assert [w.title for w in result.weeks] == ["Week 1", "Week 2", "Week 3", "Week 4"]
+        assert progress == [0, 1, 2, 3]
+        assert mock_llm.generate_text_stream.call_args.kwargs["json_mode"] is True
+        mock_llm.generate_structured.assert_not_called()
+
     @patch('app.agents.workflow.get_llm_client')
     def test_generate_roadmap_outline_failure_after_retries(self, mock_get_client):
         """Test roadmap generation fails after max retries."""
         mock_llm = Mock()
-        mock_llm.generate_text.return_value = 'always invalid json'
+        # Valid JSON, but 4 weeks when 3 were requested
+        mock_llm.generate_structured.return_value = RoadmapOutline.model_validate_json('{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Practice"]}, {"week": 3, "title": "Topics", "outcomes": ["More topics", "Apply"]}, {"week": 4, "title": "Final", "outcomes": ["Review", "Project"]}]}')
         mock_get_client.return_value = mock_llm
         
         with pytest.raises(RuntimeError, match="Planner output did not validate after retries"):
-            generate_roadmap_outline("Python", "beginner", 5, 4)
+            generate_roadmap_outline("Python", "beginner", 5, 3)
+        assert mock_llm.generate_structured.call_count == 2
+    
+    def test_groq_generate_structured_uses_json_mode(self):
+        """Test Groq client requests JSON mode and validates the schema."""
+        from app.agents.llm.groq import GroqOpenAIClient
+        client = GroqOpenAIClient(api_key="test", base_url="http://localhost", model="test-model")
+        client.client = Mock()
+        client.client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content='{"weeks": [{"week": 1, "title": "Intro", "outcomes": ["Learn basics", "Setup"]}, {"week": 2, "title": "Advanced", "outcomes": ["Master concepts", "Practice"]}, {"week": 3, "title": "Topics", "outcomes": ["More topics", "Apply"]}, {"week": 4, "title": "Final", "outcomes": ["Review", "Project"]}]}'))]
+        )
+        
+        outline = client.generate_structured(RoadmapOutline, system="s", user="u", temperature=0.1)
+        assert len(outline.weeks) == 4
+        assert client.client.chat.completions.create.call_args.kwargs["response_format"] == {"type": "json_object"}
+    
+    def test_groq_generate_structured_keeps_raw_text_on_bad_json(self):
+        """Test a reply that isn't JSON raises a ValueError carrying the model's text."""
+        from app.agents.llm.groq import GroqOpenAIClient
+        client = GroqOpenAIClient(api_key="test", base_url="http://localhost", model="test-model")
+        client.client = Mock()
+        client.client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content="Sure! Here are the weeks: week 1 ..."))]
+        )
+
+        with pytest.raises(StructuredOutputError) as err:
+            client.generate_structured(RoadmapOutline, system="s", user="u", temperature=0.1)
+        assert isinstance(err.value, ValueError)
+        assert err.value.text == "Sure! Here are the weeks: week 1 ..."
+
+    def test_groq_stream_json_mode_sets_response_format(self):
+        """Test streamed Groq calls only request JSON mode when asked to."""
+        from app.agents.llm.groq import GroqOpenAIClient
+        client = GroqOpenAIClient(api_key="test", base_url="http://localhost", model="test-model")
+        client.client = Mock()
+        stream = MagicMock()
+        stream.__iter__.side_effect = lambda: iter([Mock(choices=[Mock(delta=Mock(content='{"weeks": []}'))])])
+        client.client.chat.completions.create.return_value = stream
+
+        assert "".join(client.generate_text_stream(system="s", user="u", json_mode=True)) == '{"weeks": []}'
+        kwargs = client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["stream"] is True
+        assert kwargs["response_format"] == {"type": "json_object"}
+
+        list(client.generate_text_stream(system="s", user="u"))
+        assert "response_format" not in client.client.chat.completions.create.call_args.kwargs
+
+    def test_groq_batch_results_parsed_from_bytes(self):
+        """Test batch output JSONL is parsed from raw bytes, skipping failed lines."""
+        from app.agents.llm.groq import GroqOpenAIClient
+        client = GroqOpenAIClient(api_key="test", base_url="http://localhost", model="test-model")
+        client.client = Mock()
+        client.client.batches.retrieve.return_value = Mock(status="completed", output_file_id="file_1")
+        client.client.files.content.return_value = Mock(content=(
+            b'{"custom_id": "week-1", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " ## Overview "}}]}}}\n'
+            b'\n'
+            b'{"custom_id": "week-2", "response": {"status_code": 500, "body": {}}}\n'
+        ))
+
+        assert client.get_batch_results("batch_1") == {"week-1": "## Overview"}
+
+    def test_ollama_generate_text_round_trip(self):
+        """Test Ollama client sends the chat payload and reads the reply."""
+        import httpx
+        import json
+        from app.agents.llm.ollama import OllamaOpenAIClient
+
+        def handler(request):
+            body = json.loads(request.content)
+            assert request.headers["content-type"] == "application/json"
+            assert body["messages"][1] == {"role": "user", "content": "u"}
+            return httpx.Response(200, json={"choices": [{"message": {"content": "héllo"}}]})
+
+        client = OllamaOpenAIClient(base_url="http://ollama", model="llama3.1")
+        client._client = httpx.Client(base_url="http://ollama", headers=client._headers(),
+                                      transport=httpx.MockTransport(handler))
+        assert client.generate_text(system="s", user="u") == "héllo"
     
     @patch('app.agents.module_writer.get_llm_client')
     def test_write_module_markdown_success(self, mock_get_client):
         """Test successful module markdown generation."""
         mock_llm = Mock()
-        mock_llm.generate_text.return_value = """## Overview
+        mock_llm.generate_text_stream.side_effect = lambda **kwargs: _stream("""## Overview
 Overview content.
 
 ## Key concepts
@@ -347,7 +571,7 @@ Resources content.
 
 ## Media suggestions
 - Image: diagram - search keywords: diagram
-"""
+""")
         mock_get_client.return_value = mock_llm
         
         result = write_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"])
@@ -359,7 +583,7 @@ Resources content.
         """Test module markdown generation with repair."""
         mock_llm = Mock()
         # First call invalid (missing heading), second call valid
-        mock_llm.generate_text.side_effect = [
+        mock_llm.generate_text_stream.side_effect = [_stream(text) for text in [
             """## Overview
 Overview content.
 
@@ -404,7 +628,7 @@ Resources content.
 ## Media suggestions
 - Image: diagram - search keywords: diagram
 """
-        ]
+        ]]
         mock_get_client.return_value = mock_llm
         
         result = write_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"])
@@ -415,8 +639,106 @@ Resources content.
         """Test module markdown generation fails after repair attempt."""
         mock_llm = Mock()
         # Both calls return invalid markdown
-        mock_llm.generate_text.return_value = "Invalid markdown without proper headings"
+        mock_llm.generate_text_stream.side_effect = lambda **kwargs: _stream("Invalid markdown without proper headings")
         mock_get_client.return_value = mock_llm
         
         with pytest.raises(DocumentPortalException, match="Module markdown validation failed after repair"):
             write_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"])
+    
+    @patch('app.agents.module_writer.get_llm_client')
+    def test_awrite_module_markdown_with_repair(self, mock_get_client):
+        """Test async module markdown generation repairs invalid output."""
+        valid = """## Overview
+Overview content.
+
+## Key concepts
+Concept content.
+
+## Worked example
+Example content.
+
+## Practice exercises
+1. Exercise one
+2. Exercise two
+3. Exercise three
+
+## Common mistakes
+Mistakes content.
+
+## Suggested resources
+Resources content.
+
+## Media suggestions
+- Image: diagram - search keywords: diagram
+"""
+        mock_llm = Mock()
+        mock_llm.agenerate_text_stream.side_effect = [_astream("Invalid markdown"), _astream(valid)]
+        mock_get_client.return_value = mock_llm
+        
+        result = asyncio.run(awrite_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"]))
+        assert "## Media suggestions" in result
+        assert mock_llm.agenerate_text_stream.call_count == 2
+        assert mock_llm.agenerate_text_stream.call_args.kwargs["temperature"] == 0.1
+    
+    @patch('app.agents.module_writer.get_llm_client')
+    def test_write_all_modules_markdown_falls_back_per_week(self, mock_get_client):
+        """Test one batched call, with a single-week retry for an invalid item."""
+        valid = """## Overview
+Overview content.
+
+## Key concepts
+Concept content.
+
+## Worked example
+Example content.
+
+## Practice exercises
+1. Exercise one
+2. Exercise two
+3. Exercise three
+
+## Common mistakes
+Mistakes content.
+
+## Suggested resources
+Resources content.
+
+## Media suggestions
+- Image: diagram - search keywords: diagram
+"""
+        mock_llm = Mock()
+        mock_llm.generate_structured.return_value = ModulesBatch(modules=[
+            {"week": 1, "markdown": valid},
+            {"week": 2, "markdown": "## Overview only"},
+        ])
+        mock_llm.generate_text_stream.side_effect = lambda **kwargs: _stream(valid)
+        mock_get_client.return_value = mock_llm
+        weeks = [
+            WeekPlan(week=1, title="Intro", outcomes=["Learn basics", "Setup env"]),
+            WeekPlan(week=2, title="Advanced", outcomes=["Master concepts", "Build project"]),
+        ]
+        
+        result = write_all_modules_markdown("Python", "beginner", weeks)
+        assert result == [valid.strip(), valid.strip()]
+        mock_llm.generate_structured.assert_called_once()
+        mock_llm.generate_text_stream.assert_called_once()
+    
+    @patch('app.agents.module_writer.get_llm_client')
+    def test_write_module_markdown_stops_stream_on_short_practice_section(self, mock_get_client):
+        """Test a stream is closed once a finished practice section is short."""
+        consumed = []
+
+        def doomed(**kwargs):
+            for chunk in ["## Practice exercises\n1. Only one\n", "x" * 1000, "\n## Common mistakes\n", "y" * 800, "never read"]:
+                consumed.append(chunk)
+                yield chunk
+
+        mock_llm = Mock()
+        mock_llm.generate_text_stream.side_effect = doomed
+        mock_get_client.return_value = mock_llm
+
+        with pytest.raises(DocumentPortalException):
+            write_module_markdown("Python", "beginner", 1, "Intro", ["Learn basics"])
+        assert "never read" not in consumed
+        # The repair attempt still ran after the early stop
+        assert mock_llm.generate_text_stream.call_count == 2
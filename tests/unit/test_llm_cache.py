@@ -0,0 +1,106 @@
+"""Unit tests for the LLM response cache."""
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.agents.llm.cache import CachingLLMClient, InMemoryCache
+from app.agents.schemas import WeekPlan
+
+
+def _inner(text="cached answer"):
+    inner = Mock()
+    inner.provider = "groq"
+    inner.model = "test-model"
+    inner.generate_text.return_value = text
+    inner.agenerate_text = AsyncMock(return_value=text)
+    return inner
+
+
+class TestInMemoryCache:
+    """Test the in-process LRU backend."""
+
+    def test_evicts_least_recently_used(self):
+        """Test oldest untouched entry is evicted past maxsize."""
+        cache = InMemoryCache(maxsize=2)
+        cache.update("a", "1", ttl=60)
+        cache.update("b", "2", ttl=60)
+        cache.lookup("a")
+        cache.update("c", "3", ttl=60)
+        assert cache.lookup("a") == "1"
+        assert cache.lookup("b") is None
+        assert cache.lookup("c") == "3"
+
+    def test_expired_entry_is_a_miss(self):
+        """Test entries past their TTL are dropped."""
+        cache = InMemoryCache()
+        with patch("app.agents.llm.cache.time.monotonic", return_value=100.0):
+            cache.update("a", "1", ttl=10)
+        with patch("app.agents.llm.cache.time.monotonic", return_value=111.0):
+            assert cache.lookup("a") is None
+
+
+class TestCachingLLMClient:
+    """Test the caching client wrapper."""
+
+    def test_repeat_prompt_hits_cache(self):
+        """Test identical prompt is only sent to the LLM once."""
+        inner = _inner()
+        client = CachingLLMClient(inner, InMemoryCache())
+        first = client.generate_text(system="s", user="u", temperature=0.2)
+        second = client.generate_text(system="s", user="u", temperature=0.2)
+        assert first == second == "cached answer"
+        inner.generate_text.assert_called_once()
+
+    def test_high_temperature_bypasses_cache(self):
+        """Test sampling calls are never served from cache."""
+        inner = _inner()
+        client = CachingLLMClient(inner, InMemoryCache())
+        client.generate_text(system="s", user="u", temperature=0.7)
+        client.generate_text(system="s", user="u", temperature=0.7)
+        assert inner.generate_text.call_count == 2
+
+    def test_async_shares_cache_with_sync(self):
+        """Test agenerate_text reuses entries written by generate_text."""
+        inner = _inner()
+        client = CachingLLMClient(inner, InMemoryCache())
+        client.generate_text(system="s", user="u", temperature=0.2)
+        result = asyncio.run(client.agenerate_text(system="s", user="u", temperature=0.2))
+        assert result == "cached answer"
+        inner.agenerate_text.assert_not_awaited()
+
+    def test_invalidate_forces_new_call(self):
+        """Test invalidated prompt goes back to the LLM."""
+        inner = _inner()
+        client = CachingLLMClient(inner, InMemoryCache())
+        client.generate_text(system="s", user="u", temperature=0.2)
+        client.invalidate(system="s", user="u", temperature=0.2)
+        client.generate_text(system="s", user="u", temperature=0.2)
+        assert inner.generate_text.call_count == 2
+
+    def test_structured_calls_forward_to_inner_and_cache(self):
+        """Test generate_structured keeps the inner client's native mode."""
+        inner = _inner()
+        inner.generate_structured.return_value = WeekPlan(week=1, title="Intro", outcomes=["a", "b"])
+        client = CachingLLMClient(inner, InMemoryCache())
+        first = client.generate_structured(WeekPlan, system="s", user="u", temperature=0.1)
+        second = client.generate_structured(WeekPlan, system="s", user="u", temperature=0.1)
+        assert first == second
+        inner.generate_structured.assert_called_once()
+        inner.generate_text.assert_not_called()
+
+    def test_stream_cached_only_when_read_to_the_end(self):
+        """Test a stream abandoned part-way is not stored."""
+        inner = _inner()
+
+        def stream_chunks(**kwargs):
+            yield "part one, "
+            yield "part two"
+
+        inner.generate_text_stream.side_effect = stream_chunks
+        client = CachingLLMClient(inner, InMemoryCache())
+
+        stream = client.generate_text_stream(system="s", user="u", temperature=0.2)
+        next(stream)
+        stream.close()
+        assert "".join(client.generate_text_stream(system="s", user="u", temperature=0.2)) == "part one, part two"
+        assert "".join(client.generate_text_stream(system="s", user="u", temperature=0.2)) == "part one, part two"
+        assert inner.generate_text_stream.call_count == 2
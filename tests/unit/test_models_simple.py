@@ -146,6 +146,14 @@ class TestCourseModel:
         assert course.title == "Test Course"
         assert course.description == "Test course description"
         assert course.status == "draft"
+    
+    def test_course_modules_must_be_eager_loaded(self):
+        """Test Course.modules is ordered by week and never lazy-loads."""
+        from sqlalchemy import inspect
+        modules = inspect(Course).relationships["modules"]
+        assert modules.lazy == "raise"
+        assert modules.passive_deletes is True
+        assert [c.name for c in modules.order_by] == ["week"]
 
 
 class TestGenerationRunModel:
@@ -177,3 +185,10 @@ class TestGenerationRunModel:
         assert run.status == "queued"
         assert run.progress == 0
         assert run.message == "Test generation run"
+
+    def test_result_json_is_not_loaded_by_default(self):
+        """Test plain run queries leave the large result_json column out."""
+        from sqlalchemy import select
+        sql = str(select(GenerationRun))
+        assert "generation_runs.status" in sql
+        assert "result_json" not in sql
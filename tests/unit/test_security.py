@@ -4,7 +4,7 @@ import datetime
 from unittest.mock import Mock, patch
 
 from app.auth.hashing import hash_password, verify_password
-from app.auth.sessions import new_raw_token, hash_token, absolute_expiry
+from app.auth.sessions import new_raw_token, hash_token, absolute_expiry, SessionCache
 from app.jobs.tasks import _to_uuid, _ts
 
 
@@ -44,6 +44,15 @@ class TestSecurityUnit:
         hashed_exact = hash_password(exact_password)
         assert verify_password(exact_password, hashed_exact) is True
     
+    def test_multibyte_password_truncated_by_bytes(self):
+        """Test non-ASCII passwords are cut at 72 UTF-8 bytes, not characters."""
+        # 30 x 4-byte emoji = 120 bytes; only the first 18 emoji fit in 72 bytes
+        password = "🔐" * 30
+        hashed = hash_password(password)
+        assert verify_password(password, hashed) is True
+        assert verify_password("🔐" * 18, hashed) is True
+        assert verify_password("🔐" * 17, hashed) is False
+    
     def test_session_token_security(self):
         """Test session token generation is secure."""
         token1 = new_raw_token()
@@ -157,3 +166,25 @@ class TestSecurityUnit:
         similar_token = token1[:-1] + ("a" if token1[-1] != "a" else "b")
         hash_similar = hash_token(similar_token)
         assert hash1 != hash_similar
+
+    def test_session_cache_expires_and_forgets(self):
+        """Test cached sessions expire after their TTL and on forget."""
+        cache = SessionCache()
+        user_id = uuid.uuid4()
+        expires_at = absolute_expiry()
+
+        with patch("app.auth.sessions.time.monotonic", return_value=100.0):
+            cache.put("h1", user_id, expires_at, ttl=30)
+            cache.put("h2", user_id, expires_at, ttl=30)
+            assert cache.get("h1") == (user_id, expires_at)
+        with patch("app.auth.sessions.time.monotonic", return_value=131.0):
+            assert cache.get("h1") is None
+
+        cache.forget("h2")
+        assert cache.get("h2") is None
+
+    def test_session_cache_disabled_with_zero_ttl(self):
+        """Test a zero TTL never stores the session."""
+        cache = SessionCache()
+        cache.put("h", uuid.uuid4(), absolute_expiry(), ttl=0)
+        assert cache.get("h") is None
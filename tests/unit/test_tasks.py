@@ -2,7 +2,7 @@ import pytest
 import json
 import uuid
 import sys
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import ANY, Mock, patch, MagicMock
 from datetime import datetime, timezone
 
 # Mock langgraph imports before importing tasks
@@ -18,6 +18,8 @@ from app.jobs.tasks import (
     clear_processing_queue,
     cancel_job_by_run_id,
     generate_roadmap_outline_sync,
+    poll_course_modules_batch,
+    _promote_delayed_jobs,
     _to_uuid,
     _ts
 )
@@ -25,6 +27,8 @@ from app.db.models.generation_run import GenerationRun
 from app.db.models.roadmap import Roadmap
 from app.db.models.course import Course
 from app.db.models.course_module import CourseModule
+from app.agents.schemas import RoadmapOutline, WeekPlan
+from app.exceptions.custom_exception import DocumentPortalException
 
 
 class TestTaskHelpers:
@@ -63,6 +67,104 @@ class TestTaskHelpers:
         assert result[10] == " "
         assert result[13] == ":"
         assert result[16] == ":"
+    
+    def test_save_module_markdown_stores_rendered_html(self):
+        """Test saved modules carry HTML rendered from their markdown."""
+        from app.graphs.course_generation import save_module_markdown
+        module = CourseModule(week=1, title="Intro", outcomes=["a", "b"])
+        save_module_markdown(module, "## Overview\nHello <script>x</script>\n")
+        assert module.content_md.startswith("## Overview")
+        assert "<h2>Overview</h2>" in module.content_html
+        assert "<script>" not in module.content_html
+
+    def test_update_run_is_a_single_update_in_the_callers_session(self):
+        """Test update_run issues one UPDATE on a passed session and leaves the commit to the caller."""
+        from app.jobs.run_store import update_run
+        db = Mock()
+        run_id = uuid.uuid4()
+        db.execute.return_value.rowcount = 1
+        assert update_run(str(run_id), progress=40, message="Writing", db=db) is True
+        db.execute.assert_called_once()
+        stmt, params = db.execute.call_args.args
+        assert stmt.is_update
+        assert params == {"run_uuid": run_id}
+        assert set(stmt.compile().params) >= {"progress", "message"}
+        db.query.assert_not_called()
+        db.commit.assert_not_called()
+
+    def test_update_run_only_active_leaves_finished_runs_alone(self):
+        """Test only_active restricts the UPDATE to queued/running runs."""
+        from app.jobs.run_store import update_run
+        db = Mock()
+        db.execute.return_value.rowcount = 0
+        assert update_run(str(uuid.uuid4()), status="queued", only_active=True, db=db) is False
+        stmt = db.execute.call_args.args[0]
+        assert "generation_runs.status IN" in str(stmt)
+        assert set(stmt.compile().params["status_1"]) == {"queued", "running"}
+
+    def test_write_weeks_concurrently_reports_each_week_as_it_finishes(self):
+        """Test on_done sees every week once, failures included, before results are returned."""
+        import asyncio
+        from app.agents.schemas import WeekPlan
+        from app.graphs.course_generation import _write_weeks_concurrently
+
+        async def fake_write(field, level, week, title, outcomes):
+            if week == 2:
+                raise ValueError("bad week")
+            return f"## Week {week}"
+
+        seen = []
+        weeks = [WeekPlan.model_construct(week=i, title=f"W{i}", outcomes=[]) for i in (1, 2, 3)]
+        with patch("app.graphs.course_generation.awrite_module_markdown", side_effect=fake_write), \
+             patch("app.graphs.course_generation.get_llm_client") as mock_client:
+            mock_client.return_value.aclose = MagicMock(side_effect=lambda: asyncio.sleep(0))
+            results = asyncio.run(_write_weeks_concurrently(
+                "ml", "beginner", weeks, max_concurrency=2,
+                on_done=lambda group, res: seen.extend(zip((w.week for w in group), res)),
+            ))
+
+        assert sorted(w for w, _ in seen) == [1, 2, 3]
+        assert results[0] == "## Week 1" and results[2] == "## Week 3"
+        assert isinstance(results[1], ValueError)
+        assert isinstance(dict(seen)[2], ValueError)
+
+    @patch('app.graphs.course_generation.SessionLocal')
+    def test_write_weeks_commits_in_batches(self, mock_session_local):
+        """Test written weeks are committed every WEEKS_PER_COMMIT weeks plus once at the end."""
+        from app.graphs.course_generation import WEEKS_PER_COMMIT, write_weeks
+
+        async def fake_concurrent(field, level, weeks, max_concurrency, batch_size=1, on_done=None):
+            results = [f"## Week {w.week}" for w in weeks]
+            for w, md in zip(weeks, results):
+                on_done([w], [md])
+            return results
+
+        db = Mock()
+        mock_session_local.return_value = db
+        modules = [CourseModule(week=i, title=f"Week {i}", outcomes=["a", "b"]) for i in range(1, 6)]
+        db.query.return_value.filter.return_value.order_by.return_value.all.return_value = modules
+        state = {"run_id": str(uuid.uuid4()), "course_id": str(uuid.uuid4()),
+                 "pending_weeks": [1, 2, 3, 4, 5], "done_weeks": [], "total": 5}
+
+        with patch('app.graphs.course_generation._write_weeks_concurrently', side_effect=fake_concurrent):
+            result = write_weeks(state, {})
+
+        assert result["pending_weeks"] == []
+        assert sorted(result["done_weeks"]) == [1, 2, 3, 4, 5]
+        assert all(m.content_md for m in modules)
+        # Start-of-run progress, one full batch, then the remainder
+        assert WEEKS_PER_COMMIT == 4
+        assert db.commit.call_count == 3
+
+    def test_render_many_matches_single_render_in_order(self):
+        """Test batch rendering (inline and pooled) keeps input order."""
+        from app.courses.rendering import render_many, render_module_html, shutdown_render_pool
+        docs = [f"## Week {i}\nBody {i}\n" for i in range(5)]
+        try:
+            assert render_many(docs[:2]) == [render_module_html(d) for d in docs[:2]]
+            assert render_many(docs) == [render_module_html(d) for d in docs]
+        finally:
+            shutdown_render_pool()
 
 
 class TestQueueOperations:
@@ -95,6 +197,35 @@ class TestQueueOperations:
         assert task_data["attempt"] == 0
         assert "timestamp" in task_data
     
+    def test_enqueue_jobs_uses_one_pipeline(self, mock_redis_client):
+        """Test several jobs are pushed through a single pipeline execute."""
+        from app.jobs.tasks import enqueue_jobs
+        pipe = mock_redis_client.pipeline.return_value
+        with patch('app.jobs.tasks.redis_client', mock_redis_client):
+            task_ids = enqueue_jobs([
+                {"job_type": "generate_roadmap_outline", "run_id": "run-1"},
+                {"job_type": "poll_course_modules_batch", "run_id": "run-2", "delay_seconds": 60},
+            ])
+
+        assert len(task_ids) == 2
+        assert json.loads(pipe.lpush.call_args[0][1])["task_id"] == task_ids[0]
+        pipe.zadd.assert_called_once()
+        pipe.execute.assert_called_once()
+        mock_redis_client.lpush.assert_not_called()
+
+    def test_queue_roadmap_generation_bulk_pushes_outline_jobs(self, mock_redis_client):
+        """Test bulk roadmap enqueue sends one outline job per run in a single pipeline."""
+        from app.jobs.tasks import queue_roadmap_generation_bulk
+        pipe = mock_redis_client.pipeline.return_value
+        with patch('app.jobs.tasks.redis_client', mock_redis_client):
+            task_ids = queue_roadmap_generation_bulk(["run-1", "run-2"])
+
+        pushed = [json.loads(c.args[1]) for c in pipe.lpush.call_args_list]
+        assert [p["run_id"] for p in pushed] == ["run-1", "run-2"]
+        assert {p["type"] for p in pushed} == {"generate_roadmap_outline"}
+        assert [p["task_id"] for p in pushed] == task_ids
+        pipe.execute.assert_called_once()
+
     def test_get_queue_status_empty(self, mock_redis_client):
         """Test getting queue status when empty."""
         with patch('app.jobs.tasks.redis_client', mock_redis_client):
@@ -222,12 +353,249 @@ class TestQueueOperations:
         )
 
 
+class TestWorkerLoop:
+    """Test the queue worker loop."""
+
+    def test_failed_job_is_requeued_in_one_script_call(self, mock_redis_client):
+        """Test a failing job's ACK and requeue go through a single Lua script call."""
+        from app.jobs.tasks import process_roadmap_generation_queue
+        # The client doesn't decode replies; payloads arrive as bytes
+        task_raw = json.dumps({"task_id": "t1", "type": "generate_roadmap_outline",
+                               "run_id": str(uuid.uuid4()), "attempt": 0}).encode()
+        mock_redis_client.evalsha.return_value = 1
+        # Second pop stops the otherwise endless loop
+        blocking = Mock()
+        blocking.blmove.side_effect = [task_raw, KeyboardInterrupt]
+
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.blocking_client', blocking), \
+             patch('app.jobs.tasks.update_run') as mock_update, \
+             patch('app.jobs.tasks.generate_roadmap_outline_sync', side_effect=RuntimeError("boom")):
+            with pytest.raises(KeyboardInterrupt):
+                process_roadmap_generation_queue()
+
+        # The reset to queued must not undo a cancel that already failed the run
+        mock_update.assert_called_once()
+        assert mock_update.call_args.kwargs["status"] == "queued"
+        assert mock_update.call_args.kwargs["only_active"] is True
+        from app.jobs.tasks import _requeue_script
+        requeues = [c for c in mock_redis_client.evalsha.call_args_list if c.args[0] == _requeue_script.sha]
+        assert len(requeues) == 1
+        sha, numkeys, processing_q, pending_q, original, retried = requeues[0].args
+        assert (numkeys, processing_q, pending_q) == (2, "roadmap_generation_processing", "roadmap_generation_queue")
+        assert original == task_raw
+        assert json.loads(retried)["attempt"] == 1
+        mock_redis_client.lrem.assert_not_called()
+        mock_redis_client.lpush.assert_not_called()
+        args, kwargs = blocking.blmove.call_args
+        assert args[:2] == ("roadmap_generation_queue", "roadmap_generation_processing")
+        assert 3.75 <= args[2] <= 6.25
+        assert kwargs == {"src": "RIGHT", "dest": "LEFT"}
+
+    @patch('app.jobs.tasks.publish_run_update')
+    @patch('app.jobs.tasks.generate_roadmap_outline')
+    @patch('app.jobs.tasks.SessionLocal')
+    def test_outline_job_that_fails_once_succeeds_on_retry(self, mock_session_local, mock_generate_outline,
+                                                           mock_publish, mock_redis_client, test_roadmap):
+        """Test a failed outline attempt leaves the run claimable so the retried job completes it."""
+        from app.jobs.tasks import process_roadmap_generation_queue, _requeue_script
+        from app.agents.schemas import RoadmapOutline, WeekPlan
+        run = Mock(id=uuid.uuid4(), user_id=test_roadmap.user_id, roadmap=test_roadmap, status="queued",
+                   progress=0, message="Queued", error=None, started_at=None, finished_at=None)
+        session = Mock()
+        session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = run
+        mock_session_local.return_value = session
+
+        def fake_update_run(run_id, *, only_active=False, db=None, started=False, finished=False, **fields):
+            # Stands in for the single UPDATE against the shared run row
+            if only_active and run.status not in ("queued", "running"):
+                return False
+            for name, value in fields.items():
+                if value is not None:
+                    setattr(run, name, value)
+            return True
+
+        # The requeue script puts the retried payload back on the pending list
+        pending = [json.dumps({"task_id": "t1", "type": "generate_roadmap_outline",
+                               "run_id": str(run.id), "attempt": 0}).encode()]
+        mock_redis_client.evalsha.side_effect = lambda sha, n, *a: (
+            pending.append(a[3]) or 1 if sha == _requeue_script.sha else 0
+        )
+        blocking = Mock()
+        blocking.blmove.side_effect = lambda *a, **kw: pending.pop() if pending else (_ for _ in ()).throw(KeyboardInterrupt)
+        mock_generate_outline.side_effect = [
+            RuntimeError("LLM timeout"),
+            RoadmapOutline.model_construct(weeks=[WeekPlan.model_construct(week=1, title="Intro", outcomes=["a"])]),
+        ]
+
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.blocking_client', blocking), \
+             patch('app.jobs.tasks.update_run', side_effect=fake_update_run), \
+             patch('app.jobs.tasks.Course', return_value=Mock(id=uuid.uuid4())):
+            with pytest.raises(KeyboardInterrupt):
+                process_roadmap_generation_queue()
+
+        assert mock_generate_outline.call_count == 2
+        assert run.status == "succeeded"
+        # The failed attempt was never published as a final "failed" status
+        assert "failed" not in [c.kwargs.get("status") for c in mock_publish.call_args_list]
+
+    def test_exhausted_job_is_failed_before_ack(self, mock_redis_client):
+        """Test a job past MAX_RETRIES marks its run failed, then leaves processing."""
+        from app.jobs.tasks import process_roadmap_generation_queue
+        run_id = str(uuid.uuid4())
+        task_raw = json.dumps({"task_id": "t1", "type": "generate_roadmap_outline",
+                               "run_id": run_id, "attempt": 3})
+        blocking = Mock()
+        blocking.blmove.side_effect = [task_raw, KeyboardInterrupt]
+        calls = Mock()
+        mock_redis_client.lrem.side_effect = lambda *a: calls.lrem(*a)
+
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.blocking_client', blocking), \
+             patch('app.jobs.tasks.update_run', side_effect=lambda *a, **kw: calls.update_run(*a, **kw)), \
+             patch('app.jobs.tasks.generate_roadmap_outline_sync', side_effect=RuntimeError("boom")):
+            with pytest.raises(KeyboardInterrupt):
+                process_roadmap_generation_queue()
+
+        assert [c[0] for c in calls.mock_calls] == ["update_run", "lrem"]
+        assert calls.mock_calls[0].kwargs["status"] == "failed"
+        mock_redis_client.pipeline.assert_not_called()
+
+    def test_queue_threads_stop_together_when_one_dies(self):
+        """Test a crashed queue thread stops its siblings and the error is re-raised."""
+        import threading
+        from app.jobs import worker
+        started = threading.Barrier(3)
+
+        def fake_loop(stop_event):
+            started.wait(timeout=5)
+            if threading.current_thread().name == "queue-0":
+                raise RuntimeError("loop crashed")
+            stop_event.wait(timeout=5)
+
+        stop = threading.Event()
+        with patch.object(worker, 'stop_event', stop), \
+             patch.object(worker, 'process_roadmap_generation_queue', side_effect=fake_loop):
+            with pytest.raises(RuntimeError, match="loop crashed"):
+                worker.run_queue_threads(3)
+        assert stop.is_set()
+
+    def test_second_signal_exits_while_queue_threads_are_busy(self, tmp_path):
+        """Test a second SIGINT ends a multi-threaded worker without waiting for its jobs."""
+        import os
+        import signal
+        import subprocess
+        import time
+        script = tmp_path / "busy_worker.py"
+        script.write_text(
+            "import sys, time\n"
+            "from unittest.mock import Mock, patch\n"
+            "for m in ('langgraph', 'langgraph.graph', 'langchain_core', 'langchain_core.runnables'):\n"
+            "    sys.modules[m] = Mock()\n"
+            "from app.jobs import worker\n"
+            "def busy_job(stop_event):\n"
+            "    print('busy', flush=True)\n"
+            "    time.sleep(60)  # a long job that ignores stop_event\n"
+            "with patch.object(worker, 'process_roadmap_generation_queue', busy_job), \\\n"
+            "     patch.object(worker.settings, 'worker_threads', 2):\n"
+            "    worker.run_worker()\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = {**os.environ, "PYTHONPATH": root}
+        proc = subprocess.Popen([sys.executable, str(script)], cwd=root, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            assert proc.stdout.readline().strip() == "busy"
+            proc.send_signal(signal.SIGINT)
+            time.sleep(0.5)
+            assert proc.poll() is None  # first signal lets the job finish
+            proc.send_signal(signal.SIGINT)
+            proc.wait(timeout=10)
+        finally:
+            proc.kill()
+            proc.wait()
+
+    @pytest.mark.parametrize("signum, forwarded", [("SIGINT", False), ("SIGTERM", True)])
+    def test_supervisor_forwards_only_sigterm(self, signum, forwarded):
+        """Test Ctrl-C isn't sent on to children, which already got it from the terminal."""
+        import signal
+        import threading
+        from app.jobs import worker
+        signum = getattr(signal, signum)
+        handlers = {}
+        children = []
+
+        def make_process(**kwargs):
+            p = Mock(pid=1000 + len(children), sentinel=len(children), exitcode=0)
+            p.is_alive.return_value = True
+            children.append(p)
+            return p
+
+        def fake_wait(sentinels):
+            # Signal arrives while children are running; then they all exit
+            handlers[signum](signum, None)
+            return sentinels
+
+        ctx = Mock()
+        ctx.Process.side_effect = make_process
+        with patch.object(worker, 'stop_event', threading.Event()), \
+             patch.object(worker.multiprocessing, 'get_context', return_value=ctx), \
+             patch.object(worker.signal, 'signal', side_effect=lambda sig, h: handlers.__setitem__(sig, h)), \
+             patch.object(worker, 'wait', side_effect=fake_wait), \
+             patch.object(worker.os, 'kill') as mock_kill:
+            worker.supervise(2)
+
+        assert len(children) == 2  # none restarted after the signal
+        if forwarded:
+            assert sorted(c.args for c in mock_kill.call_args_list) == [(1000, signal.SIGTERM), (1001, signal.SIGTERM)]
+        else:
+            mock_kill.assert_not_called()
+
+    def test_pickup_errors_back_off_with_growing_jitter(self, mock_redis_client):
+        """Test failing pickups sleep with a growing, capped random delay instead of spinning."""
+        import redis
+        from app.jobs.tasks import process_roadmap_generation_queue
+        blocking = Mock()
+        blocking.blmove.side_effect = [redis.ConnectionError("down"), redis.ConnectionError("down"), KeyboardInterrupt]
+
+        stop = Mock()
+        stop.is_set.return_value = False
+
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.blocking_client', blocking), \
+             patch('app.jobs.tasks.random.uniform', side_effect=lambda lo, hi: hi):
+            with pytest.raises(KeyboardInterrupt):
+                process_roadmap_generation_queue(stop)
+
+        assert [c.args[0] for c in stop.wait.call_args_list] == [2, 4]
+
+    def test_stop_event_ends_loop_after_current_job(self, mock_redis_client):
+        """Test a stop requested mid-job lets the job finish and ACK, then exits."""
+        import threading
+        from app.jobs.tasks import process_roadmap_generation_queue
+        task_raw = json.dumps({"task_id": "t1", "type": "generate_roadmap_outline",
+                               "run_id": str(uuid.uuid4()), "attempt": 0})
+        blocking = Mock()
+        blocking.blmove.return_value = task_raw
+        stop = threading.Event()
+
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.blocking_client', blocking), \
+             patch('app.jobs.tasks.generate_roadmap_outline_sync', side_effect=lambda run_id, **kwargs: stop.set()):
+            process_roadmap_generation_queue(stop)
+
+        blocking.blmove.assert_called_once()
+        mock_redis_client.lrem.assert_called_once_with("roadmap_generation_processing", 1, task_raw)
+
+
 class TestGenerationFunctions:
     """Test generation functions."""
     
+    @patch('app.jobs.tasks.publish_run_update')
     @patch('app.jobs.tasks.generate_roadmap_outline')
     @patch('app.jobs.tasks.SessionLocal')
-    def test_generate_roadmap_outline_sync_success(self, mock_session_local, mock_generate_outline, test_roadmap):
+    def test_generate_roadmap_outline_sync_success(self, mock_session_local, mock_generate_outline, mock_publish, test_roadmap):
         """Test successful roadmap outline generation."""
         # Setup mock session
         mock_session = Mock()
@@ -244,22 +612,12 @@ class TestGenerationFunctions:
         mock_run.started_at = None
         mock_run.finished_at = None
         
-        mock_session.query.return_value.options.return_value.filter.return_value.first.return_value = mock_run
+        mock_session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = mock_run
         
         # Setup mock outline generation
-        mock_outline = Mock()
-        mock_outline.model_dump.return_value = {
-            "field": "Computer Science",
-            "level": "beginner",
-            "duration_weeks": 8,
-            "weeks": [
-                {
-                    "week": 1,
-                    "title": "Introduction",
-                    "outcomes": ["Learn basics"]
-                }
-            ]
-        }
+        mock_outline = RoadmapOutline.model_construct(weeks=[
+            WeekPlan.model_construct(week=1, title="Introduction", outcomes=["Learn basics"])
+        ])
         mock_generate_outline.return_value = mock_outline
         
         # Mock course and module creation
@@ -267,7 +625,6 @@ class TestGenerationFunctions:
         mock_course.id = uuid.uuid4()
         mock_session.add = Mock()
         mock_session.flush = Mock()
-        mock_session.bulk_insert_mappings = Mock()
         mock_session.commit = Mock()
         
         with patch('app.jobs.tasks.Course', return_value=mock_course):
@@ -275,26 +632,72 @@ class TestGenerationFunctions:
         
         assert result["ok"] is True
         assert "course_id" in result
+        mock_session_local.assert_called_once_with(expire_on_commit=False)
         mock_generate_outline.assert_called_once_with(
             test_roadmap.field,
             test_roadmap.level,
             test_roadmap.weekly_hours,
-            test_roadmap.duration_weeks
+            test_roadmap.duration_weeks,
+            on_progress=ANY,
         )
-        assert mock_session.commit.call_count >= 3  # Multiple commits during process
+        assert mock_session.commit.call_count == 2  # "running" before the LLM call, then the result
+        # Modules go in as one bulk INSERT with a parameter row per week
+        stmt, rows = mock_session.execute.call_args.args
+        assert stmt.is_insert
+        assert rows == [{"course_id": mock_course.id, "week": 1, "title": "Introduction",
+                         "outcomes": ["Learn basics"], "content_md": None}]
+        assert json.loads(mock_run.result_json)["weeks"][0]["title"] == "Introduction"
+        # Every commit is pushed to the run's event stream, ending with the final status
+        assert mock_publish.call_count == mock_session.commit.call_count
+        assert mock_publish.call_args.kwargs["status"] == "succeeded"
+        assert mock_publish.call_args.kwargs["progress"] == 100
     
+    @patch('app.jobs.tasks.update_run')
+    def test_outline_progress_reporter_throttles_updates(self, mock_update_run):
+        """Test streamed outline progress is written at most once per interval."""
+        from app.jobs.tasks import _outline_progress_reporter
+        run_uuid = uuid.uuid4()
+        report = _outline_progress_reporter(run_uuid, total_weeks=4)
+
+        with patch('app.jobs.tasks.time.monotonic', side_effect=[10.0, 10.5, 11.2]):
+            report(1)
+            report(2)  # Within the interval; dropped
+            report(4)
+
+        assert [c.kwargs["progress"] for c in mock_update_run.call_args_list] == [36, 85]
+        assert mock_update_run.call_args.kwargs["message"] == "Planned 4/4 weeks"
+        assert mock_update_run.call_args.args == (run_uuid,)
+
     @patch('app.jobs.tasks.SessionLocal')
     def test_generate_roadmap_outline_sync_run_not_found(self, mock_session_local):
         """Test roadmap generation when run not found."""
         mock_session = Mock()
         mock_session_local.return_value = mock_session
-        mock_session.query.return_value.options.return_value.filter.return_value.first.return_value = None
+        mock_session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = None
+        mock_session.query.return_value.filter.return_value.first.return_value = None
         
         run_id = str(uuid.uuid4())
         result = generate_roadmap_outline_sync(run_id)
         
         assert result["ok"] is False
         assert result["error"] == "run not found"
+
+    @patch('app.jobs.tasks.generate_roadmap_outline')
+    @patch('app.jobs.tasks.SessionLocal')
+    def test_generate_roadmap_outline_sync_skips_run_locked_by_another_worker(self, mock_session_local, mock_generate_outline):
+        """Test a run whose row is locked elsewhere is skipped without an LLM call."""
+        mock_session = Mock()
+        mock_session_local.return_value = mock_session
+        locking = mock_session.query.return_value.options.return_value.filter.return_value.with_for_update
+        locking.return_value.first.return_value = None
+        mock_session.query.return_value.filter.return_value.first.return_value = (uuid.uuid4(),)
+
+        result = generate_roadmap_outline_sync(str(uuid.uuid4()))
+
+        assert result == {"ok": True, "skipped": True, "status": "locked"}
+        assert locking.call_args.kwargs["skip_locked"] is True
+        mock_generate_outline.assert_not_called()
+        mock_session.commit.assert_not_called()
     
     @patch('app.jobs.tasks.SessionLocal')
     def test_generate_roadmap_outline_sync_already_completed(self, mock_session_local):
@@ -304,7 +707,7 @@ class TestGenerationFunctions:
         
         mock_run = Mock()
         mock_run.status = "succeeded"
-        mock_session.query.return_value.options.return_value.filter.return_value.first.return_value = mock_run
+        mock_session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = mock_run
         
         run_id = str(uuid.uuid4())
         result = generate_roadmap_outline_sync(run_id)
@@ -313,9 +716,10 @@ class TestGenerationFunctions:
         assert result["skipped"] is True
         assert result["status"] == "succeeded"
     
+    @patch('app.jobs.tasks.publish_run_update')
     @patch('app.jobs.tasks.generate_roadmap_outline')
     @patch('app.jobs.tasks.SessionLocal')
-    def test_generate_roadmap_outline_sync_roadmap_not_found(self, mock_session_local, mock_generate_outline):
+    def test_generate_roadmap_outline_sync_roadmap_not_found(self, mock_session_local, mock_generate_outline, mock_publish):
         """Test roadmap generation when roadmap not found."""
         mock_session = Mock()
         mock_session_local.return_value = mock_session
@@ -331,7 +735,7 @@ class TestGenerationFunctions:
         mock_run.started_at = None
         mock_run.finished_at = None
         
-        mock_session.query.return_value.options.return_value.filter.return_value.first.return_value = mock_run
+        mock_session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = mock_run
         
         run_id = str(mock_run.id)
         result = generate_roadmap_outline_sync(run_id)
@@ -339,3 +743,97 @@ class TestGenerationFunctions:
         assert result["ok"] is False
         assert result["error"] == "roadmap not found"
         assert mock_run.status == "failed"
+
+    @patch('app.jobs.tasks.update_run')
+    @patch('app.jobs.tasks.publish_run_update')
+    @patch('app.jobs.tasks.generate_roadmap_outline')
+    @patch('app.jobs.tasks.SessionLocal')
+    def test_generate_roadmap_outline_sync_failure_updates_run_by_id(self, mock_session_local, mock_generate_outline, mock_publish, mock_update_run, test_roadmap):
+        """Test a failed outline marks the run failed without reloading it."""
+        mock_session = Mock()
+        mock_session_local.return_value = mock_session
+        run_uuid = uuid.uuid4()
+        mock_run = Mock(id=run_uuid, status="queued", roadmap=test_roadmap, started_at=None)
+        mock_session.query.return_value.options.return_value.filter.return_value.with_for_update.return_value.first.return_value = mock_run
+        mock_generate_outline.side_effect = ValueError("bad outline")
+
+        with pytest.raises(DocumentPortalException):
+            generate_roadmap_outline_sync(str(run_uuid))
+
+        mock_session.rollback.assert_called_once()
+        mock_update_run.assert_called_once_with(
+            run_uuid, status="failed", error="ValueError: bad outline", finished=True, db=mock_session
+        )
+        assert mock_session.query.call_count == 1
+
+
+class TestBatchGeneration:
+    """Test provider Batch API module generation."""
+    
+    def test_delayed_job_goes_to_sorted_set(self, mock_redis_client):
+        """Test delayed jobs are held back instead of pushed to pending."""
+        with patch('app.jobs.tasks.redis_client', mock_redis_client):
+            enqueue_job(job_type="poll_course_modules_batch", run_id=str(uuid.uuid4()),
+                        extra={"batch_id": "batch_1", "poll": 0}, delay_seconds=30)
+        
+        mock_redis_client.lpush.assert_not_called()
+        payload = list(mock_redis_client.zadd.call_args[0][1].keys())[0]
+        assert json.loads(payload)["batch_id"] == "batch_1"
+    
+    def test_promote_delayed_jobs(self, mock_redis_client):
+        """Test due jobs are moved by one script call over the delayed and pending keys."""
+        mock_redis_client.evalsha.return_value = 2
+        with patch('app.jobs.tasks.redis_client', mock_redis_client), \
+             patch('app.jobs.tasks.time.time', return_value=1000.0):
+            moved = _promote_delayed_jobs()
+        
+        assert moved == 2
+        _sha, numkeys, delayed_q, pending_q, now, limit = mock_redis_client.evalsha.call_args.args
+        assert (numkeys, delayed_q, pending_q) == (2, "roadmap_generation_delayed", "roadmap_generation_queue")
+        assert (now, limit) == (1000.0, 100)
+        mock_redis_client.zrem.assert_not_called()
+        mock_redis_client.lpush.assert_not_called()
+    
+    @patch('app.jobs.tasks.enqueue_job')
+    @patch('app.jobs.tasks.update_run')
+    @patch('app.jobs.tasks.get_batch_client')
+    @patch('app.jobs.tasks.SessionLocal')
+    def test_poll_reschedules_running_batch(self, mock_session_local, mock_get_client, mock_update, mock_enqueue):
+        """Test a running batch is polled again with exponential back-off."""
+        mock_session = Mock()
+        mock_session_local.return_value = mock_session
+        mock_session.query.return_value.filter.return_value.first.return_value = Mock(status="running")
+        mock_get_client.return_value.get_batch_results.return_value = None
+        
+        result = poll_course_modules_batch(str(uuid.uuid4()), str(uuid.uuid4()), "batch_1", poll=2)
+        
+        assert result["pending"] is True
+        assert mock_enqueue.call_args.kwargs["delay_seconds"] == 120
+        assert mock_enqueue.call_args.kwargs["extra"] == {"batch_id": "batch_1", "poll": 3}
+    
+    @patch('app.jobs.tasks.save_module_markdown')
+    @patch('app.jobs.tasks.ensure_valid_module_markdown', side_effect=lambda md: md)
+    @patch('app.jobs.tasks.enqueue_job')
+    @patch('app.jobs.tasks.update_run')
+    @patch('app.jobs.tasks.get_batch_client')
+    @patch('app.jobs.tasks.SessionLocal')
+    def test_poll_falls_back_for_missing_weeks(self, mock_session_local, mock_get_client, mock_update,
+                                               mock_enqueue, mock_validate, mock_save):
+        """Test weeks absent from batch output are handed to direct generation."""
+        mock_session = Mock()
+        mock_session_local.return_value = mock_session
+        mock_session.query.return_value.filter.return_value.first.return_value = Mock(status="running")
+        week1 = Mock(week=1, content_md=None)
+        week2 = Mock(week=2, content_md=None)
+        mock_session.query.return_value.filter.return_value.order_by.return_value.all.return_value = [week1, week2]
+        mock_get_client.return_value.get_batch_results.return_value = {"week-1": "## Overview"}
+        mock_save.side_effect = lambda module, md: setattr(module, "content_md", md)
+        
+        poll_course_modules_batch(str(uuid.uuid4()), str(uuid.uuid4()), "batch_1")
+        
+        mock_save.assert_called_once_with(week1, "## Overview")
+        mock_session.commit.assert_called_once()
+        # Status update shares the job's session and commit
+        assert mock_update.call_args.kwargs["db"] is mock_session
+        assert mock_enqueue.call_args.kwargs["job_type"] == "generate_course_modules"
+        assert mock_enqueue.call_args.kwargs["extra"] == {"use_batch": False}